@@ -0,0 +1,53 @@
+import argparse
+import os
+
+import yaml
+
+from utils.annotation import AnnotationLog, annotate_images, list_images
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+annotation_config = config.get('annotation') or {}
+
+
+def main():
+    """
+    Collects the positions of the 11 characters and the serial number of new images.
+
+    Every completed image is appended to `<output>.jsonl` immediately, and images already in it are skipped,
+    so an interrupted session resumes where it stopped. The Excel sheet is rebuilt from the log at the end of
+    the session.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Click the characters of new images and type their serial number.")
+    parser.add_argument("--images-dir", default=os.path.join(data_dir, "to_label"), help="Images to annotate.")
+    parser.add_argument("--output", default=os.path.join(data_dir, "my_serial_numbers.xlsx"),
+                        help="Excel sheet written at the end of the session.")
+    parser.add_argument("--two-click", action=argparse.BooleanOptionalAction,
+                        default=annotation_config.get('two_click', False),
+                        help="Click only the first and the last characters, the others are computed.")
+    parser.add_argument("--refine", action=argparse.BooleanOptionalAction,
+                        default=annotation_config.get('refine', True),
+                        help="Move the computed positions onto the characters of the image.")
+    args = parser.parse_args()
+
+    log = AnnotationLog(f"{args.output}.jsonl")
+    print(f"{len(log.records)} images already annotated in {log.path}.")
+    annotated = annotate_images(list_images(args.images_dir), log, two_click=args.two_click,
+                                refine=args.refine)
+    log.close()
+    log.export(args.output)
+    print(f"Annotated {annotated} images in this session, {len(log.records)} in total, saved to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
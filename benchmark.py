@@ -0,0 +1,422 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import pandas as pd
+import yaml
+
+from utils.decoding import decode_reduced, decode_region, read_image_size
+from utils.file_handling import save_data
+from utils.filters import DEFAULT_FILTERS, apply_filters
+from utils.image_processing import CHARACTER_COLUMNS, calculate_window, parse_coordinates, region_source_box, \
+    warp_region
+from utils.prefetch import render_frame
+from utils.sheet_loader import SheetLoader
+from utils.ui_helpers import get_rotate_parameters, get_rotated_positions_and_check_all_inside, get_images, \
+    overlay_characters, resize_image_for_display, get_window_bounds, DisplaySurface
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+cropping_config = config.get('cropping') or {}
+gui_config = config.get('gui') or {}
+PERCENTILES = (50, 90, 95, 99)
+SERIAL_ALPHABET = np.array(list("0123456789ABCDEFGHJKLMNPRSTUVWXYZ"))
+
+
+def synthetic_annotation(rng, width, height):
+    """
+    Draws random character positions along a slightly tilted line, like a serial number on a photographed plate.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        width (int): Width of the image.
+        height (int): Height of the image.
+
+    Returns:
+        tuple: `(serial_number, positions)` with an 11 character string and an (11, 2) array of positions.
+    """
+    angle = np.radians(rng.uniform(-10, 10))
+    length = rng.uniform(0.3, 0.5) * width
+    start = np.array([rng.uniform(0.1, 0.9 - length / width) * width, rng.uniform(0.3, 0.7) * height])
+    steps = np.linspace(0, length, len(CHARACTER_COLUMNS))
+    positions = start + steps[:, None] * np.array([np.cos(angle), np.sin(angle)])
+    serial_number = "".join(rng.choice(SERIAL_ALPHABET, len(CHARACTER_COLUMNS)))
+    return serial_number, np.round(positions, 1)
+
+
+def synthetic_image(rng, width, height, serial_number, positions):
+    """
+    Renders a noisy image with the serial number written at the given positions.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        width (int): Width of the image.
+        height (int): Height of the image.
+        serial_number (str): Characters to draw.
+        positions (ndarray): (11, 2) centers of the characters.
+
+    Returns:
+        ndarray: BGR image.
+    """
+    gradient = np.linspace(60, 190, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 12, (height, width, 1)).astype(np.float32)
+    image = np.clip(gradient + noise, 0, 255).astype(np.uint8).repeat(3, axis=2)
+    font_scale = max(1.0, width / 1000)
+    for char, (x, y) in zip(serial_number, positions):
+        (text_width, text_height), _ = cv2.getTextSize(char, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 3)
+        cv2.putText(image, char, (int(x) - text_width // 2, int(y) + text_height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (20, 20, 20), 3)
+    return image
+
+
+def format_point(point):
+    """Formats a position like the `C1` to `C11` columns of the sheet."""
+    return f"({point[0]};{point[1]})"
+
+
+def create_images(directory, resolutions, count, extension, seed=0):
+    """
+    Writes synthetic images for each resolution and returns their annotations.
+
+    Args:
+        directory (str): Directory receiving the images.
+        resolutions (list): `(width, height)` tuples.
+        count (int): Number of images per resolution.
+        extension (str): File extension, which selects the codec, e.g. `.jpg`.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        pd.DataFrame: One row per image, in the format of the input sheet, with a `resolution` column.
+    """
+    rng = np.random.default_rng(seed)
+    records = []
+    for width, height in resolutions:
+        for number in range(count):
+            serial_number, positions = synthetic_annotation(rng, width, height)
+            image_name = f"synthetic_{width}x{height}_{number}{extension}"
+            cv2.imwrite(os.path.join(directory, image_name),
+                        synthetic_image(rng, width, height, serial_number, positions))
+            record = {'image': image_name, 'serial_number': serial_number, 'resolution': f"{width}x{height}"}
+            record.update((column, format_point(point)) for column, point in zip(CHARACTER_COLUMNS, positions))
+            records.append(record)
+    return pd.DataFrame(records)
+
+
+def create_sheet(rows, seed=0):
+    """
+    Builds a synthetic annotation sheet with the columns of the input Excel file.
+
+    Args:
+        rows (int): Number of rows.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        pd.DataFrame: Sheet with `image`, `serial_number`, `C1` to `C11` and `unsure` columns.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = 4000, 3000
+    df = pd.DataFrame({'image': [f"image_{number:07d}.jpg" for number in range(rows)]})
+    annotations = [synthetic_annotation(rng, width, height) for _ in range(rows)]
+    df['serial_number'] = [serial_number for serial_number, _ in annotations]
+    for i, column in enumerate(CHARACTER_COLUMNS):
+        df[column] = [format_point(positions[i]) for _, positions in annotations]
+    df['unsure'] = rng.choice([0.0, 1.0, np.nan], rows, p=[0.6, 0.1, 0.3])
+    return df
+
+
+def summarize(samples):
+    """
+    Summarizes latency samples.
+
+    Args:
+        samples (list): Durations in seconds.
+
+    Returns:
+        dict: Count, mean, minimum, percentiles and maximum in milliseconds.
+    """
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    summary = {'count': len(values), 'mean_ms': float(values.mean()), 'min_ms': float(values.min())}
+    summary.update((f"p{percentile}_ms", float(np.percentile(values, percentile))) for percentile in PERCENTILES)
+    summary['max_ms'] = float(values.max())
+    return summary
+
+
+def timed(samples, stage, function, *args, **kwargs):
+    """Calls `function` and appends its duration to `samples[stage]`."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    samples.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def time_display_pipeline(samples, row, positions, image_path, h_pad, v_pad, surface, rapid_surface=None):
+    """
+    Times every stage of the full-image display path of `update_image_display`, one stage at a time.
+
+    Args:
+        samples (dict): Durations by stage, extended in place.
+        row (pd.Series): Row of the image.
+        positions (ndarray): Pre-parsed (11, 2) positions of the row.
+        image_path (str): Path of the image.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+        surface (DisplaySurface or None): Surface of a hidden label, or `None` when no display is available.
+        rapid_surface (DisplaySurface, optional): Surface with a fixed viewport, as in rapid mode.
+    """
+    image = timed(samples, "cv2.imread", cv2.imread, image_path)
+    window_data = timed(samples, "calculate_window", calculate_window, row, h_pad, v_pad, image.shape,
+                        positions=positions)
+    x_min, y_min, x_max, y_max, angle, center, rotated_image = timed(
+        samples, "get_rotate_parameters", get_rotate_parameters, window_data, image)
+    rotated_positions, all_inside = timed(
+        samples, "get_rotated_positions_and_check_all_inside", get_rotated_positions_and_check_all_inside,
+        row, center, angle, x_min, y_min, x_max, y_max, positions=positions)
+    character_image, cropped_image, target_height, target_width, font_scale = timed(
+        samples, "get_images", get_images, rotated_image, all_inside, x_min, y_min, x_max, y_max)
+    timed(samples, "overlay_characters", overlay_characters, character_image, rotated_positions, row, all_inside,
+          font_scale, x_min, y_min)
+    display = timed(samples, "resize_image_for_display", resize_image_for_display, character_image, target_height,
+                    target_width)
+    if surface is not None:
+        timed(samples, "DisplaySurface.show", surface.show, display)
+    if rapid_surface is not None:
+        timed(samples, "DisplaySurface.show (rapid)", rapid_surface.show, display)
+
+
+def time_region_pipeline(samples, row, positions, image_path, h_pad, v_pad):
+    """
+    Times the stages of the header-only, region-decoding path used by the prefetch workers.
+
+    Args:
+        samples (dict): Durations by stage, extended in place.
+        row (pd.Series): Row of the image.
+        positions (ndarray): Pre-parsed (11, 2) positions of the row.
+        image_path (str): Path of the image.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+    """
+    image_size = timed(samples, "read_image_size", read_image_size, image_path)
+    window_data = calculate_window(row, h_pad, v_pad, image_size, positions=positions)
+    x_min, y_min, x_max, y_max, angle, center = get_window_bounds(window_data, image_size)
+    box = region_source_box(angle, center, x_min, y_min, x_max, y_max, image_size)
+    region = timed(samples, "decode_region", decode_region, image_path, *box)
+    cropped_image = timed(samples, "warp_region", warp_region, region, angle, center, x_min, y_min, x_max, y_max,
+                          box[:2])
+    timed(samples, "decode_reduced", decode_reduced, image_path, image_size, cropped_image.shape[1] * 2)
+    timed(samples, "apply_filters", lambda: [apply_filters(cropped_image, chain) for chain in DEFAULT_FILTERS.values()])
+    timed(samples, "render_frame", render_frame, 0, row, os.path.dirname(image_path), h_pad, v_pad,
+          positions=positions)
+
+
+def benchmark_images(directory, annotations, repeat, h_pad, v_pad, tk_root):
+    """
+    Times the per-image stages for every resolution.
+
+    Args:
+        directory (str): Directory containing the synthetic images.
+        annotations (pd.DataFrame): Rows returned by `create_images`.
+        repeat (int): Number of timed runs per image, after one warm-up run.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+        tk_root (Tk or None): Hidden Tk root, or `None` when no display is available.
+
+    Returns:
+        dict: Summaries by resolution and stage.
+    """
+    coordinates = parse_coordinates(annotations)
+    surface = rapid_surface = None
+    if tk_root is not None:
+        from tkinter import Label
+        # One surface for all images, as in the UI
+        surface = DisplaySurface(Label(tk_root))
+        # Fixed viewport, as in rapid mode
+        rapid_surface = DisplaySurface(Label(tk_root), (gui_config.get('viewport_width', 1200),
+                                                        gui_config.get('overlay_height', 400)))
+    results = {}
+    for resolution, group in annotations.groupby('resolution', sort=False):
+        samples = {}
+        for index in group.index:
+            row = annotations.loc[index]
+            image_path = os.path.join(directory, row['image'])
+            for run in range(repeat + 1):
+                run_samples = {} if run == 0 else samples
+                time_display_pipeline(run_samples, row, coordinates[index], image_path, h_pad, v_pad, surface,
+                                      rapid_surface)
+                time_region_pipeline(run_samples, row, coordinates[index], image_path, h_pad, v_pad)
+        results[resolution] = {stage: summarize(durations) for stage, durations in samples.items()}
+        print(f"{resolution}: {results[resolution]['render_frame']['p50_ms']:.1f} ms per frame (median).")
+    return results
+
+
+def benchmark_save(directory, row_counts, repeat):
+    """
+    Times `save_data` on synthetic sheets of several sizes.
+
+    Args:
+        directory (str): Directory receiving the sheets and their backups.
+        row_counts (list): Numbers of rows of the sheets.
+        repeat (int): Number of timed saves per sheet.
+
+    Returns:
+        dict: Summaries by number of rows.
+    """
+    results = {}
+    for rows in row_counts:
+        df = create_sheet(rows)
+        input_file_path = os.path.join(directory, f"sheet_{rows}.xlsx")
+        output_file_path = os.path.join(directory, f"backup_{rows}")
+        df.to_excel(input_file_path, index=False)
+        samples = {}
+        for _ in range(repeat):
+            # save_data prints a confirmation on every call
+            with contextlib.redirect_stdout(io.StringIO()):
+                timed(samples, "save_data", save_data, df, output_file_path, input_file_path)
+        results[str(rows)] = summarize(samples["save_data"])
+        print(f"save_data on {rows} rows: {results[str(rows)]['p50_ms']:.0f} ms (median).")
+    return results
+
+
+def benchmark_first_image(directory, annotations, row_counts, repeat, h_pad, v_pad):
+    """
+    Times how long the first image takes to be ready at startup, reading the whole sheet with `pd.read_excel`
+    first or streaming it with `SheetLoader` and rendering its first row as soon as it is parsed.
+
+    Args:
+        directory (str): Directory containing the synthetic images and receiving the sheets.
+        annotations (pd.DataFrame): Rows returned by `create_images`, the first one is used as first row.
+        row_counts (list): Numbers of rows of the sheets.
+        repeat (int): Number of timed startups per sheet and method.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+
+    Returns:
+        dict: Summaries by number of rows and method.
+    """
+    first_row = annotations.iloc[0]
+    results = {}
+    for rows in row_counts:
+        df = create_sheet(rows)
+        for column in ['image', 'serial_number'] + CHARACTER_COLUMNS:
+            df.loc[0, column] = first_row[column]
+        sheet_path = os.path.join(directory, f"first_image_{rows}.xlsx")
+        df.to_excel(sheet_path, index=False)
+        samples = {}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            loaded = pd.read_excel(sheet_path, dtype={'serial_number': str})
+            render_frame(0, loaded.iloc[0], directory, h_pad, v_pad)
+            samples.setdefault("read_excel", []).append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            loader = SheetLoader(sheet_path).start()
+            render_frame(0, loader.row(0), directory, h_pad, v_pad)
+            samples.setdefault("sheet_loader", []).append(time.perf_counter() - start)
+            # Not timed, the next run must not overlap with this loading
+            loader.wait()
+        results[str(rows)] = {method: summarize(durations) for method, durations in samples.items()}
+        print(f"First image of {rows} rows: {results[str(rows)]['read_excel']['p50_ms']:.0f} ms after reading the "
+              f"sheet, {results[str(rows)]['sheet_loader']['p50_ms']:.0f} ms streaming it (median).")
+    return results
+
+
+def hidden_tk_root():
+    """Returns a withdrawn Tk root to create PhotoImages, or `None` if there is no display."""
+    try:
+        from tkinter import Tk, TclError
+        root = Tk()
+    except (ImportError, TclError):
+        return None
+    root.withdraw()
+    return root
+
+
+def parse_resolutions(value):
+    """Parses a comma-separated list such as `1600x1200,4000x3000` into `(width, height)` tuples."""
+    return [tuple(int(side) for side in item.lower().split("x")) for item in value.split(",") if item]
+
+
+def main():
+    """
+    Benchmarks every stage of the frame pipeline, `save_data` and the time to first image on synthetic data,
+    without opening the UI.
+
+    The results are written as JSON with latency percentiles, so that runs on different commits or machines
+    can be compared.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the frame pipeline, saving and startup on synthetic data.")
+    parser.add_argument("--resolutions", type=parse_resolutions, default=parse_resolutions("1600x1200,4000x3000"),
+                        help="Comma-separated image resolutions, e.g. 1600x1200,4000x3000.")
+    parser.add_argument("--images", type=int, default=5, help="Number of synthetic images per resolution.")
+    parser.add_argument("--format", default="jpg", choices=["jpg", "png", "tif"], help="Image file format.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per image.")
+    parser.add_argument("--rows", default="1000,10000,100000",
+                        help="Comma-separated sheet sizes for save_data and the time to first image.")
+    parser.add_argument("--save-repeat", type=int, default=3,
+                        help="Timed saves and startups per sheet size.")
+    parser.add_argument("--output", default=f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        help="JSON file receiving the results.")
+    args = parser.parse_args()
+
+    h_pad = cropping_config.get('horizontal_padding', 30)
+    v_pad = cropping_config.get('vertical_padding', 40)
+    row_counts = [int(rows) for rows in args.rows.split(",") if rows]
+    tk_root = hidden_tk_root()
+    if tk_root is None:
+        print("No display available, DisplaySurface.show is not timed.")
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as directory:
+        annotations = create_images(directory, args.resolutions, args.images, f".{args.format}")
+        images = benchmark_images(directory, annotations, args.repeat, h_pad, v_pad, tk_root)
+        saves = benchmark_save(directory, row_counts, args.save_repeat)
+        first_image = benchmark_first_image(directory, annotations, row_counts, args.save_repeat, h_pad, v_pad)
+    if tk_root is not None:
+        tk_root.destroy()
+
+    results = {
+        'created': datetime.now().isoformat(timespec="seconds"),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'display': tk_root is not None,
+        },
+        'parameters': {
+            'resolutions': [f"{width}x{height}" for width, height in args.resolutions],
+            'images_per_resolution': args.images,
+            'format': args.format,
+            'repeat': args.repeat,
+            'rows': row_counts,
+            'save_repeat': args.save_repeat,
+            'horizontal_padding': h_pad,
+            'vertical_padding': v_pad,
+        },
+        'images': images,
+        'save_data': saves,
+        'first_image': first_image,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
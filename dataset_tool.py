@@ -0,0 +1,58 @@
+import argparse
+import os
+
+import yaml
+
+from utils.storage import SQLiteStore, load_table, write_table
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+storage_config = config.get('storage') or {}
+default_database_path = storage_config.get('sqlite_path', os.path.splitext(input_file_path)[0] + '.sqlite')
+
+
+def main():
+    """
+    Imports an Excel, Parquet or CSV sheet into the SQLite database used by the `sqlite` storage backend, or
+    exports the database back to one of these formats.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Import or export the SQLite annotation database.")
+    parser.add_argument("--database", default=default_database_path, help="Path of the SQLite database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Replace the database with the content of a sheet.")
+    import_parser.add_argument("source", nargs="?", default=input_file_path, help=".xlsx, .parquet or .csv file.")
+    export_parser = subparsers.add_parser("export", help="Write the database to a sheet.")
+    export_parser.add_argument("destination", help=".xlsx, .parquet or .csv file.")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        try:
+            df = load_table(args.source)
+        except ImportError as error:
+            parser.error(str(error))
+        store = SQLiteStore.from_dataframe(df, args.database)
+        print(f"Imported {len(store)} rows from {args.source} into {args.database}.")
+    else:
+        store = SQLiteStore(args.database)
+        try:
+            write_table(store.to_dataframe(), args.destination)
+        except ImportError as error:
+            store.close()
+            parser.error(str(error))
+        print(f"Exported {len(store)} rows from {args.database} to {args.destination}.")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
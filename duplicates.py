@@ -0,0 +1,58 @@
+import argparse
+import os
+import time
+
+import yaml
+
+from utils.duplicates import build_index
+from utils.image_processing import parse_coordinates
+from utils.storage import load_table
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+images_dir = config['paths']['images_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+duplicates_config = config.get('duplicates') or {}
+
+
+def main():
+    """
+    Hashes the serial number strip of every row and groups the near-duplicate images, so that the UI can apply
+    one decision to a whole group.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Group the near-duplicate images of a sheet.")
+    parser.add_argument("--input", default=input_file_path, help="Sheet to index.")
+    parser.add_argument("--images-dir", default=images_dir, help="Directory containing the images.")
+    parser.add_argument("--output", default=duplicates_config.get('index', os.path.join(data_dir, 'duplicates.csv')),
+                        help="CSV index receiving the hash and the cluster of every row.")
+    parser.add_argument("--max-distance", type=int, default=duplicates_config.get('max_distance', 32),
+                        help="Largest number of differing bits, out of 256, between two near-duplicates.")
+    parser.add_argument("--workers", type=int, default=duplicates_config.get('workers', os.cpu_count()),
+                        help="Number of threads.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = load_table(args.input)
+    index = build_index(df, parse_coordinates(df), args.images_dir, max_distance=args.max_distance,
+                        workers=args.workers)
+    index.to_csv(args.output, index=False)
+
+    clusters = index.loc[index['cluster_size'] > 1, 'cluster']
+    print(f"Hashed {len(index)} of {len(df)} rows in {time.perf_counter() - start:.1f} s, index written to "
+          f"{args.output}.")
+    print(f"{len(clusters)} rows are in {clusters.nunique()} groups of near-duplicates, "
+          f"{len(index) - len(clusters) + clusters.nunique()} distinct parts to review.")
+
+
+if __name__ == "__main__":
+    main()
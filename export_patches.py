@@ -0,0 +1,68 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import yaml
+
+from utils.image_processing import CHARACTER_COLUMNS, parse_coordinates
+from utils.patch_export import export_patches
+from utils.storage import load_table
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+images_dir = config['paths']['images_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+
+
+def init_worker():
+    """Keeps OpenCV single-threaded inside each worker process, the pool already uses every core."""
+    cv2.setNumThreads(1)
+
+
+def main():
+    """
+    Exports a fixed-size patch around every character of the labeled rows, as memory-mappable `.npy` shards
+    with a label index and a train/val split, for training character recognizers.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Export per-character training patches.")
+    parser.add_argument("--input", default=input_file_path, help="Sheet with the annotations.")
+    parser.add_argument("--images-dir", default=images_dir, help="Directory containing the images.")
+    parser.add_argument("--output-dir", default=os.path.join(data_dir, "patches"), help="Output directory.")
+    parser.add_argument("--patch-size", default="16x24", help="Size of the patches, as WIDTHxHEIGHT.")
+    parser.add_argument("--val-fraction", type=float, default=0.1,
+                        help="Share of the images kept for validation.")
+    parser.add_argument("--shard-size", type=int, default=65536, help="Number of patches per shard.")
+    parser.add_argument("--include-unsure", action="store_true", help="Also export rows labeled as unsure.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    args = parser.parse_args()
+
+    df = load_table(args.input)
+    labeled = df['serial_number'].str.len() == len(CHARACTER_COLUMNS)
+    if 'unsure' in df.columns and not args.include_unsure:
+        labeled &= df['unsure'] == 0
+    patch_size = tuple(int(value) for value in args.patch_size.lower().split("x"))
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+        metadata = export_patches(df, parse_coordinates(df), args.images_dir, args.output_dir, executor,
+                                  rows=np.flatnonzero(labeled.to_numpy()).tolist(), val_fraction=args.val_fraction,
+                                  shard_size=args.shard_size, patch_size=patch_size)
+    counts = ", ".join(f"{sum(shard['count'] for shard in shards)} {split} patches in {len(shards)} shards"
+                       for split, shards in metadata['shards'].items())
+    print(f"Exported {metadata['rows']} rows to {args.output_dir}: {counts}. "
+          f"Skipped {len(metadata['skipped'])} rows (missing image or character outside the image).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import os
+import time
+
+import yaml
+
+from utils.geometry_qa import SEVERITIES, check_geometry, read_image_sizes
+from utils.image_processing import parse_coordinates
+from utils.storage import load_table
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+images_dir = config['paths']['images_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+cropping_config = config.get('cropping') or {}
+manifest_config = config.get('manifest') or {}
+
+
+def main():
+    """
+    Checks the geometry of every annotation of a sheet without opening the UI, and writes the issues to a CSV
+    report sorted by severity, so bad annotations are fixed before the review.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Check the character positions and serial numbers of every row.")
+    parser.add_argument("--input", default=input_file_path, help="Sheet with the annotations.")
+    parser.add_argument("--images-dir", default=images_dir, help="Directory containing the images.")
+    parser.add_argument("--output", default=os.path.join(data_dir, "geometry_qa.csv"), help="CSV report.")
+    parser.add_argument("--workers", type=int, default=manifest_config.get('workers', 8),
+                        help="Number of threads reading the image headers.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = load_table(args.input)
+    coordinates = parse_coordinates(df)
+    image_sizes = read_image_sizes(df['image'].tolist(), args.images_dir, workers=args.workers)
+    report = check_geometry(df, coordinates, image_sizes, h_pad=cropping_config.get('horizontal_padding', 30),
+                            v_pad=cropping_config.get('vertical_padding', 40))
+    report.to_csv(args.output, index=False)
+
+    print(f"Checked {len(df)} rows in {time.perf_counter() - start:.1f} s, report written to {args.output}.")
+    for severity in SEVERITIES:
+        issues = report[report['severity'] == severity]
+        if len(issues):
+            counts = issues['issue'].value_counts()
+            print(f"{severity}: {issues['row'].nunique()} rows ("
+                  + ", ".join(f"{count} {issue}" for issue, count in counts.items()) + ")")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import argparse
 import os
-import pandas as pd
 import yaml
-from utils.tkinter_ui import initialize_ui
+from utils.sheet_loader import LoadingStore, load_store
+from utils.session_lock import SessionLock
+from utils.sharding import load_shards, shard_path
+from utils.storage import OrderedStore
 
 # Load configuration
 with open("config.yaml", "r") as config_file:
@@ -12,6 +15,11 @@ data_dir = config['paths']['data_dir']
 images_dir = config['paths']['images_dir']
 input_file_path = os.path.join(data_dir, config['paths']['input_file'])
 output_file_path = os.path.join(data_dir, config['paths']['output_file_prefix'])
+storage_config = config.get('storage') or {}
+sharding_config = config.get('sharding') or {}
+shard_dir = sharding_config.get('directory', os.path.join(data_dir, 'shards'))
+prelabel_config = config.get('prelabel') or {}
+duplicates_config = config.get('duplicates') or {}
 
 
 def main():
@@ -19,10 +27,12 @@ def main():
     Main function to load data, set up paths, and initialize the Tkinter UI.
 
     This function performs the following steps:
-    - Loads an Excel file specified in the configuration as a DataFrame.
-    - Creates a copy of the DataFrame to track any corrections made in the UI.
-    - Converts the `serial_number` column to string format to ensure consistency.
-    - Launches the UI for reviewing and editing data.
+    - Locks the sheet to review, the master sheet or the shard given with `--shard`, so that no other annotator
+      can open it at the same time.
+    - Opens the storage backend holding the data (see `load_store`), in order of confidence of the pre-labeler
+      if configured.
+    - Loads the groups of near-duplicate images found by `duplicates.py`, if any.
+    - Launches the UI for reviewing and editing data, or the grid of `--grid`.
 
     Args:
         None
@@ -30,13 +40,75 @@ def main():
     Returns:
         None
     """
-    # Load the input Excel file
-    df = pd.read_excel(input_file_path)
-    corrected_df = df.copy()
-    corrected_df['serial_number'] = corrected_df['serial_number'].astype(str)
+    parser = argparse.ArgumentParser(description="Review and edit the serial number annotations.")
+    parser.add_argument("--shard", help="Review the shard of this annotator, created with shard_tool.py split.")
+    parser.add_argument("--force-unlock", action="store_true",
+                        help="Open the sheet even if another session holds its lock, e.g. after a crash.")
+    parser.add_argument("--rapid", action="store_true",
+                        help="Rapid mode: fixed image sizes and keyboard shortcuts, see gui.rapid_mode.")
+    parser.add_argument("--grid", action="store_true",
+                        help="Grid mode: confirm pages of unlabeled images at once, marking only the exceptions.")
+    args = parser.parse_args()
+    if args.rapid:
+        config.setdefault('gui', {})['rapid_mode'] = True
 
-    # Initialize the UI
-    initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_path)
+    if args.shard:
+        # Shards are small Excel sheets with their own journal, whatever the configured backend
+        sheet_path = shard_path(shard_dir, args.shard)
+        if not os.path.exists(sheet_path):
+            parser.error(f"No shard named {args.shard} in {shard_dir}")
+        if load_shards(shard_dir).get('merged'):
+            parser.error(f"The shards of {shard_dir} were already merged, edits to {args.shard} would be lost")
+        backup_path = os.path.join(shard_dir, f"{args.shard}_{config['paths']['output_file_prefix']}")
+        backend = 'excel'
+    else:
+        sheet_path, backup_path = input_file_path, output_file_path
+        backend = storage_config.get('backend', 'excel')
+
+    lock = SessionLock(sheet_path)
+    if not lock.acquire(force=args.force_unlock):
+        print(f"{sheet_path} is already being edited by {lock.describe_owner()}. "
+              f"Use --force-unlock if that session is not running anymore.")
+        return
+    try:
+        store = load_store(sheet_path, backup_path, backend, storage_config.get('sqlite_path'))
+        proposals = {}
+        if prelabel_config.get('proposals'):
+            # Imported once the sheet is being read, like the UI below
+            from utils.prelabel import load_proposals, review_order
+
+            proposals = load_proposals(prelabel_config['proposals'])
+        if proposals and prelabel_config.get('order'):
+            def by_confidence(loaded):
+                """Presents the rows of the loaded sheet in order of confidence of their proposal."""
+                return OrderedStore(loaded, review_order(loaded.images(), proposals,
+                                                         descending=prelabel_config['order'] == 'descending'))
+
+            # The order needs every image name, so it is applied once the sheet is loaded, after the first image
+            # is shown
+            if isinstance(store, LoadingStore):
+                store.wrap(by_confidence)
+            else:
+                store = by_confidence(store)
+
+        if args.grid:
+            from utils.grid_ui import initialize_grid_ui
+
+            # Pages are made of the unlabeled rows, which needs the whole sheet
+            initialize_grid_ui(store.wait() if isinstance(store, LoadingStore) else store, images_dir, config)
+            store.close()
+            return
+
+        # Imported once the sheet is being read, so that importing Tk and PIL overlaps with reading it
+        from utils.tkinter_ui import initialize_ui
+
+        from utils.duplicates import load_clusters
+
+        # Initialize the UI
+        initialize_ui(store, images_dir, config, proposals, load_clusters(duplicates_config.get('index')))
+        store.close()
+    finally:
+        lock.release()
 
 
 if __name__ == "__main__":
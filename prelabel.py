@@ -0,0 +1,84 @@
+import argparse
+import os
+
+import numpy as np
+import yaml
+
+from utils.image_processing import CHARACTER_COLUMNS, parse_coordinates
+from utils.prelabel import CharacterClassifier, propose_serial_numbers, training_set
+from utils.storage import load_table
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+images_dir = config['paths']['images_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+prelabel_config = config.get('prelabel') or {}
+
+
+def main():
+    """
+    Trains a character classifier on the rows already labeled as sure and proposes a serial number, with a
+    confidence per character, for the other rows.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Propose serial numbers from the rows already labeled.")
+    parser.add_argument("--input", default=input_file_path, help="Sheet to pre-label.")
+    parser.add_argument("--training", nargs="*", default=[],
+                        help="Other labeled sheets (e.g. final_my_annotations.xlsx) to learn from.")
+    parser.add_argument("--images-dir", default=images_dir, help="Directory containing the images.")
+    parser.add_argument("--output", default=prelabel_config.get('proposals', os.path.join(data_dir, 'prelabels.csv')),
+                        help="CSV file receiving the proposals.")
+    parser.add_argument("--model", help="Also save the classifier to this .npz file.")
+    parser.add_argument("--k", type=int, default=5, help="Number of neighbours voting for each character.")
+    parser.add_argument("--holdout", type=float, default=0.1,
+                        help="Share of the labeled rows of the input kept aside to measure the accuracy.")
+    parser.add_argument("--all", action="store_true", help="Also propose serial numbers for labeled rows.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of threads.")
+    args = parser.parse_args()
+
+    df = load_table(args.input)
+    coordinates = parse_coordinates(df)
+    patches, labels, rows = training_set(df, coordinates, args.images_dir, args.workers)
+    for path in args.training:
+        extra = load_table(path)
+        extra_patches, extra_labels, _ = training_set(extra, parse_coordinates(extra), args.images_dir, args.workers)
+        patches, labels = np.concatenate([patches, extra_patches]), np.concatenate([labels, extra_labels])
+    if not len(labels):
+        print("No labeled row with an image to learn from.")
+        return
+    print(f"Learning from {len(labels)} characters.")
+
+    # Measure the accuracy on labeled rows of the input that the classifier does not see
+    held_out = np.random.default_rng(0).permutation(len(rows))[:int(len(rows) * args.holdout)]
+    if len(held_out) and len(held_out) < len(rows):
+        # The patches of the input come first, one per character of each row
+        test = np.zeros(len(labels), dtype=bool)
+        test[:len(rows) * len(CHARACTER_COLUMNS)] = np.repeat(np.isin(np.arange(len(rows)), held_out),
+                                                              len(CHARACTER_COLUMNS))
+        predicted, _ = CharacterClassifier(args.k).fit(patches[~test], labels[~test]).predict(patches[test])
+        rows_correct = (predicted == labels[test]).reshape(-1, len(CHARACTER_COLUMNS)).all(axis=1)
+        print(f"Held-out accuracy: {np.mean(predicted == labels[test]):.1%} of characters, "
+              f"{np.mean(rows_correct):.1%} of serial numbers ({len(held_out)} rows).")
+
+    classifier = CharacterClassifier(args.k).fit(patches, labels)
+    if args.model:
+        classifier.save(args.model)
+    targets = range(len(df)) if args.all or 'unsure' not in df.columns else np.flatnonzero(df['unsure'].isna())
+    proposals = propose_serial_numbers(df, coordinates, args.images_dir, classifier, list(targets), args.workers)
+    proposals.to_csv(args.output, index=False)
+    print(f"Proposed serial numbers for {len(proposals)} of {len(targets)} rows in {args.output}, "
+          f"{int((proposals['confidence'] >= prelabel_config.get('confirm_threshold', 0.95)).sum())} "
+          f"above the confirmation threshold.")
+
+
+if __name__ == "__main__":
+    main()
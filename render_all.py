@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import yaml
+
+from utils.disk_cache import render_cache_key
+from utils.image_processing import parse_coordinates
+from utils.prefetch import render_frame
+from utils.storage import load_table
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+images_dir = config['paths']['images_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+cropping_config = config.get('cropping') or {}
+# Render key of every row written to the output directory, one JSON line per rendered row
+RENDERED_FILE = "rendered.jsonl"
+
+
+def output_paths(output_dir, index, image_name):
+    """
+    Returns where the cropped strip and the overlay preview of a row are written.
+
+    The name starts with the row number, so rows sharing an image, or images with the same name in different
+    directories, do not overwrite each other, and keeps the full image name for readability.
+
+    Args:
+        output_dir (str): Root output directory.
+        index (int): Position of the row in the sheet.
+        image_name (str): File name of the source image.
+
+    Returns:
+        tuple: Paths of the cropped strip and of the overlay preview.
+    """
+    name = f"{index + 1:06d}_{os.path.basename(str(image_name))}.png"
+    return os.path.join(output_dir, "crops", name), os.path.join(output_dir, "overlays", name)
+
+
+def load_rendered_keys(output_dir):
+    """
+    Reads the render key each row had when its outputs were written, see `render_cache_key`.
+
+    Args:
+        output_dir (str): Root output directory.
+
+    Returns:
+        dict: Render key by row position, the last one written for each row.
+    """
+    keys = {}
+    path = os.path.join(output_dir, RENDERED_FILE)
+    if not os.path.exists(path):
+        return keys
+    with open(path, "r", encoding="utf-8") as rendered_file:
+        for line in rendered_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # An interrupted run can leave a truncated last line
+                continue
+            keys[record['row']] = record['key']
+    return keys
+
+
+def init_worker():
+    """Keeps OpenCV single-threaded inside each worker process, the pool already uses every core."""
+    cv2.setNumThreads(1)
+
+
+def render_row(index, row, positions, images_dir, output_dir, h_pad, v_pad):
+    """
+    Renders one row and writes its cropped strip and overlay preview.
+
+    Args:
+        index (int): Position of the row in the sheet.
+        row (pd.Series): Data row to render.
+        positions (ndarray): Pre-parsed (11, 2) character positions of the row.
+        images_dir (str): Directory containing the images.
+        output_dir (str): Root output directory.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+
+    Returns:
+        tuple: `(index, rendered)` where `rendered` is `False` if the row could not be displayed.
+    """
+    frame = render_frame(index, row, images_dir, h_pad, v_pad, positions=positions)
+    if frame is None:
+        return index, False
+    crop_path, overlay_path = output_paths(output_dir, index, row['image'])
+    cv2.imwrite(crop_path, frame.cropped_image)
+    cv2.imwrite(overlay_path, frame.character_display)
+    return index, True
+
+
+def main():
+    """
+    Renders the cropped strip and overlay preview of every row of the input sheet without opening the UI.
+
+    Rows are distributed over a process pool. The render key of every written row (image file, positions, serial
+    number and paddings) is recorded in `rendered.jsonl`. With `--resume`, rows whose outputs exist and whose key
+    did not change are skipped, so an interrupted run can be restarted where it stopped and only the edited rows
+    are rendered again.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Pre-render the crops and overlay previews of every row.")
+    parser.add_argument("--input", default=input_file_path, help="Excel file with the annotations.")
+    parser.add_argument("--images-dir", default=images_dir, help="Directory containing the images.")
+    parser.add_argument("--output-dir", default=os.path.join(data_dir, "rendered"), help="Output directory.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip rows already rendered with the same image, positions and serial number.")
+    args = parser.parse_args()
+
+    df = load_table(args.input)
+    coordinates = parse_coordinates(df)
+    os.makedirs(os.path.join(args.output_dir, "crops"), exist_ok=True)
+    os.makedirs(os.path.join(args.output_dir, "overlays"), exist_ok=True)
+
+    h_pad = cropping_config.get('horizontal_padding', 30)
+    v_pad = cropping_config.get('vertical_padding', 40)
+    keys = [render_cache_key(os.path.join(args.images_dir, str(image)), coordinates[index], serial_number, h_pad,
+                             v_pad)
+            for index, (image, serial_number) in enumerate(zip(df['image'], df['serial_number']))]
+    rendered_keys = load_rendered_keys(args.output_dir) if args.resume else {}
+    pending = []
+    for index in range(len(df)):
+        if keys[index] is not None and rendered_keys.get(index) == keys[index] and \
+                all(os.path.exists(path) for path in output_paths(args.output_dir, index, df.at[index, 'image'])):
+            continue
+        pending.append(index)
+    print(f"{len(df) - len(pending)} rows already rendered, {len(pending)} to render.")
+
+    def record(index):
+        """Records the key a row was rendered with, flushed so that an interrupted run keeps it."""
+        rendered_file.write(json.dumps({'row': index, 'image': str(df.at[index, 'image']), 'key': keys[index]}) + "\n")
+        rendered_file.flush()
+
+    rendered, skipped = 0, []
+    # Rewritten with the rows kept from the earlier run, which also drops a line left truncated by an interruption
+    with open(os.path.join(args.output_dir, RENDERED_FILE), "w", encoding="utf-8") as rendered_file, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+        for index in sorted(set(range(len(df))) - set(pending)):
+            record(index)
+        futures = {executor.submit(render_row, index, df.iloc[index], coordinates[index], args.images_dir,
+                                   args.output_dir, h_pad, v_pad): index for index in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            try:
+                ok = future.result()[1]
+            except Exception as error:
+                # e.g. a missing or malformed serial number: the row is skipped, not the whole batch
+                print(f"Could not render row {index + 1}: {error!r}")
+                ok = False
+            if ok:
+                rendered += 1
+                record(index)
+            else:
+                # Outputs of an earlier render of the row would not match the sheet anymore
+                for path in output_paths(args.output_dir, index, df.at[index, 'image']):
+                    if os.path.exists(path):
+                        os.remove(path)
+                skipped.append(df.at[index, 'image'])
+            if done % 100 == 0 or done == len(futures):
+                print(f"{done}/{len(futures)} rows processed.")
+
+    with open(os.path.join(args.output_dir, "skipped.txt"), "w") as skipped_file:
+        skipped_file.writelines(f"{image_name}\n" for image_name in skipped)
+    print(f"Rendered {rendered} rows, skipped {len(skipped)} (missing image or C1/C11, or "
+          f"rendering error).")
+
+
+if __name__ == "__main__":
+    main()
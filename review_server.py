@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import os
+
+import yaml
+
+from utils.review_server import IMAGE_FORMATS, ReviewServer
+from utils.session_lock import SessionLock
+from utils.sheet_loader import LoadingStore, load_store
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+images_dir = config['paths']['images_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+output_file_path = os.path.join(data_dir, config['paths']['output_file_prefix'])
+cropping_config = config.get('cropping') or {}
+storage_config = config.get('storage') or {}
+server_config = config.get('server') or {}
+
+
+async def serve(store, args):
+    """Runs the review server until interrupted, then writes the edits."""
+    server = ReviewServer(store, args.images_dir, h_pad=cropping_config.get('horizontal_padding', 30),
+                          v_pad=cropping_config.get('vertical_padding', 40), image_format=args.format,
+                          quality=args.quality, workers=args.workers)
+    host, port = await server.start(args.host, args.port)
+    print(f"Reviewing {len(store)} rows at http://{host}:{port}/ (Ctrl+C to save and stop).")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    """
+    Serves the review over HTTP, as an alternative to the Tk UI, so the images can stay on this machine while
+    reviewers use a browser.
+
+    The sheet is locked like in `main.py`, and the edits are saved when the server stops.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Serve the review in a browser.")
+    parser.add_argument("--host", default=server_config.get('host', '127.0.0.1'),
+                        help="Address to listen on, 127.0.0.1 to only accept local connections.")
+    parser.add_argument("--port", type=int, default=server_config.get('port', 8765), help="Port to listen on.")
+    parser.add_argument("--format", default=server_config.get('format', 'webp'), choices=sorted(IMAGE_FORMATS),
+                        help="Format of the images.")
+    parser.add_argument("--quality", type=int, default=server_config.get('quality', 80), help="Encoding quality.")
+    parser.add_argument("--workers", type=int, default=server_config.get('workers', 4),
+                        help="Number of threads rendering the images.")
+    parser.add_argument("--images-dir", default=images_dir, help="Directory containing the images.")
+    parser.add_argument("--force-unlock", action="store_true",
+                        help="Open the sheet even if another session holds its lock, e.g. after a crash.")
+    args = parser.parse_args()
+
+    lock = SessionLock(input_file_path)
+    if not lock.acquire(force=args.force_unlock):
+        print(f"{input_file_path} is already being edited by {lock.describe_owner()}. "
+              f"Use --force-unlock if that session is not running anymore.")
+        return
+    try:
+        store = load_store(input_file_path, output_file_path, storage_config.get('backend', 'excel'),
+                           storage_config.get('sqlite_path'))
+        if isinstance(store, LoadingStore):
+            # The server needs the whole sheet, e.g. for its number of rows
+            store = store.wait()
+        try:
+            asyncio.run(serve(store, args))
+        except KeyboardInterrupt:
+            pass
+        store.save(wait=True)
+        store.close()
+    finally:
+        lock.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+
+import yaml
+
+from utils.session_lock import SessionLock
+from utils.sharding import CONFLICTS_FILE, SHARDS_FILE, load_shards, merge_shards, shard_path, split_sheet
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+# Paths from config
+data_dir = config['paths']['data_dir']
+input_file_path = os.path.join(data_dir, config['paths']['input_file'])
+output_file_path = os.path.join(data_dir, config['paths']['output_file_prefix'])
+sharding_config = config.get('sharding') or {}
+default_shard_dir = sharding_config.get('directory', os.path.join(data_dir, 'shards'))
+
+
+def main():
+    """
+    Splits the master sheet into one shard per annotator, shows who is editing which shard, or merges the shards
+    back into the master sheet.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Split the annotation sheet between annotators and merge it back.")
+    parser.add_argument("--shard-dir", default=default_shard_dir, help="Directory holding the shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split_parser = subparsers.add_parser("split", help="Create one shard per annotator.")
+    split_parser.add_argument("annotators", nargs="+", help="Names of the annotators.")
+    split_parser.add_argument("--method", choices=["range", "hash"], default=sharding_config.get('method', 'range'),
+                              help="Contiguous row ranges, or a hash of the image name.")
+    split_parser.add_argument("--master", default=input_file_path, help="Master sheet to split.")
+    subparsers.add_parser("status", help="Show the shards and who is editing them.")
+    merge_parser = subparsers.add_parser("merge", help="Merge the edits of every shard into the master sheet.")
+    merge_parser.add_argument("--force", action="store_true", help="Merge even if a session holds a lock.")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        lock = SessionLock(args.master)
+        if lock.held():
+            parser.error(f"{args.master} is being edited by {lock.describe_owner()}")
+        try:
+            sizes = split_sheet(args.master, args.shard_dir, args.annotators, args.method)
+        except RuntimeError as error:
+            parser.error(str(error))
+        for name, size in sizes.items():
+            print(f"{name}: {size} rows in {shard_path(args.shard_dir, name)}, "
+                  f"review with: python main.py --shard {name}")
+    elif args.command == "status":
+        shards = load_shards(args.shard_dir)
+        print(f"{len(shards['annotators'])} shards of {shards['master']} ({shards['method']}, {shards['created']}"
+              + (f", merged {shards['merged']}" if shards.get('merged') else "") + ").")
+        for name in shards['annotators']:
+            lock = SessionLock(shard_path(args.shard_dir, name))
+            print(f"{name}: {'edited by ' + lock.describe_owner() if lock.held() else 'not locked'}")
+    else:
+        if not os.path.exists(os.path.join(args.shard_dir, SHARDS_FILE)):
+            parser.error(f"No shards in {args.shard_dir}")
+        merged = load_shards(args.shard_dir).get('merged')
+        if merged:
+            print(f"The shards of {args.shard_dir} were already merged on {merged}, nothing to do.")
+            return
+        try:
+            applied, conflicts = merge_shards(args.shard_dir, output_file_path, force=args.force)
+        except RuntimeError as error:
+            print(error)
+            return
+        print(f"Merged {applied} edited cells into the master sheet.")
+        if conflicts:
+            print(f"{len(conflicts)} conflicting edits kept their master value, see "
+                  f"{os.path.join(args.shard_dir, CONFLICTS_FILE)}:")
+            for image, column in conflicts:
+                print(f"  {image}: {column}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+import pytest
+
+from utils.decoding import _decode_png_rows, _decode_tiff_region, decode_region
+
+
+@pytest.mark.parametrize("name, channels, compression, direct", [
+    ("strips.tif", 3, 1, True),
+    ("gray.tif", 1, 1, True),
+    ("lzw.tif", 3, 5, False),
+    ("image.png", 3, None, True),
+    ("gray.png", 1, None, True),
+    ("image.jpg", 3, None, False),
+])
+def test_decode_region_matches_imread(tmp_path, name, channels, compression, direct):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (300, 420, channels)[:3 if channels > 1 else 2], dtype=np.uint8)
+    path = str(tmp_path / name)
+    cv2.imwrite(path, image, [cv2.IMWRITE_TIFF_COMPRESSION, compression] if compression else [])
+    full = cv2.imread(path)
+    for _ in range(20):
+        x_min, y_min = int(rng.integers(0, 410)), int(rng.integers(0, 290))
+        x_max, y_max = int(rng.integers(x_min + 1, 421)), int(rng.integers(y_min + 1, 301))
+        np.testing.assert_array_equal(decode_region(path, x_min, y_min, x_max, y_max),
+                                      full[y_min:y_max, x_min:x_max])
+        if name.endswith(".tif"):
+            # Only uncompressed TIFF files are read without decoding the whole image
+            assert (_decode_tiff_region(path, x_min, y_min, x_max, y_max) is not None) == direct
+        elif name.endswith(".png"):
+            assert (_decode_png_rows(path, x_min, y_min, x_max, y_max) is not None) == direct
+
+
+def test_png_with_alpha_falls_back_to_imread(tmp_path):
+    image = np.random.default_rng(1).integers(0, 256, (60, 80, 4), dtype=np.uint8)
+    path = str(tmp_path / "alpha.png")
+    cv2.imwrite(path, image)
+    assert _decode_png_rows(path, 10, 20, 50, 40) is None
+    np.testing.assert_array_equal(decode_region(path, 10, 20, 50, 40), cv2.imread(path)[20:40, 10:50])
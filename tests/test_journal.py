@@ -0,0 +1,79 @@
+import pandas as pd
+
+from utils.journal import EditJournal
+from utils.storage import load_table
+
+
+def make_sheet(count=4):
+    return pd.DataFrame({'image': [f"img_{index}.png" for index in range(count)],
+                         'serial_number': [f"5585950000{index}" for index in range(count)],
+                         'unsure': [0] * count})
+
+
+def test_replay_applies_edits_in_order(tmp_path):
+    journal = EditJournal(str(tmp_path / "sheet.xlsx.journal"), fsync=False)
+    journal.append(1, "img_1.png", serial_number="111", unsure=1)
+    journal.append_many([(0, "img_0.png"), (2, "img_2.png")], unsure=1)
+    journal.append(1, "img_1.png", serial_number="112")
+    journal.close()
+
+    df = make_sheet()
+    assert EditJournal(journal.path, fsync=False).replay(df) == 4
+    assert df['serial_number'].tolist() == ["55859500000", "112", "55859500002", "55859500003"]
+    assert df['unsure'].tolist() == [1, 1, 1, 0]
+
+
+def test_replay_follows_moved_rows_and_skips_removed_ones(tmp_path):
+    journal = EditJournal(str(tmp_path / "sheet.xlsx.journal"), fsync=False)
+    journal.append(0, "img_0.png", serial_number="000")
+    journal.append(3, "img_3.png", serial_number="333")
+    journal.append(2, "gone.png", serial_number="999")
+    journal.close()
+
+    df = make_sheet().iloc[::-1].reset_index(drop=True)
+    assert EditJournal(journal.path, fsync=False).replay(df) == 2
+    assert df.set_index('image')['serial_number'].to_dict() == {
+        "img_3.png": "333", "img_2.png": "55859500002", "img_1.png": "55859500001", "img_0.png": "000"}
+
+
+def test_replay_ignores_truncated_last_line(tmp_path):
+    journal = EditJournal(str(tmp_path / "sheet.xlsx.journal"), fsync=False)
+    journal.append(0, "img_0.png", serial_number="000")
+    journal.append(1, "img_1.png", serial_number="111")
+    journal.close()
+    with open(journal.path, "rb+") as journal_file:
+        content = journal_file.read()
+        journal_file.seek(0)
+        journal_file.write(content[:-10])
+        journal_file.truncate()
+
+    df = make_sheet()
+    reopened = EditJournal(journal.path, fsync=False)
+    assert reopened.replay(df) == 1
+    assert df['serial_number'].tolist()[:2] == ["000", "55859500001"]
+    # Edits recorded after the crash start on a new line and are replayed
+    reopened.append(2, "img_2.png", serial_number="222")
+    reopened.close()
+    assert EditJournal(journal.path, fsync=False).replay(df) == 2
+    assert df.at[2, 'serial_number'] == "222"
+
+
+def test_compact_writes_sheet_and_keeps_later_edits(tmp_path):
+    sheet_path = str(tmp_path / "sheet.xlsx")
+    make_sheet().to_excel(sheet_path, index=False)
+    journal = EditJournal(f"{sheet_path}.journal", fsync=False)
+    df = load_table(sheet_path)
+    journal.replay(df)
+
+    journal.append(1, "img_1.png", serial_number="111")
+    df.at[1, 'serial_number'] = "111"
+    journal.compact(df.copy, str(tmp_path / "backup"), sheet_path, wait=True)
+    journal.append(2, "img_2.png", serial_number="222")
+    journal.close()
+
+    assert len(list(tmp_path.glob("backup_*.xlsx"))) == 1
+    saved = load_table(sheet_path)
+    assert saved['serial_number'].tolist() == ["55859500000", "111", "55859500002", "55859500003"]
+    # Only the edit made after the snapshot is left in the journal
+    assert EditJournal(journal.path, fsync=False).replay(saved) == 1
+    assert saved['serial_number'].tolist() == ["55859500000", "111", "222", "55859500003"]
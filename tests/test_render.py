@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.filters import DEFAULT_FILTERS
+from utils.image_processing import parse_coordinates
+from utils.prefetch import FramePrefetcher, render_frame
+from utils.storage import DataFrameStore
+
+
+def make_row(tmp_path, serial_number, start=(100, 150), step=(22, 4)):
+    """Writes a random image and returns a row whose 11 characters lie on a slanted line across it."""
+    cv2.imwrite(str(tmp_path / "row.png"), np.random.default_rng(0).integers(0, 256, (400, 500, 3), dtype=np.uint8))
+    positions = {f"C{i + 1}": f"({start[0] + i * step[0]};{start[1] + i * step[1]})" for i in range(11)}
+    return pd.Series({'image': "row.png", 'serial_number': serial_number, **positions, 'unsure': np.nan})
+
+
+@pytest.mark.parametrize("serial_number", ["", "5585", np.nan])
+@pytest.mark.parametrize("start", [(100, 150), (5, 10)])
+def test_unlabeled_row_renders(tmp_path, serial_number, start):
+    labeled = render_frame(0, make_row(tmp_path, "55859550166", start), str(tmp_path))
+    frame = render_frame(0, make_row(tmp_path, serial_number, start), str(tmp_path))
+    assert frame is not None
+    np.testing.assert_array_equal(frame.cropped_image, labeled.cropped_image)
+    assert frame.character_display.shape == labeled.character_display.shape
+    assert not np.array_equal(frame.character_display, labeled.character_display)
+
+
+def test_filtered_displays_are_rendered_on_demand(tmp_path):
+    df = pd.DataFrame([make_row(tmp_path, "55859550166")])
+    store = DataFrameStore(df, None, None, None, parse_coordinates(df))
+    prefetcher = FramePrefetcher(store, str(tmp_path), ahead=0, behind=0, workers=1, filters=DEFAULT_FILTERS)
+    try:
+        frame = prefetcher.get(0)
+        assert not prefetcher._filtered
+        displays = prefetcher.filtered(frame)
+        assert displays[0].shape == frame.cropped_display.shape
+        assert prefetcher.filtered(frame) is displays
+        prefetcher.invalidate(0)
+        assert prefetcher.filtered(prefetcher.get(0)) is not displays
+    finally:
+        prefetcher.shutdown()
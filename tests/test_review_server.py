@@ -0,0 +1,112 @@
+import asyncio
+import http.client
+import json
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from utils.journal import EditJournal
+from utils.review_server import ReviewServer
+from utils.storage import DataFrameStore
+
+
+def make_store(tmp_path):
+    """Returns a store of four rows: labeled, not labeled yet, with a missing image and without C1."""
+    cv2.imwrite(str(tmp_path / "a.png"), np.random.default_rng(0).integers(0, 256, (400, 500, 3), dtype=np.uint8))
+    positions = {f"C{i + 1}": f"({100 + i * 22};{150 + i * 4})" for i in range(11)}
+    df = pd.DataFrame([{'image': "a.png", 'serial_number': "55859550166", **positions, 'unsure': 0.0},
+                       {'image': "a.png", 'serial_number': "", **positions, 'unsure': np.nan},
+                       {'image': "gone.png", 'serial_number': "", **positions, 'unsure': np.nan},
+                       {'image': "a.png", 'serial_number': "", **positions, 'C1': None, 'unsure': np.nan}])
+    sheet_path = str(tmp_path / "sheet.xlsx")
+    df.to_excel(sheet_path, index=False)
+    return DataFrameStore(df, EditJournal(f"{sheet_path}.journal", fsync=False), str(tmp_path / "backup"),
+                          sheet_path)
+
+
+def request(port, method, path, body=None, headers=None):
+    """Sends one request to the server on the loopback interface."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def run_with_server(store, images_dir, exchange):
+    """Starts the server on a free loopback port and runs `exchange(port)` on a thread against it."""
+    async def run():
+        server = ReviewServer(store, images_dir, workers=2)
+        _, port = await server.start("127.0.0.1", 0)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, exchange, port)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_api_round_trip(tmp_path):
+    store = make_store(tmp_path)
+
+    def exchange(port):
+        status, _, body = request(port, "GET", "/api/summary")
+        assert status == 200 and json.loads(body) == {'rows': 4, 'format': "webp"}
+
+        status, _, body = request(port, "GET", "/api/rows/1")
+        assert status == 200
+        row = json.loads(body)
+        assert (row['index'], row['image'], row['serial_number'], row['unsure']) == (1, "a.png", "", None)
+        assert request(port, "GET", "/api/rows/4")[0] == 404
+
+        # A row that is not labeled yet is displayed, and revalidated with its ETag
+        for kind in ("crop", "overlay"):
+            status, headers, payload = request(port, "GET", f"/rows/1/{kind}.webp")
+            assert status == 200 and headers['Content-Type'] == "image/webp"
+            assert cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR) is not None
+            status, _, payload = request(port, "GET", f"/rows/1/{kind}.webp",
+                                         headers={'If-None-Match': headers['ETag']})
+            assert status == 304 and payload == b""
+        etag = request(port, "GET", "/rows/1/overlay.jpeg")[1]['ETag']
+
+        status, _, body = request(port, "POST", "/api/rows/1", json.dumps({'serial_number': "55859550167",
+                                                                          'unsure': 1}),
+                                  {'Content-Type': "application/json"})
+        assert status == 200
+        assert (json.loads(body)['serial_number'], json.loads(body)['unsure']) == ("55859550167", 1.0)
+        assert request(port, "POST", "/api/rows/1", json.dumps({'image': "b.png"}))[0] == 400
+        # The edited serial number gives a new overlay
+        status, headers, _ = request(port, "GET", "/rows/1/overlay.jpeg", headers={'If-None-Match': etag})
+        assert status == 200 and headers['ETag'] != etag
+
+        status, _, body = request(port, "GET", "/rows/2/overlay.webp")
+        assert status == 404 and "missing image" in json.loads(body)['error']
+
+    run_with_server(store, str(tmp_path), exchange)
+    assert store.row(1)['serial_number'] == "55859550167"
+    store.journal.close()
+
+
+def test_render_failure_is_unprocessable(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+
+    def exchange(port):
+        status, _, body = request(port, "GET", "/rows/3/crop.webp")
+        assert status == 422 and "missing C1/C11" in json.loads(body)['error']
+
+    run_with_server(store, str(tmp_path), exchange)
+
+    def fail(*args, **kwargs):
+        raise ValueError("bad row")
+
+    monkeypatch.setattr("utils.review_server.render_frame", fail)
+
+    def exchange(port):
+        status, _, body = request(port, "GET", "/rows/0/crop.webp")
+        assert status == 422 and "render error: ValueError('bad row')" in json.loads(body)['error']
+
+    run_with_server(store, str(tmp_path), exchange)
+    store.journal.close()
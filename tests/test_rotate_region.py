@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils.image_processing import region_source_box, rotate_image, rotate_image_region, warp_region
+
+
+def assert_within_one_level(actual, expected):
+    """OpenCV rounds the source coordinates of a translated matrix slightly differently."""
+    assert actual.shape == expected.shape
+    assert np.abs(actual.astype(np.int16) - expected.astype(np.int16)).max(initial=0) <= 1
+
+
+def random_case(rng, at_border):
+    """Returns a random image, rotation and window, the window touching the borders of the image if asked."""
+    height, width = (int(size) for size in rng.integers(40, 400, 2))
+    channels = () if rng.random() < 0.5 else (3,)
+    image = rng.integers(0, 256, (height, width) + channels, dtype=np.uint8)
+    angle = float(rng.uniform(-60, 60))
+    center = (width // 2, height // 2)
+    x_min, y_min = int(rng.integers(0, width - 2)), int(rng.integers(0, height - 2))
+    x_max, y_max = int(rng.integers(x_min + 1, width + 1)), int(rng.integers(y_min + 1, height + 1))
+    if at_border:
+        x_min, y_min, x_max, y_max = [(0, y_min, x_max, y_max), (x_min, 0, x_max, y_max), (x_min, y_min, width, y_max),
+                                      (x_min, y_min, x_max, height), (0, 0, width, height)][int(rng.integers(5))]
+    return image, angle, center, (x_min, y_min, x_max, y_max)
+
+
+@pytest.mark.parametrize("at_border", [False, True])
+def test_region_matches_full_rotation(at_border):
+    rng = np.random.default_rng(2 if at_border else 1)
+    for _ in range(150):
+        image, angle, center, (x_min, y_min, x_max, y_max) = random_case(rng, at_border)
+        expected = rotate_image(image, angle, center)[y_min:y_max, x_min:x_max]
+        assert_within_one_level(rotate_image_region(image, angle, center, x_min, y_min, x_max, y_max), expected)
+
+
+def test_region_from_decoded_box_matches_full_rotation():
+    rng = np.random.default_rng(3)
+    for _ in range(150):
+        image, angle, center, (x_min, y_min, x_max, y_max) = random_case(rng, at_border=rng.random() < 0.5)
+        expected = rotate_image(image, angle, center)[y_min:y_max, x_min:x_max]
+        box = region_source_box(angle, center, x_min, y_min, x_max, y_max, image.shape)
+        if box[2] <= box[0] or box[3] <= box[1]:
+            # The window is entirely outside the image, `render_frame` shows it black
+            assert_within_one_level(np.zeros_like(expected), expected)
+            continue
+        region = image[box[1]:box[3], box[0]:box[2]]
+        assert_within_one_level(warp_region(region, angle, center, x_min, y_min, x_max, y_max, box[:2]), expected)
+
+
+def test_empty_window():
+    image = np.zeros((20, 30, 3), dtype=np.uint8)
+    assert rotate_image_region(image, 10.0, (15, 10), 5, 5, 5, 10).shape == (5, 0, 3)
@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils.journal import EditJournal
+from utils.sharding import CONFLICTS_FILE, load_shards, merge_shards, shard_path, split_sheet
+from utils.storage import load_table
+
+
+@pytest.fixture
+def master(tmp_path):
+    path = str(tmp_path / "master.xlsx")
+    # `a.png` appears twice, so that its two rows end up in different shards
+    pd.DataFrame({'image': ["a.png", "b.png", "c.png", "a.png", "d.png", "e.png"],
+                  'serial_number': ["A0", "B0", "C0", "A0", "D0", "E0"],
+                  'unsure': [0] * 6}).to_excel(path, index=False)
+    return path
+
+
+def edit_shard(shard_dir, name, master_row, **fields):
+    """Records an edit in the journal of a shard, as the UI does."""
+    shard = load_table(shard_path(shard_dir, name))
+    index = shard.index[shard['master_row'] == master_row][0]
+    journal = EditJournal(f"{shard_path(shard_dir, name)}.journal", fsync=False)
+    journal.append(index, shard.at[index, 'image'], **fields)
+    journal.close()
+
+
+def test_merge_applies_edits_and_reports_conflicts(tmp_path, master):
+    shard_dir = str(tmp_path / "shards")
+    assert split_sheet(master, shard_dir, ["ann", "bob"]) == {"ann": 3, "bob": 3}
+    edit_shard(shard_dir, "ann", 1, serial_number="B1")
+    edit_shard(shard_dir, "bob", 5, unsure=1)
+    # Both annotators change the same image differently
+    edit_shard(shard_dir, "ann", 0, serial_number="A1")
+    edit_shard(shard_dir, "bob", 3, serial_number="A2")
+    # The master sheet and an annotator change the same cell differently
+    edit_shard(shard_dir, "bob", 4, serial_number="D1")
+    edited = load_table(master)
+    edited.at[4, 'serial_number'] = "D2"
+    edited.to_excel(master, index=False)
+
+    applied, conflicts = merge_shards(shard_dir, str(tmp_path / "backup"))
+
+    assert applied == 2
+    assert sorted(conflicts) == [("a.png", "serial_number"), ("d.png", "serial_number")]
+    merged = load_table(master)
+    assert merged['serial_number'].tolist() == ["A0", "B1", "C0", "A0", "D2", "E0"]
+    assert merged['unsure'].tolist() == [0, 0, 0, 0, 0, 1]
+    report = pd.read_csv(os.path.join(shard_dir, CONFLICTS_FILE), dtype={'value': str})
+    rows = sorted(zip(report['image'], report['master_row'], report['source'], report['value']))
+    assert rows == [("a.png", 0, "ann", "A1"), ("a.png", 0, "base", "A0"),
+                    ("a.png", 3, "base", "A0"), ("a.png", 3, "bob", "A2"),
+                    ("d.png", 4, "base", "D0"), ("d.png", 4, "bob", "D1"), ("d.png", 4, "master", "D2")]
+    assert set(report['column']) == {"serial_number"}
+
+
+def test_merge_twice_is_a_no_op_and_split_again_archives(tmp_path, master):
+    shard_dir = str(tmp_path / "shards")
+    split_sheet(master, shard_dir, ["ann", "bob"])
+    with pytest.raises(RuntimeError):
+        split_sheet(master, shard_dir, ["ann", "bob"])
+    edit_shard(shard_dir, "ann", 2, serial_number="C1")
+    assert merge_shards(shard_dir, str(tmp_path / "backup")) == (1, [])
+    assert load_shards(shard_dir)['merged']
+    assert merge_shards(shard_dir, str(tmp_path / "backup")) == (0, [])
+    assert len(list(tmp_path.glob("backup_*.xlsx"))) == 1
+
+    assert split_sheet(master, shard_dir, ["carl"]) == {"carl": 6}
+    assert not load_shards(shard_dir).get('merged')
+    assert not os.path.exists(f"{shard_path(shard_dir, 'ann')}.journal")
+    assert load_table(shard_path(shard_dir, "carl"))['serial_number'].tolist()[2] == "C1"
+
+
+def test_split_and_merge_include_the_master_journal(tmp_path, master):
+    master_journal = EditJournal(f"{master}.journal", fsync=False)
+    master_journal.append(2, "c.png", serial_number="C1")
+    master_journal.close()
+    shard_dir = str(tmp_path / "shards")
+    split_sheet(master, shard_dir, ["ann", "bob"])
+    assert load_table(shard_path(shard_dir, "bob"))['serial_number'].tolist() == ["A0", "D0", "E0"]
+    assert load_table(shard_path(shard_dir, "ann"))['serial_number'].tolist() == ["A0", "B0", "C1"]
+
+    # Edited in the master session after the split, and by an annotator
+    master_journal = EditJournal(f"{master}.journal", fsync=False)
+    master_journal.append(4, "d.png", serial_number="D2")
+    master_journal.close()
+    edit_shard(shard_dir, "bob", 4, serial_number="D1")
+    edit_shard(shard_dir, "ann", 1, serial_number="B1")
+
+    assert merge_shards(shard_dir, str(tmp_path / "backup")) == (1, [("d.png", "serial_number")])
+    merged = load_table(master)
+    assert merged['serial_number'].tolist() == ["A0", "B1", "C1", "A0", "D2", "E0"]
+    # The journal was written into the sheet, so it is not replayed on top of the merge
+    assert os.path.getsize(f"{master}.journal") == 0
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.sheet_loader import LoadingStore, SheetLoader
+from utils.storage import DataFrameStore, OrderedStore
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+
+def read_reference(path):
+    return pd.read_excel(path, dtype={'serial_number': str})
+
+
+@pytest.mark.parametrize("name", ["serial_numbers.xlsx", "serial_numbers_test.xlsx"])
+def test_loader_matches_read_excel(name):
+    path = os.path.join(DATA_DIR, name)
+    loader = SheetLoader(path).start()
+    df = loader.wait()
+    pd.testing.assert_frame_equal(df, read_reference(path))
+    # Rows read while streaming are the same as those of the loaded DataFrame
+    assert loader.row(0).tolist() == df.iloc[0].tolist()
+
+
+def test_loader_matches_read_excel_on_mixed_cells(tmp_path):
+    path = str(tmp_path / "mixed.xlsx")
+    pd.DataFrame({'image': ["a.png", "b.png", "c.png", "d.png"],
+                  'serial_number': [55859550166, "558595204C8", None, 12.5],
+                  'C1': ["(1;2)", None, "(3;4)", ""],
+                  'unsure': [0, 1, np.nan, 1],
+                  'score': [0.25, 1.0, 2.0, np.nan]}).to_excel(path, index=False)
+    pd.testing.assert_frame_equal(SheetLoader(path).start().wait(), read_reference(path), check_dtype=False)
+
+
+def test_loader_reads_other_formats_with_load_table(tmp_path):
+    path = str(tmp_path / "sheet.csv")
+    reference = read_reference(os.path.join(DATA_DIR, "serial_numbers_test.xlsx"))
+    reference.to_csv(path, index=False)
+    assert SheetLoader(path).start().wait()['image'].tolist() == reference['image'].tolist()
+
+
+def test_loading_store_applies_wrapper_once_loaded():
+    path = os.path.join(DATA_DIR, "serial_numbers_test.xlsx")
+    reference = read_reference(path)
+    store = LoadingStore(SheetLoader(path), lambda df: DataFrameStore(df, None, None, path))
+    # Rows are read in the order of the sheet until it is loaded
+    assert store.row(0)['image'] == reference.at[0, 'image']
+    store.wrap(lambda loaded: OrderedStore(loaded, list(range(len(loaded)))[::-1]))
+    store.wait()
+    assert store.images() == reference['image'].tolist()[::-1]
+    assert store.row(0)['image'] == reference['image'].iloc[-1]
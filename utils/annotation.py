@@ -0,0 +1,355 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import Tk, Canvas, Label, Entry, StringVar, Frame
+
+import cv2
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageTk
+
+from utils.image_processing import CHARACTER_COLUMNS
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+_MARKER_RADIUS = 4
+# Height of the strip searched by `refine_positions`, and how far a position may move, relative to the spacing
+# between two characters
+REFINE_HEIGHT_RATIO = 1.6
+REFINE_SEARCH_RATIO = 0.35
+# Smallest blob considered a character, relative to the largest blob of the strip
+REFINE_MIN_AREA_RATIO = 0.2
+
+
+def list_images(image_dir):
+    """
+    Lists the images of a directory, sorted by name.
+
+    Args:
+        image_dir (str): Directory containing the images.
+
+    Returns:
+        list: Paths of the images.
+    """
+    return [os.path.join(image_dir, name) for name in sorted(os.listdir(image_dir))
+            if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+class AnnotationLog:
+    """
+    Append-only JSONL log of the annotated images, one line per image written as soon as it is complete.
+
+    A crash loses at most the image being annotated, and the images already in the log are skipped when the
+    session is restarted. The sheet is rebuilt from the log with `export`.
+    """
+
+    def __init__(self, path, fsync=True):
+        """
+        Args:
+            path (str): Path of the log, created if needed.
+            fsync (bool): Force every record to disk, so records also survive a system crash.
+        """
+        self.path = path
+        self.fsync = fsync
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as log_file:
+                for line in log_file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a truncated last line
+                        continue
+                    self.records[record['image']] = record
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            with open(path, "rb") as log_file:
+                log_file.seek(-1, os.SEEK_END)
+                if log_file.read(1) != b"\n":
+                    # Start the next record on its own line after a truncated one
+                    self._file.write("\n")
+
+    def __contains__(self, image):
+        return image in self.records
+
+    def append(self, image, serial_number, positions):
+        """
+        Records one annotated image.
+
+        Args:
+            image (str): File name of the image.
+            serial_number (str): The 11 characters typed by the annotator.
+            positions (list): The 11 `(x, y)` positions, in image pixels, rounded to the nearest pixel.
+        """
+        record = {'image': image, 'serial_number': serial_number,
+                  'positions': [[int(round(x)), int(round(y))] for x, y in positions]}
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records[image] = record
+
+    def to_dataframe(self):
+        """
+        Returns the annotations in the layout of the input sheet, sorted by image name.
+
+        Returns:
+            pd.DataFrame: `image`, `serial_number` and `C1` to `C11` as `"(x;y)"` strings.
+        """
+        rows = [{'image': record['image'], 'serial_number': record['serial_number'],
+                 **{column: f"({x};{y})" for column, (x, y) in zip(CHARACTER_COLUMNS, record['positions'])}}
+                for _, record in sorted(self.records.items())]
+        return pd.DataFrame(rows, columns=['image', 'serial_number'] + CHARACTER_COLUMNS)
+
+    def export(self, output_path):
+        """
+        Writes every annotation of the log to an Excel sheet.
+
+        Args:
+            output_path (str): Destination `.xlsx` file.
+        """
+        self.to_dataframe().to_excel(output_path, index=False)
+
+    def close(self):
+        """Closes the log file."""
+        with self._lock:
+            self._file.close()
+
+
+def interpolate_positions(first, last):
+    """
+    Spreads the 11 character positions evenly between the first and the last character, as `calculate_window`
+    assumes they are.
+
+    Args:
+        first (tuple): `(x, y)` position of `C1`.
+        last (tuple): `(x, y)` position of `C11`.
+
+    Returns:
+        ndarray: Float array of shape (11, 2).
+    """
+    steps = np.linspace(0, 1, len(CHARACTER_COLUMNS))[:, None]
+    return np.asarray(first, dtype=np.float64) + steps * (np.asarray(last, dtype=np.float64) - first)
+
+
+def refine_positions(image, positions):
+    """
+    Moves the intermediate positions (`C2` to `C10`) along the line from `C1` to `C11` onto the characters.
+
+    The strip around the line is warped upright and binarized with Otsu's threshold, the characters being the
+    minority of its pixels whether they are dark or light. Each position moves to the middle of the nearest blob
+    (connected component) of the strip, if one is within `REFINE_SEARCH_RATIO` of a spacing, and stays where it
+    is otherwise. `C1` and `C11`, clicked by the annotator, are kept.
+
+    Args:
+        image (ndarray): BGR or grayscale image, in the coordinates of `positions`.
+        positions (ndarray): (11, 2) positions, e.g. from `interpolate_positions`.
+
+    Returns:
+        ndarray: Refined (11, 2) positions, `positions` itself if the characters are too close to be told apart.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    direction = positions[-1] - positions[0]
+    length = np.linalg.norm(direction)
+    spacing = length / (len(positions) - 1)
+    if spacing < 4:
+        return positions
+    unit = direction / length
+    normal = np.array([-unit[1], unit[0]])
+    margin, half_height = spacing / 2, spacing * REFINE_HEIGHT_RATIO / 2
+    origin = positions[0] - margin * unit - half_height * normal
+    # Maps the pixels of the upright strip to the image
+    matrix = np.array([[unit[0], normal[0], origin[0]], [unit[1], normal[1], origin[1]]])
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    strip = cv2.warpAffine(gray, matrix, (int(np.ceil(length + 2 * margin)), int(np.ceil(2 * half_height))),
+                           flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+    _, mask = cv2.threshold(strip, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.count_nonzero(mask) > mask.size / 2:
+        mask = 1 - mask
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    # Blobs of the characters, without the background nor the specks of noise
+    stats = stats[1:count]
+    stats = stats[stats[:, cv2.CC_STAT_AREA] >= REFINE_MIN_AREA_RATIO * stats[:, cv2.CC_STAT_AREA].max()] \
+        if len(stats) else stats
+    centers = stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH] / 2
+
+    offsets = (positions - origin) @ np.stack([unit, normal], axis=1)
+    refined = positions.copy()
+    for k in range(1, len(positions) - 1):
+        along, across = offsets[k]
+        distances = np.abs(centers - along)
+        if len(distances) and distances.min() <= spacing * REFINE_SEARCH_RATIO:
+            refined[k] = origin + centers[distances.argmin()] * unit + across * normal
+    return refined
+
+
+def load_display_image(image_path, max_width, max_height):
+    """
+    Decodes an image and scales it down to fit the screen. Safe to call outside the Tk thread.
+
+    Args:
+        image_path (str): Path of the image.
+        max_width (int): Maximum displayed width.
+        max_height (int): Maximum displayed height.
+
+    Returns:
+        tuple or None: `(image, scale)` with the PIL image to display and its size relative to the original
+            image, or `None` if the image cannot be read.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    scale = min(1.0, max_width / image.shape[1], max_height / image.shape[0])
+    if scale < 1.0:
+        image = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)),
+                           interpolation=cv2.INTER_AREA)
+    return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)), scale
+
+
+def annotate_images(image_paths, log, two_click=False, refine=True):
+    """
+    Opens a window to click the 11 characters of each image and type its serial number.
+
+    Clicks and key presses are handled by Tk events, so the process is idle while waiting for the annotator. The
+    next image is decoded on a background thread while the current one is annotated. A right click removes the
+    last click, Enter saves the image once 11 positions and 11 characters are entered, and Escape quits.
+
+    In two-click mode only the first and the last characters are clicked, and the 9 others are spread evenly
+    between them, like `calculate_window` assumes, then optionally moved onto the characters of the image. They
+    are marked in blue to be checked before pressing Enter; the log is the same as with 11 clicks.
+
+    Args:
+        image_paths (list): Paths of the images to annotate, in order. Images already in `log` are skipped.
+        log (AnnotationLog): Log receiving every completed image.
+        two_click (bool): Whether only `C1` and `C11` are clicked.
+        refine (bool): Whether the positions computed in two-click mode are moved onto the characters, see
+            `refine_positions`.
+
+    Returns:
+        int: Number of images annotated in this session.
+    """
+    pending = [path for path in image_paths if os.path.basename(path) not in log]
+    if not pending:
+        return 0
+
+    root = Tk()
+    root.title("Annotate Image")
+    max_width, max_height = int(root.winfo_screenwidth() * 0.9), int(root.winfo_screenheight() * 0.8)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="annotation-decode")
+    state = {'position': 0, 'clicks': [], 'positions': None, 'scale': 1.0, 'annotated': 0, 'next': None,
+             'done': False}
+    required = 2 if two_click else len(CHARACTER_COLUMNS)
+
+    canvas = Canvas(root, highlightthickness=0, cursor="crosshair")
+    canvas.pack()
+    controls = Frame(root)
+    controls.pack(pady=5)
+    status_var = StringVar()
+    Label(controls, textvariable=status_var).pack(side="left", padx=10)
+    serial_var = StringVar()
+    serial_entry = Entry(controls, textvariable=serial_var, width=15, justify='center')
+    serial_entry.pack(side="left", padx=10)
+
+    def update_status():
+        """Shows the progress and what the annotator has to do next."""
+        name = os.path.basename(pending[state['position']])
+        clicks = len(state['clicks'])
+        if clicks == required:
+            hint = "type the serial number and press Enter"
+        elif two_click:
+            hint = "click the first character" if clicks == 0 else "click the last character"
+        else:
+            hint = f"click character {clicks + 1}"
+        status_var.set(f"{state['position'] + 1}/{len(pending)} {name}: {hint}")
+
+    def show(position):
+        """Displays the image at `position` of the pending list, skipping unreadable ones."""
+        while position < len(pending):
+            future = state['next'] if state['next'] is not None and state['next'][0] == position else None
+            loaded = future[1].result() if future else load_display_image(pending[position], max_width, max_height)
+            if loaded is not None:
+                break
+            print(f"Could not read {pending[position]}, skipped.")
+            position += 1
+        else:
+            finish()
+            return
+        image, scale = loaded
+        state.update(position=position, clicks=[], positions=None, scale=scale, image=image)
+        # Decode the next image while this one is annotated
+        if position + 1 < len(pending):
+            state['next'] = (position + 1, executor.submit(load_display_image, pending[position + 1],
+                                                           max_width, max_height))
+        state['photo'] = ImageTk.PhotoImage(image)
+        canvas.delete("all")
+        canvas.config(width=image.width, height=image.height)
+        canvas.create_image(0, 0, anchor="nw", image=state['photo'])
+        serial_var.set("")
+        canvas.focus_set()
+        update_status()
+
+    def on_click(event):
+        """Records the position of the next character and marks it on the image."""
+        if len(state['clicks']) >= required:
+            return
+        state['clicks'].append((event.x, event.y))
+        canvas.create_oval(event.x - _MARKER_RADIUS, event.y - _MARKER_RADIUS, event.x + _MARKER_RADIUS,
+                           event.y + _MARKER_RADIUS, outline="red", width=2, tags=f"click{len(state['clicks'])}")
+        if len(state['clicks']) == required:
+            if two_click:
+                fill_positions()
+            else:
+                state['positions'] = list(state['clicks'])
+            serial_entry.focus_set()
+        update_status()
+
+    def fill_positions():
+        """Computes the characters between the two clicks, on the displayed image, and marks them."""
+        positions = interpolate_positions(*state['clicks'])
+        if refine:
+            positions = refine_positions(np.asarray(state['image'].convert("L")), positions)
+        state['positions'] = [tuple(position) for position in positions]
+        for x, y in positions[1:-1]:
+            canvas.create_oval(x - _MARKER_RADIUS, y - _MARKER_RADIUS, x + _MARKER_RADIUS, y + _MARKER_RADIUS,
+                               outline="blue", width=2, tags="computed")
+
+    def on_undo(event):
+        """Removes the last recorded position, and the positions computed from it."""
+        if state['clicks']:
+            canvas.delete(f"click{len(state['clicks'])}")
+            canvas.delete("computed")
+            state['clicks'].pop()
+            state['positions'] = None
+            canvas.focus_set()
+            update_status()
+
+    def on_enter(event):
+        """Writes the annotation of the image to the log and shows the next image."""
+        serial_number = serial_var.get().strip()
+        if state['positions'] is None or len(serial_number) != len(CHARACTER_COLUMNS):
+            root.bell()
+            return
+        positions = [(x / state['scale'], y / state['scale']) for x, y in state['positions']]
+        log.append(os.path.basename(pending[state['position']]), serial_number, positions)
+        state['annotated'] += 1
+        show(state['position'] + 1)
+
+    def finish(event=None):
+        """Closes the window. Every completed image is already in the log."""
+        state['done'] = True
+        executor.shutdown(wait=False, cancel_futures=True)
+        root.quit()
+        root.destroy()
+
+    canvas.bind("<Button-1>", on_click)
+    canvas.bind("<Button-3>", on_undo)
+    root.bind("<Return>", on_enter)
+    root.bind("<Escape>", finish)
+    root.protocol("WM_DELETE_WINDOW", finish)
+
+    show(0)
+    if not state['done']:
+        root.mainloop()
+    return state['annotated']
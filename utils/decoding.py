@@ -0,0 +1,220 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# EXIF orientations for which cv2.imread swaps the width and height of JPEG images
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+_TIFF_EXTENSIONS = (".tif", ".tiff")
+_PNG_EXTENSIONS = (".png",)
+# Samples per pixel of the raw (uncompressed) 8-bit TIFF layouts read by `_decode_tiff_region`, also the PNG
+# modes decoded by `_decode_png_rows`. Files with alpha are left to `cv2.imread`, which multiplies the colors of
+# TIFF files by the alpha.
+_RAW_SAMPLES = {"L": 1, "RGB": 3}
+
+
+def read_image_size(image_path):
+    """
+    Reads the dimensions of an image from its header, without decoding the pixels.
+
+    The dimensions are those `cv2.imread` returns, i.e. after applying the EXIF orientation of JPEG files.
+
+    Args:
+        image_path (str): Path of the image.
+
+    Returns:
+        tuple or None: `(height, width)`, or `None` if the file cannot be identified as an image.
+    """
+    try:
+        with Image.open(image_path) as image:
+            width, height = image.size
+            if image.format == "JPEG" and image.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return height, width
+
+
+def _pil_to_bgr(image):
+    """Converts a decoded 8-bit PIL image to the BGR layout returned by `cv2.imread`."""
+    if image.mode == "L":
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_GRAY2BGR)
+    if image.mode == "RGBA":
+        image = image.convert("RGB")
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+def _decode_tiff_region(image_path, x_min, y_min, x_max, y_max):
+    """
+    Reads only the rows of the strips or tiles of an uncompressed TIFF file that intersect a box, straight from
+    the file, so memory grows with the box and not with the image.
+
+    Compressed files are not handled: Pillow decodes them in one piece through libtiff, which would allocate the
+    full frame anyway, so `None` is returned and the caller decodes the whole image.
+
+    Args:
+        image_path (str): Path of the TIFF file.
+        x_min, y_min, x_max, y_max (int): Box to decode, inside the image.
+
+    Returns:
+        ndarray or None: BGR pixels of the box, or `None` if the file is not an uncompressed 8-bit gray or RGB
+            TIFF.
+    """
+    with Image.open(image_path) as image:
+        if image.getexif().get(0x0112, 1) != 1:
+            return None
+        tiles = [tile for tile in image.tile
+                 if tile[1][0] < x_max and tile[1][2] > x_min and tile[1][1] < y_max and tile[1][3] > y_min]
+        # Uncompressed, top-down, interleaved 8-bit gray or RGB samples only
+        if not tiles or any(codec != "raw" or args[0] not in _RAW_SAMPLES or args[2] != 1
+                            for codec, _, _, args in tiles):
+            return None
+        rawmode = tiles[0][3][0]
+        region = np.zeros((y_max - y_min, x_max - x_min, _RAW_SAMPLES[rawmode]), dtype=np.uint8)
+        with open(image_path, "rb") as tiff_file:
+            for _, (left, top, right, bottom), offset, (tile_rawmode, stride, _) in tiles:
+                if tile_rawmode != rawmode:
+                    return None
+                samples = _RAW_SAMPLES[rawmode]
+                stride = stride or (right - left) * samples
+                first_row, last_row = max(top, y_min), min(bottom, y_max)
+                first_column, last_column = max(left, x_min), min(right, x_max)
+                tiff_file.seek(offset + (first_row - top) * stride)
+                data = tiff_file.read((last_row - first_row) * stride)
+                if len(data) < (last_row - first_row) * stride:
+                    return None
+                rows = np.frombuffer(data, dtype=np.uint8).reshape(last_row - first_row, stride)
+                rows = rows[:, (first_column - left) * samples:(last_column - left) * samples]
+                region[first_row - y_min:last_row - y_min, first_column - x_min:last_column - x_min] = \
+                    rows.reshape(last_row - first_row, last_column - first_column, samples)
+    return cv2.cvtColor(region, cv2.COLOR_GRAY2BGR if rawmode == "L" else cv2.COLOR_RGB2BGR)
+
+
+def _decode_png_rows(image_path, x_min, y_min, x_max, y_max):
+    """
+    Decodes a PNG file only down to the last row of a box, then crops the box.
+
+    PNG rows are compressed as one stream, so the rows above the box still have to be decompressed, but
+    decoding stops at the bottom of the box: time and memory grow with `y_max` instead of the image height.
+
+    Args:
+        image_path (str): Path of the PNG file.
+        x_min, y_min, x_max, y_max (int): Box to decode, inside the image.
+
+    Returns:
+        ndarray or None: BGR pixels of the box, or `None` if the file is not a non-interlaced 8-bit gray or RGB
+            PNG.
+    """
+    with Image.open(image_path) as image:
+        # `getexif` would decode the whole image, files with EXIF data are left to `cv2.imread` and its rotation
+        if image.format != "PNG" or image.mode not in _RAW_SAMPLES or image.info.get("interlace") \
+                or "exif" in image.info or len(image.tile) != 1:
+            return None
+        codec, _, offset, rawmode = image.tile[0]
+        if codec != "zip" or rawmode != image.mode:
+            return None
+        # The decoder stops once the rows of the truncated image are filled
+        image.tile = [(codec, (0, 0, image.size[0], y_max), offset, rawmode)]
+        image._size = (image.size[0], y_max)
+        image.load()
+        region = image.crop((x_min, y_min, x_max, y_max))
+        return _pil_to_bgr(region)
+
+
+def decode_region(image_path, x_min, y_min, x_max, y_max):
+    """
+    Decodes a rectangular region of an image, reading as little of the file as the format allows.
+
+    Uncompressed TIFF files only read the rows of the strips or tiles covering the region, and PNG files are
+    decoded down to the last row of the region. Other formats, JPEG and compressed TIFF files included, are
+    decoded in full and cropped, so only the region is kept in memory afterwards.
+
+    Args:
+        image_path (str): Path of the image.
+        x_min, y_min, x_max, y_max (int): Region to decode, inside the image.
+
+    Returns:
+        ndarray or None: BGR pixels of the region, identical to slicing `cv2.imread`, or `None` if the image
+            cannot be read.
+    """
+    extension = os.path.splitext(image_path)[1].lower()
+    partial_decoder = _decode_tiff_region if extension in _TIFF_EXTENSIONS else \
+        _decode_png_rows if extension in _PNG_EXTENSIONS else None
+    if partial_decoder is not None:
+        try:
+            region = partial_decoder(image_path, x_min, y_min, x_max, y_max)
+        except (OSError, ValueError):
+            region = None
+        if region is not None:
+            return region
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    return image[y_min:y_max, x_min:x_max].copy()
+
+
+def _decode_tiff_level(image_path, min_width):
+    """
+    Decodes the smallest level of a pyramidal TIFF that is still at least `min_width` pixels wide.
+
+    Args:
+        image_path (str): Path of the TIFF file.
+        min_width (int): Minimum width of the decoded level.
+
+    Returns:
+        ndarray or None: BGR pixels of the level, or `None` if the file has no suitable reduced level.
+    """
+    with Image.open(image_path) as image:
+        full_width, full_height = image.size
+        best_frame, best_width = None, full_width
+        for frame in range(1, getattr(image, "n_frames", 1)):
+            image.seek(frame)
+            width, height = image.size
+            # Pyramid levels keep the aspect ratio of the full image
+            if min_width <= width < best_width and abs(width * full_height - height * full_width) <= full_width:
+                best_frame, best_width = frame, width
+        if best_frame is None:
+            return None
+        image.seek(best_frame)
+        if image.mode not in ("L", "RGB", "RGBA"):
+            return None
+        image.load()
+        return _pil_to_bgr(image)
+
+
+def decode_reduced(image_path, image_size, min_width):
+    """
+    Decodes an image at the lowest resolution that is still at least `min_width` pixels wide.
+
+    JPEG files are decoded at 1/2, 1/4 or 1/8 scale by the codec itself, and pyramidal TIFF files use their
+    closest reduced level. Other formats fall back to the same OpenCV reduced-decode flags.
+
+    Args:
+        image_path (str): Path of the image.
+        image_size (tuple): Full `(height, width)` of the image, see `read_image_size`.
+        min_width (int): Minimum width needed by the display.
+
+    Returns:
+        tuple: `(image, scale)` where `scale` is the width of the decoded image divided by the full width, or
+            `(None, 1.0)` if the image cannot be read.
+    """
+    full_width = image_size[1]
+    if os.path.splitext(image_path)[1].lower() in _TIFF_EXTENSIONS:
+        try:
+            level = _decode_tiff_level(image_path, min_width)
+        except (OSError, ValueError):
+            level = None
+        if level is not None:
+            return level, level.shape[1] / full_width
+
+    factor = 1
+    for candidate in (8, 4, 2):
+        if full_width // candidate >= min_width:
+            factor = candidate
+            break
+    image = cv2.imread(image_path, _REDUCED_FLAGS[factor] if factor > 1 else cv2.IMREAD_COLOR)
+    if image is None:
+        return None, 1.0
+    return image, image.shape[1] / full_width
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Part of every key, bumped when the arrays stored for a row change, e.g. when the displays became BGR
+CACHE_FORMAT = 2
+
+
+def render_cache_key(image_path, positions, serial_number, h_pad, v_pad):
+    """
+    Builds the content address of a rendered row.
+
+    The key changes whenever the image file, the character positions, the serial number drawn on the overlay or
+    the cropping paddings change, so stale entries are never returned.
+
+    Args:
+        image_path (str): Path of the source image.
+        positions (ndarray): (11, 2) character positions of the row.
+        serial_number (str): Serial number drawn on the overlay.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+
+    Returns:
+        str or None: Hex digest of the key, or `None` if the image does not exist.
+    """
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(image_path).encode())
+    digest.update(f"|{stat.st_mtime_ns}|{stat.st_size}|{serial_number}|{h_pad}|{v_pad}|{CACHE_FORMAT}|".encode())
+    digest.update(np.ascontiguousarray(positions, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Content-addressed on-disk cache of rendered rows, bounded in bytes with least-recently-used eviction.
+
+    Each entry is a single uncompressed `.npz` file holding named arrays. Recency is tracked through the file
+    modification time, so it survives across sessions.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 ** 2):
+        """
+        Args:
+            directory (str): Directory holding the cache entries, created if needed.
+            max_bytes (int): Total size budget of the cache in bytes.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime_ns, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        """Returns the file path of an entry."""
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Reads an entry and marks it as recently used.
+
+        Args:
+            key (str): Entry key, see `render_cache_key`.
+
+        Returns:
+            dict or None: Arrays stored under the key, or `None` on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+        return arrays
+
+    def put(self, key, **arrays):
+        """
+        Stores arrays under a key and evicts the least recently used entries beyond the byte budget.
+
+        Args:
+            key (str): Entry key, see `render_cache_key`.
+            **arrays (ndarray): Named arrays to store.
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as temp_file:
+            np.savez(temp_file, **arrays)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _forget(self, key):
+        """Drops an unreadable entry from the index."""
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
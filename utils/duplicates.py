@@ -0,0 +1,213 @@
+import itertools
+import os
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from utils.prelabel import collect_patches
+
+# Size (width, height) of the gradient grid: 4 rows of 64 horizontal differences, about 6 per character
+HASH_SIZE = (64, 4)
+HASH_BYTES = HASH_SIZE[0] * HASH_SIZE[1] // 8
+# Largest number of bits of the chunks of a hash looked up separately by `find_pairs`
+CHUNK_BITS = 16
+INDEX_COLUMNS = ['image', 'hash', 'cluster', 'cluster_size']
+# Number of set bits of every byte, for NumPy versions without `bitwise_count`
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+_BITWISE_COUNT = getattr(np, "bitwise_count", None)
+
+
+def strip_hash(patches):
+    """
+    Computes the difference hash (dHash) of the serial number strip of a row.
+
+    The strip is rebuilt from the character patches of `extract_character_patches`, which are already rotated
+    upright and scaled to the spacing of the characters, so two shots of the same part get close hashes even
+    when they are not framed alike. Each bit tells whether the brightness increases from one cell of the grid to
+    the next, which does not depend on the exposure of the image.
+
+    Args:
+        patches (ndarray): Uint8 character patches of shape (11, height, width).
+
+    Returns:
+        ndarray: Uint8 array of `HASH_BYTES` bytes.
+    """
+    strip = np.hstack(list(patches))
+    grid = cv2.resize(strip, (HASH_SIZE[0] + 1, HASH_SIZE[1]), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return np.packbits(grid[:, 1:] > grid[:, :-1])
+
+
+def compute_hashes(df, coordinates, images_dir, workers=8):
+    """
+    Hashes the strip of every row in parallel.
+
+    Args:
+        df (pd.DataFrame): Data containing `image` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions, see `parse_coordinates`.
+        images_dir (str): Directory containing the images.
+        workers (int): Number of threads decoding and warping the strips.
+
+    Returns:
+        tuple: `(rows, hashes)`, the positions of the rows whose strip could be extracted and their
+            (M, `HASH_BYTES`) hashes.
+    """
+    patches = collect_patches(df, coordinates, images_dir, list(range(len(df))), workers)
+    rows = np.array(sorted(patches), dtype=np.int64)
+    hashes = np.array([strip_hash(patches[index]) for index in rows], dtype=np.uint8).reshape(len(rows), HASH_BYTES)
+    return rows, hashes
+
+
+def hamming_distances(hashes, first, second):
+    """
+    Counts the differing bits of pairs of hashes.
+
+    Args:
+        hashes (ndarray): (N, `HASH_BYTES`) hashes.
+        first (ndarray): Position of the first hash of each pair.
+        second (ndarray): Position of the second hash of each pair.
+
+    Returns:
+        ndarray: Number of differing bits of each pair.
+    """
+    if _BITWISE_COUNT is not None:
+        words = hashes.view(np.uint64)
+        return _BITWISE_COUNT(words[first] ^ words[second]).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT[hashes[first] ^ hashes[second]].sum(axis=1, dtype=np.int64)
+
+
+def find_pairs(hashes, max_distance):
+    """
+    Finds every pair of distinct hashes within a Hamming distance, without comparing all pairs.
+
+    Multi-index hashing: the bits of the hashes are cut into `chunks` chunks of at most `CHUNK_BITS` bits, and
+    two hashes within `max_distance` bits have at least one chunk within `max_distance // chunks` bits of each
+    other. There are enough chunks for that distance to be at most 1. Each chunk is therefore looked up, in a
+    table of the hashes by chunk value, as is and with each of its bits flipped, and only the hashes found this
+    way are compared on their whole length. The candidates are compared after every lookup so that memory
+    stays proportional to the number of pairs.
+
+    Args:
+        hashes (ndarray): Contiguous (N, `HASH_BYTES`) hashes, without duplicates.
+        max_distance (int): Largest number of differing bits of a pair.
+
+    Returns:
+        ndarray: (P, 2) positions of the pairs, the first lower than the second.
+    """
+    bits = np.unpackbits(hashes, axis=1)
+    chunk_count = min(max(-(-bits.shape[1] // CHUNK_BITS), max_distance // 2 + 1), bits.shape[1])
+    radius = max_distance // chunk_count
+    positions = np.arange(len(hashes), dtype=np.int64)
+    candidates = [np.empty(0, dtype=np.int64)]
+    for chunk in np.array_split(np.arange(bits.shape[1]), chunk_count):
+        values = bits[:, chunk].astype(np.int64) @ (1 << np.arange(len(chunk), dtype=np.int64))
+        # Hashes sorted by chunk value, and where each value starts in that order
+        order = np.argsort(values, kind="stable")
+        counts = np.bincount(values, minlength=1 << len(chunk))
+        starts = np.cumsum(counts) - counts
+        flips = [sum(1 << bit for bit in flipped) for distance in range(radius + 1)
+                 for flipped in itertools.combinations(range(len(chunk)), distance)]
+        for flip in flips:
+            targets = values ^ flip
+            matches = counts[targets]
+            first = np.repeat(positions, matches)
+            # Position of each match in the sorted hashes, run by run
+            offsets = np.arange(len(first)) - np.repeat(np.cumsum(matches) - matches, matches)
+            second = order[np.repeat(starts[targets], matches) + offsets]
+            keep = first < second
+            first, second = first[keep], second[keep]
+            close = hamming_distances(hashes, first, second) <= max_distance
+            # Pairs found through several chunks are merged below, as single integers
+            candidates.append(first[close] * len(hashes) + second[close])
+    pairs = np.unique(np.concatenate(candidates))
+    return np.stack([pairs // len(hashes), pairs % len(hashes)], axis=1)
+
+
+def connected_components(count, pairs):
+    """
+    Labels the connected components of a graph by propagating the lowest node of each component along its edges.
+
+    Args:
+        count (int): Number of nodes.
+        pairs (ndarray): (P, 2) edges.
+
+    Returns:
+        ndarray: Lowest node of the component of every node.
+    """
+    labels = np.arange(count, dtype=np.int64)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, pairs[:, 0], labels[pairs[:, 1]])
+        np.minimum.at(labels, pairs[:, 1], labels[pairs[:, 0]])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def cluster_hashes(hashes, max_distance):
+    """
+    Groups near-duplicate hashes. Identical hashes are merged first, so a part shot many times is a single node
+    of the search.
+
+    Clusters are connected components: two rows are in the same cluster when a chain of rows, each within
+    `max_distance` bits of the next, links them.
+
+    Args:
+        hashes (ndarray): (N, `HASH_BYTES`) hashes.
+        max_distance (int): Largest number of differing bits between two rows of a chain.
+
+    Returns:
+        ndarray: Cluster of every hash, the position of its first hash.
+    """
+    if not len(hashes):
+        return np.empty(0, dtype=np.int64)
+    unique, first, inverse = np.unique(hashes, axis=0, return_index=True, return_inverse=True)
+    components = connected_components(len(unique), find_pairs(np.ascontiguousarray(unique), max_distance))
+    # Named after the first hash of the cluster, in the order of the sheet
+    names = np.full(len(unique), len(hashes), dtype=np.int64)
+    np.minimum.at(names, components, first)
+    return names[components][inverse.reshape(-1)]
+
+
+def build_index(df, coordinates, images_dir, max_distance=32, workers=8):
+    """
+    Hashes the strip of every row and groups the near-duplicates.
+
+    Args:
+        df (pd.DataFrame): Data containing `image` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions, see `parse_coordinates`.
+        images_dir (str): Directory containing the images.
+        max_distance (int): Largest number of differing bits of two near-duplicates, out of
+            `8 * HASH_BYTES`.
+        workers (int): Number of threads.
+
+    Returns:
+        pd.DataFrame: `INDEX_COLUMNS` for every row whose strip could be extracted, in the order of the sheet.
+            `cluster` is the image of the first row of the cluster.
+    """
+    rows, hashes = compute_hashes(df, coordinates, images_dir, workers)
+    images = df['image'].astype(str).to_numpy()[rows]
+    clusters = cluster_hashes(hashes, max_distance)
+    sizes = np.bincount(clusters, minlength=len(rows))[clusters] if len(rows) else clusters
+    return pd.DataFrame({'image': images, 'hash': [row.tobytes().hex() for row in hashes],
+                         'cluster': images[clusters], 'cluster_size': sizes}, columns=INDEX_COLUMNS)
+
+
+def load_clusters(path):
+    """
+    Reads the near-duplicate clusters written by `duplicates.py`.
+
+    Args:
+        path (str): CSV index.
+
+    Returns:
+        dict: Image names of the rows of its cluster, itself included, by image name, only for the images with
+            near-duplicates. Empty if the file does not exist.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    index = pd.read_csv(path, dtype={'image': str, 'hash': str, 'cluster': str})
+    index = index[index['cluster_size'] > 1]
+    members = index.groupby('cluster', sort=False)['image'].agg(list).to_dict()
+    # The rows of a cluster share the same list
+    return {image: members[cluster] for image, cluster in zip(index['image'], index['cluster'])}
@@ -1,13 +1,13 @@
 import os
+import shutil
 from datetime import datetime
 
 
-def save_data(old_df, new_df, output_file_path, input_file_path):
+def save_data(new_df, output_file_path, input_file_path):
     """
     Saves the modified data by overwriting the input file with updated data and creating a timestamped backup of the old data.
 
     Args:
-        old_df (pd.DataFrame): Original DataFrame containing the data prior to modifications.
         new_df (pd.DataFrame): Modified DataFrame with updates.
         output_file_path (str): Directory path and prefix for saving the backup file of the old data.
         input_file_path (str): File path for overwriting the original data with the updated data.
@@ -15,11 +15,11 @@ def save_data(old_df, new_df, output_file_path, input_file_path):
     Returns:
         None
     """
-    # Copy the input file into output file path with timestamp
-    final_new_file_path = input_file_path
+    # Back up the current input file with a timestamp before overwriting it
+    if os.path.exists(input_file_path):
+        final_old_file_path = f"{output_file_path}_{datetime.now().strftime('%d-%m_%Hh_%Mm_%Ss')}.xlsx"
+        shutil.copy2(input_file_path, final_old_file_path)
+    # Replace input file with the updated data
     new_df['serial_number'] = new_df['serial_number'].astype(str).replace('nan', '')
-    new_df.to_excel(final_new_file_path, index=False)
-    # Replace input file with output file
-    final_old_file_path = f"{output_file_path}_{datetime.now().strftime('%d-%m_%Hh_%Mm_%Ss')}.xlsx"
-    old_df.to_excel(final_old_file_path, index=False)
+    new_df.to_excel(input_file_path, index=False)
     print("Corrected data saved.")
@@ -0,0 +1,125 @@
+import cv2
+import numpy as np
+
+# Chains used when `config.yaml` has no `filters` section, matching the original "Unsure" view: edges with
+# strong contrast on the strip, and the strip with mild contrast in place of the overlay.
+DEFAULT_FILTERS = {
+    'cropped': [{'name': 'edges'}, {'name': 'contrast', 'factor': 5.0}],
+    'character': [{'name': 'contrast', 'factor': 2.0}],
+}
+
+_EDGE_KERNEL = np.array([[-1, -1, -1], [-1, 8, -1], [-1, -1, -1]], dtype=np.float32)
+
+
+def _grayscale(image):
+    """Returns a single-channel version of a BGR or grayscale image."""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def contrast(image, factor=2.0):
+    """
+    Scales the distance of every pixel to the mean gray level, like `PIL.ImageEnhance.Contrast`.
+
+    Args:
+        image (ndarray): BGR or grayscale image.
+        factor (float): Contrast factor, `1.0` leaves the image unchanged.
+
+    Returns:
+        ndarray: Image with enhanced contrast.
+    """
+    mean = int(_grayscale(image).mean() + 0.5)
+    return cv2.addWeighted(image, factor, np.full_like(image, mean), 1.0 - factor, 0)
+
+
+def clahe(image, clip_limit=2.0, tile_size=8):
+    """
+    Applies contrast limited adaptive histogram equalization to the lightness of the image.
+
+    Args:
+        image (ndarray): BGR or grayscale image.
+        clip_limit (float): Contrast limit of each tile.
+        tile_size (int): Number of tiles along each side of the image.
+
+    Returns:
+        ndarray: Equalized image.
+    """
+    equalizer = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size))
+    if image.ndim == 2:
+        return equalizer.apply(image)
+    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+    lab[:, :, 0] = equalizer.apply(lab[:, :, 0])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def edges(image):
+    """
+    Highlights edges with the 3x3 Laplacian kernel of `PIL.ImageFilter.FIND_EDGES`.
+
+    Args:
+        image (ndarray): BGR or grayscale image.
+
+    Returns:
+        ndarray: Grayscale edge image.
+    """
+    return cv2.filter2D(_grayscale(image), -1, _EDGE_KERNEL)
+
+
+def adaptive_threshold(image, block_size=31, offset=10):
+    """
+    Binarizes the image against the Gaussian-weighted mean of each neighbourhood.
+
+    Args:
+        image (ndarray): BGR or grayscale image.
+        block_size (int): Odd size of the neighbourhood.
+        offset (float): Constant subtracted from the neighbourhood mean.
+
+    Returns:
+        ndarray: Black and white image.
+    """
+    return cv2.adaptiveThreshold(_grayscale(image), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                 block_size | 1, offset)
+
+
+def sharpen(image, amount=1.0, sigma=1.5):
+    """
+    Sharpens the image with an unsharp mask.
+
+    Args:
+        image (ndarray): BGR or grayscale image.
+        amount (float): Strength of the sharpening.
+        sigma (float): Standard deviation of the blur subtracted from the image.
+
+    Returns:
+        ndarray: Sharpened image.
+    """
+    blurred = cv2.GaussianBlur(image, (0, 0), sigma)
+    return cv2.addWeighted(image, 1.0 + amount, blurred, -amount, 0)
+
+
+FILTERS = {
+    'contrast': contrast,
+    'clahe': clahe,
+    'edges': edges,
+    'adaptive_threshold': adaptive_threshold,
+    'sharpen': sharpen,
+}
+
+
+def apply_filters(image, chain):
+    """
+    Applies a chain of filters, as listed in the `filters` section of `config.yaml`, to an image.
+
+    Args:
+        image (ndarray): BGR image, e.g. the cropped strip before it is resized for display.
+        chain (list): Filters to apply in order, each a dict with a `name` from `FILTERS` and its parameters.
+
+    Returns:
+        ndarray: Filtered BGR image.
+    """
+    for step in chain:
+        parameters = dict(step)
+        name = parameters.pop('name')
+        if name not in FILTERS:
+            raise ValueError(f"Unknown filter '{name}', expected one of {', '.join(FILTERS)}")
+        image = FILTERS[name](image, **parameters)
+    return image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
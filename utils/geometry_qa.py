@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.decoding import read_image_size
+from utils.image_processing import CHARACTER_COLUMNS, calculate_windows, rotation_matrices, transform_points
+
+ERROR, WARNING, INFO = "error", "warning", "info"
+SEVERITIES = (ERROR, WARNING, INFO)
+REPORT_COLUMNS = ['severity', 'issue', 'row', 'image', 'detail']
+# Two characters closer than this, in pixels, are considered the same click
+DUPLICATE_DISTANCE = 1.0
+
+
+def read_image_sizes(images, images_dir, workers=8):
+    """
+    Reads the size of every image from its header, without decoding the pixels.
+
+    Args:
+        images (list): Image names.
+        images_dir (str): Directory containing the images.
+        workers (int): Number of threads reading the headers.
+
+    Returns:
+        ndarray: Float array of shape (N, 2) holding `(height, width)`, NaN for missing or unreadable images.
+    """
+    def size(image):
+        shape = read_image_size(os.path.join(images_dir, str(image)))
+        return (np.nan, np.nan) if shape is None else shape
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geometry-qa") as executor:
+        sizes = list(executor.map(size, images, chunksize=256))
+    return np.asarray(sizes, dtype=np.float64).reshape(len(sizes), 2)
+
+
+def check_geometry(df, coordinates, image_sizes, h_pad=30, v_pad=40):
+    """
+    Checks the annotations of every row at once, with the computations of `calculate_window`,
+    `get_window_bounds` and `get_rotated_positions_and_check_all_inside` done on whole arrays.
+
+    Errors are rows the reviewer cannot display or whose overlay would be wrong: missing image, missing
+    `C1`/`C11`, characters outside the image, a window entirely outside the image, duplicate or out-of-order
+    positions, and serial numbers that do not have one character per position. Warnings are rows displayed
+    differently than usual, and infos are rows that are simply not labeled yet.
+
+    Args:
+        df (pd.DataFrame): Data with `image`, `serial_number` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions, see `parse_coordinates`.
+        image_sizes (ndarray): (N, 2) image sizes as `(height, width)`, NaN for missing images, see
+            `read_image_sizes`.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+
+    Returns:
+        pd.DataFrame: One line per issue with `REPORT_COLUMNS`, most severe first, then by row.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    image_sizes = np.asarray(image_sizes, dtype=np.float64)
+    images = df['image'].astype(str).to_numpy()
+    columns = np.asarray(CHARACTER_COLUMNS)
+    issues = []
+
+    def report(mask, severity, issue, details):
+        """
+        Adds one issue for every row of `mask`. `details` is a string, or a function returning the detail of
+        each flagged row from their positions, so that text is only formatted for the rows with the issue.
+        """
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            details = details(rows) if callable(details) else [details] * len(rows)
+            issues.append(pd.DataFrame({'severity': severity, 'issue': issue, 'row': rows, 'image': images[rows],
+                                        'detail': details}))
+
+    has_image = ~np.isnan(image_sizes).any(axis=1)
+    report(~has_image, ERROR, "missing_image", "image missing or unreadable")
+    missing = np.isnan(coordinates).any(axis=2)
+    report(missing[:, 0] | missing[:, -1], ERROR, "missing_endpoints", "C1 or C11 missing, the row is skipped")
+    intermediate = missing[:, 1:-1].any(axis=1) & ~(missing[:, 0] | missing[:, -1])
+    report(intermediate, WARNING, "missing_positions",
+           lambda rows: [", ".join(columns[missing[row]]) for row in rows])
+
+    # Serial numbers, drawn one character per position on the overlay
+    serials = df['serial_number'].astype("string").fillna("").str.strip()
+    serials = serials.mask(serials == "nan", "")
+    lengths = serials.str.len().to_numpy()
+    report(lengths == 0, INFO, "unlabeled", "no serial number")
+    report((lengths != 0) & (lengths != len(CHARACTER_COLUMNS)), ERROR, "serial_length",
+           lambda rows: [f"{lengths[row]} characters instead of {len(CHARACTER_COLUMNS)}" for row in rows])
+
+    # Positions outside the image
+    heights, widths = image_sizes[:, 0:1], image_sizes[:, 1:2]
+    xs, ys = coordinates[..., 0], coordinates[..., 1]
+    with np.errstate(invalid="ignore"):
+        outside_image = (xs < 0) | (ys < 0) | (xs >= widths) | (ys >= heights)
+    report(outside_image.any(axis=1), ERROR, "outside_image",
+           lambda rows: [", ".join(columns[outside_image[row]]) for row in rows])
+
+    # Duplicate positions, and positions that do not go from C1 to C11 along the strip
+    distances = np.linalg.norm(coordinates[:, :, None, :] - coordinates[:, None, :, :], axis=-1)
+    upper = np.triu(np.ones((len(CHARACTER_COLUMNS),) * 2, dtype=bool), k=1)
+    with np.errstate(invalid="ignore"):
+        duplicates = (distances < DUPLICATE_DISTANCE) & upper
+    report(duplicates.any(axis=(1, 2)), ERROR, "duplicate_positions",
+           lambda rows: [", ".join(f"{columns[i]}={columns[j]}" for i, j in zip(*np.nonzero(duplicates[row])))
+                         for row in rows])
+    direction = coordinates[:, -1] - coordinates[:, 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        direction /= np.linalg.norm(direction, axis=-1, keepdims=True)
+        progress = np.einsum("nkd,nd->nk", coordinates - coordinates[:, :1], direction)
+        steps = np.diff(progress, axis=1)
+        backwards = steps <= 0
+    report(backwards.any(axis=1) & ~duplicates.any(axis=(1, 2)), ERROR, "non_monotonic_positions",
+           lambda rows: [", ".join(f"{columns[i + 1]} before {columns[i]}" for i in np.flatnonzero(backwards[row]))
+                         for row in rows])
+
+    # Windows as computed by the reviewer, on the rows it can display
+    displayable = has_image & ~(missing[:, 0] | missing[:, -1])
+    shapes = np.where(has_image[:, None], image_sizes, 0).astype(np.int64)
+    windows, angles, _ = calculate_windows(coordinates, h_pad, v_pad, shapes)
+    x_min, x_max, y_min, y_max = windows.T
+    with np.errstate(invalid="ignore"):
+        clipped = (x_min < 0) | (y_min < 0) | (x_max > shapes[:, 1]) | (y_max > shapes[:, 0])
+        bounds = np.stack([np.maximum(x_min, 0), np.maximum(y_min, 0), np.minimum(x_max, shapes[:, 1]),
+                           np.minimum(y_max, shapes[:, 0])], axis=-1)
+        empty = (bounds[:, 2] <= bounds[:, 0]) | (bounds[:, 3] <= bounds[:, 1])
+
+    def window_details(rows):
+        return [f"window x {x_min[row]:.0f}..{x_max[row]:.0f}, y {y_min[row]:.0f}..{y_max[row]:.0f} in a "
+                f"{shapes[row, 1]}x{shapes[row, 0]} image" for row in rows]
+
+    report(displayable & empty, ERROR, "empty_window", window_details)
+    report(displayable & clipped & ~empty, WARNING, "window_clipped", window_details)
+
+    # Characters outside the window, the reviewer then shows the whole rotated image instead of the strip
+    centers = np.stack([shapes[:, 1] // 2, shapes[:, 0] // 2], axis=-1)
+    rotated = transform_points(coordinates, rotation_matrices(angles, centers))
+    with np.errstate(invalid="ignore"):
+        inside = ((bounds[:, None, 0] <= rotated[..., 0]) & (rotated[..., 0] <= bounds[:, None, 2])
+                  & (bounds[:, None, 1] <= rotated[..., 1]) & (rotated[..., 1] <= bounds[:, None, 3])) | missing
+    report(displayable & ~empty & ~inside.all(axis=1), WARNING, "characters_outside_window",
+           lambda rows: [f"{np.count_nonzero(~inside[row])} characters outside, angle {angles[row]:.1f} degrees"
+                         for row in rows])
+
+    if not issues:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    result = pd.concat(issues, ignore_index=True)
+    result['severity'] = pd.Categorical(result['severity'], categories=SEVERITIES, ordered=True)
+    return result.sort_values(['severity', 'row', 'issue'], kind="stable").reset_index(drop=True)[REPORT_COLUMNS]
@@ -0,0 +1,289 @@
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import Tk, Label, Button, StringVar, Frame
+
+import cv2
+import numpy as np
+
+from utils.disk_cache import RenderCache
+from utils.image_processing import CHARACTER_COLUMNS
+from utils.prefetch import render_frame
+from utils.telemetry import Telemetry
+from utils.ui_helpers import DisplaySurface, display_interpolation, letterbox_placement
+
+BACKGROUND = (48, 48, 48)
+# Border of the tiles marked as exceptions by the reviewer, and of the rows that cannot be confirmed as they are
+EXCEPTION_COLOR = (0, 0, 255)
+INVALID_COLOR = (0, 165, 255)
+BORDER = 4
+CAPTION_HEIGHT = 26
+
+
+def page_rows(store, start, count):
+    """
+    Lists the rows of a page: the first unlabeled rows at or after a position.
+
+    Args:
+        store (DataFrameStore, SQLiteStore or OrderedStore): Storage holding the data entries.
+        start (int): First position to consider.
+        count (int): Number of rows of a page.
+
+    Returns:
+        list: Positions of up to `count` rows without an `unsure` value.
+    """
+    rows = []
+    index = store.next_unlabeled(start)
+    while index is not None:
+        rows.append(index)
+        if len(rows) == count:
+            break
+        index = store.next_unlabeled(index + 1)
+    return rows
+
+
+def submit_page(executor, store, rows, images_dir, h_pad, v_pad, cache=None):
+    """
+    Renders the rows of a page on a worker pool, with the same pipeline as the single-image view.
+
+    Rows are snapshotted on the calling (Tk) thread, so workers never read the store while the UI writes to it.
+
+    Args:
+        executor (ThreadPoolExecutor): Pool rendering the rows.
+        store (DataFrameStore, SQLiteStore or OrderedStore): Storage holding the rows.
+        rows (list): Positions of the rows of the page.
+        images_dir (str): Directory containing the images.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+        cache (RenderCache, optional): On-disk cache of rendered rows, shared with the single-image view.
+
+    Returns:
+        list: Futures of the `Frame` of every row, `None` for rows that cannot be displayed.
+    """
+    return [executor.submit(render_frame, index, store.row(index).copy(), images_dir, h_pad, v_pad,
+                            store.positions(index), cache) for index in rows]
+
+
+def page_frames(futures, rows):
+    """
+    Waits for the frames of a page. A row that fails to render, e.g. because its serial number is shorter than
+    its positions, is shown as not displayable instead of failing the whole page.
+
+    Args:
+        futures (list): Futures returned by `submit_page`.
+        rows (list): Positions of the rows of the page.
+
+    Returns:
+        list: `Frame` of every row, `None` for rows that cannot be displayed.
+    """
+    frames = []
+    for index, future in zip(rows, futures):
+        try:
+            frames.append(future.result())
+        except Exception as error:
+            print(f"Could not render row {index + 1}: {error!r}")
+            frames.append(None)
+    return frames
+
+
+def tile_rect(slot, columns, tile_size):
+    """Returns the `(x, y)` of the top-left corner of a tile of the page."""
+    return (slot % columns) * tile_size[0], (slot // columns) * tile_size[1]
+
+
+def compose_page(frames, rows, columns, page_size, tile_size):
+    """
+    Draws the rows of a page side by side into a single image. Each tile shows the cropped strip above its
+    overlay, like the two labels of the single-image view, with the row number and serial number below.
+
+    Args:
+        frames (list): `Frame` of every row of the page, `None` for rows that cannot be displayed.
+        rows (list): Positions of the rows of the page.
+        columns (int): Number of tiles per line.
+        page_size (int): Number of tiles of a page.
+        tile_size (tuple): `(width, height)` of a tile, border and caption included.
+
+    Returns:
+        ndarray: BGR page with room for `page_size` tiles, even when the last page has fewer rows.
+    """
+    width, height = tile_size
+    lines = -(-page_size // columns)
+    page = np.empty((lines * height, columns * width, 3), dtype=np.uint8)
+    page[:] = BACKGROUND
+    image_width, image_height = width - 2 * BORDER, height - 2 * BORDER - CAPTION_HEIGHT
+    for slot, (index, frame) in enumerate(zip(rows, frames)):
+        left, top = tile_rect(slot, columns, tile_size)
+        if frame is None:
+            caption = f"{index + 1}  not displayable"
+        else:
+            for half, display in enumerate((frame.cropped_display, frame.character_display)):
+                x, y, fitted_width, fitted_height = letterbox_placement(display.shape, image_width,
+                                                                        image_height // 2)
+                x, y = left + BORDER + x, top + BORDER + half * (image_height // 2) + y
+                page[y:y + fitted_height, x:x + fitted_width] = cv2.resize(
+                    display, (fitted_width, fitted_height),
+                    interpolation=display_interpolation(fitted_width / display.shape[1]))
+            caption = f"{index + 1}  {frame.serial_number}"
+        cv2.putText(page, caption, (left + BORDER + 4, top + height - BORDER - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    (255, 255, 255), 1, cv2.LINE_AA)
+    return page
+
+
+def draw_border(page, slot, columns, tile_size, color):
+    """Draws the border of a tile in place, `BACKGROUND` to remove it."""
+    left, top = tile_rect(slot, columns, tile_size)
+    cv2.rectangle(page, (left + BORDER // 2, top + BORDER // 2),
+                  (left + tile_size[0] - 1 - BORDER // 2, top + tile_size[1] - 1 - BORDER // 2), color, BORDER)
+
+
+def initialize_grid_ui(store, images_dir, config=None):
+    """
+    Initializes the grid review: pages of unlabeled rows shown side by side, where the reviewer only marks the
+    exceptions and confirms the rest of the page as sure in one bulk update.
+
+    Clicking a tile marks (or unmarks) it as an exception. Exceptions, rows that cannot be displayed and rows
+    without an 11-character serial number stay unlabeled, for the single-image view.
+
+    Args:
+        store (DataFrameStore, SQLiteStore or OrderedStore): Storage holding the whole sheet.
+        images_dir (str): Directory containing the images.
+        config (dict): Parsed `config.yaml`, used for the grid, cropping, render cache and telemetry settings.
+    """
+    config = config or {}
+    grid_config = config.get('grid') or {}
+    columns = grid_config.get('columns', 4)
+    page_size = columns * grid_config.get('lines', 5)
+    tile_size = (grid_config.get('tile_width', 360), grid_config.get('tile_height', 170))
+    cropping_config = config.get('cropping') or {}
+    h_pad = cropping_config.get('horizontal_padding', 30)
+    v_pad = cropping_config.get('vertical_padding', 40)
+    telemetry_config = config.get('telemetry') or {}
+    telemetry = Telemetry(telemetry_config.get('log_file'), enabled=telemetry_config.get('enabled', False))
+    cache_config = config.get('render_cache') or {}
+    render_cache = None
+    if cache_config.get('enabled', False):
+        render_cache = RenderCache(cache_config.get('directory', './data/.render_cache/'),
+                                   cache_config.get('max_bytes', 512 * 1024 ** 2))
+    executor = ThreadPoolExecutor(max_workers=grid_config.get('workers', 4), thread_name_prefix="grid")
+
+    # Rows, frames and marks of the displayed page, and the next page rendered in advance
+    page = {'rows': [], 'frames': [], 'exceptions': set(), 'invalid': set(), 'image': None}
+    upcoming = {'rows': [], 'futures': []}
+
+    def show_page(start):
+        """
+        Displays the page of unlabeled rows starting at a position, and starts rendering the next one.
+
+        Args:
+            start (int): First position of the page.
+
+        Returns:
+            bool: `False` if no unlabeled row is left.
+        """
+        rows = page_rows(store, start, page_size)
+        if not rows:
+            return False
+        with telemetry.span("page_wait", index=rows[0]):
+            if upcoming['rows'] == rows:
+                futures = upcoming['futures']
+            else:
+                for future in upcoming['futures']:
+                    future.cancel()
+                futures = submit_page(executor, store, rows, images_dir, h_pad, v_pad, render_cache)
+            frames = page_frames(futures, rows)
+        with telemetry.span("page_compose", index=rows[0]):
+            image = compose_page(frames, rows, columns, page_size, tile_size)
+            invalid = {slot for slot, frame in enumerate(frames)
+                       if frame is None or len(str(frame.serial_number)) != len(CHARACTER_COLUMNS)}
+            for slot in invalid:
+                draw_border(image, slot, columns, tile_size, INVALID_COLOR)
+            surface.show(image)
+        page.update(rows=rows, frames=frames, exceptions=set(), invalid=invalid, image=image)
+        telemetry.image_shown(rows[0])
+        status_var.set(f"Rows {rows[0] + 1} to {rows[-1] + 1} of {len(store)}: "
+                       f"{len(rows) - len(invalid)} to confirm")
+
+        upcoming['rows'] = page_rows(store, rows[-1] + 1, page_size)
+        upcoming['futures'] = submit_page(executor, store, upcoming['rows'], images_dir, h_pad, v_pad,
+                                          render_cache)
+        return True
+
+    def next_page():
+        """Moves to the page after the current one, or ends the review after the last one."""
+        if not show_page(page['rows'][-1] + 1):
+            print("No unlabeled row left.")
+            on_quit()
+
+    def on_click(event):
+        """Marks or unmarks the clicked tile as an exception."""
+        slot = (event.y // tile_size[1]) * columns + event.x // tile_size[0]
+        if event.x >= columns * tile_size[0] or slot >= len(page['rows']) or slot in page['invalid']:
+            return
+        page['exceptions'].symmetric_difference_update({slot})
+        draw_border(page['image'], slot, columns, tile_size,
+                    EXCEPTION_COLOR if slot in page['exceptions'] else BACKGROUND)
+        surface.show(page['image'])
+        status_var.set(f"Rows {page['rows'][0] + 1} to {page['rows'][-1] + 1} of {len(store)}: "
+                       f"{len(page['rows']) - len(page['invalid']) - len(page['exceptions'])} to confirm")
+
+    def on_confirm(event=None):
+        """Marks every row of the page as sure, except the exceptions, and moves to the next page."""
+        confirmed = [index for slot, index in enumerate(page['rows'])
+                     if slot not in page['exceptions'] and slot not in page['invalid']]
+        with telemetry.span("bulk_update", index=page['rows'][0]):
+            store.update_many(confirmed, unsure=float(0))
+        for index in confirmed:
+            telemetry.decision(index, "sure")
+        next_page()
+
+    def on_skip(event=None):
+        """Moves to the next page without labeling the current one."""
+        next_page()
+
+    def on_save():
+        """Writes the current data in the background, without leaving the application."""
+        with telemetry.span("save"):
+            store.save()
+
+    def on_quit():
+        """Saves the current data and exits the application."""
+        executor.shutdown(wait=False, cancel_futures=True)
+        with telemetry.span("save"):
+            store.save(wait=telemetry.enabled)
+        root.quit()
+        root.destroy()
+
+    root = Tk()
+    root.title("Image Review - Grid")
+
+    # No border nor padding, so that click coordinates are page coordinates
+    page_label = Label(root, borderwidth=0, padx=0, pady=0, highlightthickness=0)
+    page_label.grid(row=10, column=10, padx=10, pady=10)
+    lines = -(-page_size // columns)
+    surface = DisplaySurface(page_label, (columns * tile_size[0], lines * tile_size[1]))
+    page_label.bind("<Button-1>", on_click)
+
+    buttons_frame = Frame(root)
+    buttons_frame.grid(row=20, column=10, padx=10, pady=10)
+    status_var = StringVar()
+    Label(buttons_frame, textvariable=status_var, width=50).pack(side="left", padx=10)
+    Button(buttons_frame, text="Confirm Page", command=on_confirm).pack(side="left", padx=10)
+    Button(buttons_frame, text="Skip Page", command=on_skip).pack(side="left", padx=10)
+    Button(buttons_frame, text="Save", command=on_save).pack(side="left", padx=10)
+    Button(buttons_frame, text="Save and Exit", command=on_quit).pack(side="left", padx=10)
+    Label(buttons_frame, text="Click: exception    Enter: confirm page    Right: skip page").pack(side="left",
+                                                                                               padx=10)
+
+    root.bind("<Return>", on_confirm)
+    root.bind("<KP_Enter>", on_confirm)
+    root.bind("<Right>", on_skip)
+    root.protocol("WM_DELETE_WINDOW", on_quit)
+
+    if not show_page(0):
+        print("No unlabeled row to review.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        root.destroy()
+        telemetry.close()
+        return
+
+    root.mainloop()
+    telemetry.report()
+    telemetry.close()
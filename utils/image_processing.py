@@ -1,7 +1,12 @@
+import re
+
 import cv2
 import numpy as np
 import pandas as pd
 
+CHARACTER_COLUMNS = [f"C{i}" for i in range(1, 12)]
+_POINT_PATTERN = r"^\s*\(?\s*(-?\d+(?:\.\d*)?)\s*[;,]\s*(-?\d+(?:\.\d*)?)\s*\)?\s*$"
+
 
 def rotate_image(image, angle, center):
     """
@@ -20,7 +25,205 @@ def rotate_image(image, angle, center):
     return cv2.warpAffine(image, rot_matrix, (w, h))
 
 
-def calculate_window(row, h_pad, v_pad, image_shape):
+def _region_matrix(angle, center, x_min, y_min, source_offset=(0, 0)):
+    """
+    Returns the matrix of `rotate_image` translated so that the window starting at (`x_min`, `y_min`) of the
+    rotated image is sampled from a crop of the original image starting at `source_offset`.
+    """
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    matrix[:, 2] += matrix[:, :2] @ np.asarray(source_offset, dtype=np.float64) - (x_min, y_min)
+    return matrix
+
+
+def region_source_box(angle, center, x_min, y_min, x_max, y_max, image_shape, margin=2):
+    """
+    Returns the box of the original image that one window of the rotated image is sampled from.
+
+    Args:
+        angle (float): The angle (in degrees) by which the image is rotated.
+        center (tuple): A tuple (x, y) representing the center of rotation.
+        x_min, y_min, x_max, y_max (int): Window of the rotated image.
+        image_shape (tuple): Shape of the original image.
+        margin (int): Pixels added on every side, so that rounding the source coordinates never reads past the
+            box.
+
+    Returns:
+        tuple: `(x_min, y_min, x_max, y_max)` of the box, clipped to the image.
+    """
+    inv_matrix = cv2.invertAffineTransform(cv2.getRotationMatrix2D(center, angle, 1.0))
+    corners = np.array([[x_min, y_min, 1], [x_max - 1, y_min, 1], [x_min, y_max - 1, 1],
+                        [x_max - 1, y_max - 1, 1]], dtype=np.float64) @ inv_matrix.T
+    # Bilinear interpolation also reads the next pixel in each direction
+    low = np.floor(corners.min(axis=0)) - margin
+    high = np.floor(corners.max(axis=0)) + 2 + margin
+    return (int(np.clip(low[0], 0, image_shape[1])), int(np.clip(low[1], 0, image_shape[0])),
+            int(np.clip(high[0], 0, image_shape[1])), int(np.clip(high[1], 0, image_shape[0])))
+
+
+def warp_region(source, angle, center, x_min, y_min, x_max, y_max, source_offset=(0, 0)):
+    """
+    Samples one window of the rotated image with `cv2.warpAffine`, possibly from a crop of the original image.
+
+    Outside the original image the window is black, like the output of `rotate_image`. The pixels may differ
+    from it by one level, as OpenCV rounds the source coordinates of the translated matrix differently.
+
+    Args:
+        source (ndarray): The original image, or the part of it starting at `source_offset`. The crop must
+            contain `region_source_box(...)` of the window.
+        angle (float): The angle (in degrees) by which the image is rotated.
+        center (tuple): A tuple (x, y) representing the center of rotation, in the original image.
+        x_min, y_min, x_max, y_max (int): Window of the rotated image to sample.
+        source_offset (tuple): Position (x, y) of `source` in the original image.
+
+    Returns:
+        ndarray: The rotated window.
+    """
+    return cv2.warpAffine(source, _region_matrix(angle, center, x_min, y_min, source_offset),
+                          (x_max - x_min, y_max - y_min), flags=cv2.INTER_LINEAR)
+
+
+def rotate_image_region(image, angle, center, x_min, y_min, x_max, y_max):
+    """
+    Rotates an image like `rotate_image` but only produces the pixels of one window of the output.
+
+    The result matches `rotate_image(image, angle, center)[y_min:y_max, x_min:x_max]` within one level,
+    including next to the borders of the image, while the work and memory only scale with the size of the window.
+
+    Args:
+        image (ndarray): The original image to be rotated.
+        angle (float): The angle (in degrees) by which to rotate the image.
+        center (tuple): A tuple (x, y) representing the center of rotation.
+        x_min, y_min, x_max, y_max (int): Window of the rotated image to return, inside the image bounds.
+
+    Returns:
+        ndarray: The rotated window, of size `(y_max - y_min, x_max - x_min)`.
+    """
+    if x_max <= x_min or y_max <= y_min:
+        return np.zeros((max(0, y_max - y_min), max(0, x_max - x_min)) + image.shape[2:], dtype=image.dtype)
+    return warp_region(image, angle, center, x_min, y_min, x_max, y_max)
+
+
+def parse_point(value):
+    """
+    Parses a character position stored as `"(x;y)"` without evaluating it.
+
+    Args:
+        value (str or float): Cell content, possibly NaN.
+
+    Returns:
+        tuple or None: `(x, y)` as floats, or `None` if the cell is empty or malformed.
+    """
+    if pd.isna(value):
+        return None
+    match = re.match(_POINT_PATTERN, str(value))
+    if match is None:
+        return None
+    return float(match.group(1)), float(match.group(2))
+
+
+def parse_coordinates(df):
+    """
+    Parses the `C1` to `C11` columns of the whole DataFrame at once.
+
+    Args:
+        df (pd.DataFrame): Data containing the `C1` to `C11` columns as `"(x;y)"` strings.
+
+    Returns:
+        ndarray: Contiguous float32 array of shape (N, 11, 2), NaN where a position is missing or malformed.
+    """
+    coordinates = np.full((len(df), len(CHARACTER_COLUMNS), 2), np.nan, dtype=np.float32)
+    for i, column in enumerate(CHARACTER_COLUMNS):
+        if column not in df.columns:
+            continue
+        values = df[column].astype("string").str.extract(_POINT_PATTERN)
+        coordinates[:, i, :] = values.astype(np.float64).to_numpy()
+    return coordinates
+
+
+def row_positions(row, positions=None):
+    """
+    Returns the (11, 2) character positions of a row, parsing them from the row if they were not pre-parsed.
+
+    Args:
+        row (pd.Series): Data row containing `C1` to `C11`.
+        positions (ndarray, optional): Pre-parsed positions of the row, as produced by `parse_coordinates`.
+
+    Returns:
+        ndarray: Float64 array of shape (11, 2), NaN where a position is missing.
+    """
+    if positions is not None:
+        return np.asarray(positions, dtype=np.float64)
+    points = [parse_point(row.get(column)) for column in CHARACTER_COLUMNS]
+    return np.array([point if point is not None else (np.nan, np.nan) for point in points], dtype=np.float64)
+
+
+def rotation_matrices(angles, centers):
+    """
+    Vectorized equivalent of `cv2.getRotationMatrix2D(center, angle, 1.0)`.
+
+    Args:
+        angles (float or ndarray): Rotation angles in degrees, shape (...).
+        centers (tuple or ndarray): Rotation centers (x, y), shape (..., 2).
+
+    Returns:
+        ndarray: Affine matrices of shape (..., 2, 3).
+    """
+    angles = np.asarray(angles, dtype=np.float64) * (np.pi / 180)
+    centers = np.asarray(centers, dtype=np.float64)
+    alpha, beta = np.cos(angles), np.sin(angles)
+    cx, cy = centers[..., 0], centers[..., 1]
+    first_row = np.stack([alpha, beta, (1 - alpha) * cx - beta * cy], axis=-1)
+    second_row = np.stack([-beta, alpha, beta * cx + (1 - alpha) * cy], axis=-1)
+    return np.stack([first_row, second_row], axis=-2)
+
+
+def transform_points(points, matrix):
+    """
+    Applies one or several affine matrices to sets of points in a single operation.
+
+    Args:
+        points (ndarray): Points of shape (..., K, 2).
+        matrix (ndarray): Affine matrices of shape (..., 2, 3), broadcast against `points`.
+
+    Returns:
+        ndarray: Transformed points of shape (..., K, 2).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return points @ np.swapaxes(matrix[..., :2], -1, -2) + matrix[..., None, :, 2]
+
+
+def calculate_windows(coordinates, h_pad, v_pad, image_shapes):
+    """
+    Vectorized `calculate_window` for every row at once.
+
+    Args:
+        coordinates (ndarray): Character positions of shape (N, 11, 2), as produced by `parse_coordinates`.
+        h_pad (int): Horizontal padding to apply on either side of the bounding box.
+        v_pad (int): Vertical padding to apply on top and bottom of the bounding box.
+        image_shapes (ndarray): Image shapes of shape (N, 2) as (height, width).
+
+    Returns:
+        tuple: Contains:
+            - windows (ndarray): Float array of shape (N, 4) holding `x_min`, `x_max`, `y_min`, `y_max`,
+              truncated like `calculate_window`, NaN for rows without `C1` or `C11`.
+            - angles (ndarray): Rotation angles in degrees, shape (N,).
+            - valid (ndarray): Boolean mask of the rows that have both `C1` and `C11`.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    image_shapes = np.asarray(image_shapes)
+    c1, c11 = coordinates[:, 0, :], coordinates[:, -1, :]
+    valid = ~(np.isnan(c1).any(axis=1) | np.isnan(c11).any(axis=1))
+    angles = np.degrees(np.arctan2(c11[:, 1] - c1[:, 1], c11[:, 0] - c1[:, 0]))
+    centers = np.stack([image_shapes[:, 1] // 2, image_shapes[:, 0] // 2], axis=-1)
+    rotated = transform_points(np.stack([c1, c11], axis=1), rotation_matrices(angles, centers))
+    windows = np.trunc(np.stack([rotated[:, 0, 0] - h_pad, rotated[:, 1, 0] + h_pad,
+                                 rotated[:, 0, 1] - v_pad, rotated[:, 1, 1] + v_pad], axis=-1))
+    windows[~valid] = np.nan
+    return windows, angles, valid
+
+
+def calculate_window(row, h_pad, v_pad, image_shape, positions=None):
     """
     Calculates a bounding box window around points `C1` and `C11` in the image and determines the rotation angle.
 
@@ -29,6 +232,7 @@ def calculate_window(row, h_pad, v_pad, image_shape):
         h_pad (int): Horizontal padding to apply on either side of the bounding box.
         v_pad (int): Vertical padding to apply on top and bottom of the bounding box.
         image_shape (tuple): Shape of the image as (height, width) used for centering rotation.
+        positions (ndarray, optional): Pre-parsed (11, 2) positions of the row, see `parse_coordinates`.
 
     Returns:
         tuple or None: Contains:
@@ -39,29 +243,16 @@ def calculate_window(row, h_pad, v_pad, image_shape):
             - angle (float): Calculated rotation angle in degrees.
         Returns `None` if `C1` or `C11` data is missing.
     """
-    if pd.isna(row["C1"]) or pd.isna(row["C11"]):
+    positions = row_positions(row, positions)
+    c1, c11 = positions[0], positions[-1]
+    if np.isnan(c1).any() or np.isnan(c11).any():
         return None
 
-    c1, c11 = eval(row["C1"].replace(";", ",")), eval(row["C11"].replace(";", ","))
     angle = np.degrees(np.arctan2(c11[1] - c1[1], c11[0] - c1[0]))
     image_center = (image_shape[1] // 2, image_shape[0] // 2)
 
-    def rotate_point(point, angle, center):
-        """
-        Rotates a point around a specified center by a given angle.
-
-        Args:
-            point (tuple): Coordinates of the point to rotate.
-            angle (float): Angle in degrees for rotation.
-            center (tuple): Center point for rotation.
-
-        Returns:
-            ndarray: Transformed coordinates after rotation.
-        """
-        rot_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
-        return np.dot(rot_matrix, np.array([point[0], point[1], 1]))
-
-    rotated_c1, rotated_c11 = rotate_point(c1, angle, image_center), rotate_point(c11, angle, image_center)
+    rot_matrix = cv2.getRotationMatrix2D(image_center, angle, 1.0)
+    rotated_c1, rotated_c11 = transform_points(np.stack([c1, c11]), rot_matrix)
     x_min = int(rotated_c1[0] - h_pad)
     x_max = int(rotated_c11[0] + h_pad)
     y_min = int(rotated_c1[1] - v_pad)
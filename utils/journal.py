@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+
+from utils.file_handling import save_data
+
+
+class EditJournal:
+    """
+    Append-only write-ahead log of the edits made in the UI.
+
+    Each edit is one JSON line, so recording it costs the same whatever the size of the sheet. The journal is
+    replayed on top of the input file at startup and compacted into it on a background thread.
+    """
+
+    def __init__(self, path, fsync=True):
+        """
+        Args:
+            path (str): Path of the journal file, created if needed.
+            fsync (bool): Force every record to disk, so edits also survive a system crash.
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._drop_truncated_line()
+        self._file = open(path, "a", encoding="utf-8")
+        self._compaction = None
+
+    def _drop_truncated_line(self):
+        """Cuts a last line left incomplete by a crash, so that the next record does not continue it."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as journal_file:
+            size = journal_file.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            journal_file.seek(size - 1)
+            if journal_file.read(1) == b"\n":
+                return
+            journal_file.seek(0)
+            journal_file.truncate(journal_file.read().rfind(b"\n") + 1)
+
+    def append(self, index, image, **fields):
+        """
+        Records the new values of some fields of a row.
+
+        Args:
+            index (int): Position of the row in the DataFrame.
+            image (str): Image name of the row, used to check the row still matches when replaying.
+            **fields: Column values to record, e.g. `serial_number` and `unsure`.
+        """
+        self.append_many([(index, image)], **fields)
+
+    def append_many(self, rows, **fields):
+        """
+        Records the same new values for several rows, written and synced to disk once.
+
+        Args:
+            rows (list): `(index, image)` of every row, see `append`.
+            **fields: Column values to record for every row.
+        """
+        values = {key: value.item() if hasattr(value, "item") else value for key, value in fields.items()}
+        lines = "".join(json.dumps({"index": int(index), "image": str(image), **values}) + "\n"
+                        for index, image in rows)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def replay(self, df, apply=None):
+        """
+        Applies the recorded edits to a DataFrame, in order.
+
+        Args:
+            df (pd.DataFrame): Data loaded from the input file.
+            apply (callable, optional): Called with the row position and the dict of recorded fields of each
+                edit, instead of writing them into `df`.
+
+        Returns:
+            int: Number of edits applied.
+        """
+        applied = 0
+        positions = None
+        with self._lock, open(self.path, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a truncated last line
+                    continue
+                index, image = record.pop("index"), record.pop("image")
+                if not (0 <= index < len(df) and str(df.at[index, 'image']) == image):
+                    if positions is None:
+                        positions = {str(name): i for i, name in enumerate(df['image'])}
+                    if image not in positions:
+                        continue
+                    index = positions[image]
+                if apply is not None:
+                    apply(index, record)
+                else:
+                    for column, value in record.items():
+                        df.at[index, column] = value
+                applied += 1
+        return applied
+
+    def compact(self, snapshot, output_file_path, input_file_path, wait=False):
+        """
+        Writes a snapshot of the data to the input file and drops the journal records it contains.
+
+        The snapshot is taken immediately; writing the workbook happens on a background thread so the UI is not
+        blocked. Edits recorded while it runs are kept in the journal. The thread is not a daemon, so a
+        compaction started at exit finishes before the process ends.
+
+        Args:
+            snapshot (callable): Returns the current data as a new DataFrame, called under the journal lock so
+                that no edit is recorded in between.
+            output_file_path (str): Directory path and prefix for the backup file.
+            input_file_path (str): File path of the input file to overwrite.
+            wait (bool): Block until the compaction is finished.
+        """
+        self.wait()
+        with self._lock:
+            df = snapshot()
+            offset = self._file.tell()
+
+        def run():
+            save_data(df, output_file_path, input_file_path)
+            with self._lock:
+                with open(self.path, "r", encoding="utf-8") as journal_file:
+                    journal_file.seek(offset)
+                    remaining = journal_file.read()
+                self._file.close()
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as temp_file:
+                    temp_file.write(remaining)
+                os.replace(temp_path, self.path)
+                self._file = open(self.path, "a", encoding="utf-8")
+
+        self._compaction = threading.Thread(target=run, name="journal-compaction")
+        self._compaction.start()
+        if wait:
+            self._compaction.join()
+
+    def wait(self):
+        """Blocks until the running compaction, if any, is finished."""
+        if self._compaction is not None:
+            self._compaction.join()
+
+    def close(self):
+        """Waits for the running compaction and closes the journal file."""
+        self.wait()
+        with self._lock:
+            self._file.close()
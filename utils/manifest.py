@@ -0,0 +1,187 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.decoding import read_image_size
+
+DISPLAYABLE = "displayable"
+MISSING_IMAGE = "missing image"
+UNREADABLE_IMAGE = "unreadable image"
+MISSING_POSITIONS = "missing C1/C11"
+# The row passed the probe but rendering it raised, e.g. because of a malformed serial number
+RENDER_ERROR = "render error"
+
+
+def probe_row(image_path, positions):
+    """
+    Checks whether a row can be displayed, from the file system, the image header and its positions.
+
+    Args:
+        image_path (str): Path of the image of the row.
+        positions (ndarray): (11, 2) character positions of the row.
+
+    Returns:
+        tuple: `(reason, size)`, where `reason` is `DISPLAYABLE` or the reason the row is skipped, and `size` is
+            `(height, width)` or `None`.
+    """
+    if not os.path.isfile(image_path):
+        return MISSING_IMAGE, None
+    size = read_image_size(image_path)
+    if size is None:
+        return UNREADABLE_IMAGE, None
+    if np.isnan(np.asarray(positions, dtype=np.float64)[[0, -1]]).any():
+        return MISSING_POSITIONS, size
+    return DISPLAYABLE, size
+
+
+class Manifest:
+    """
+    Index of which rows can be displayed, so navigation never decodes or re-probes a missing image.
+
+    The whole dataset is probed in parallel on a background thread. Rows that are needed before the background
+    pass reaches them are probed on demand, so the UI does not have to wait for the full pass.
+    """
+
+    def __init__(self, store, images_dir, workers=8):
+        """
+        Args:
+            store (DataFrameStore or SQLiteStore): Storage containing the rows.
+            images_dir (str): Directory containing the images.
+            workers (int): Number of threads probing the files.
+        """
+        self.store = store
+        self.images_dir = images_dir
+        self.workers = workers
+        self.reasons = [None] * len(store)
+        self.sizes = np.zeros((len(store), 2), dtype=np.int64)
+        # Text of the error of every row marked with `RENDER_ERROR`
+        self.details = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _record(self, index, reason, size):
+        """Stores the outcome of a probe."""
+        with self._lock:
+            if self.reasons[index] is None:
+                self.reasons[index] = reason
+                if size is not None:
+                    self.sizes[index] = size
+
+    def start(self, on_complete=None):
+        """
+        Starts probing every row on a background thread.
+
+        Args:
+            on_complete (callable, optional): Called with the manifest from the background thread once every row
+                has been probed.
+        """
+        def run():
+            images = self.store.images()
+            coordinates = self.store.all_positions()
+
+            def probe(index):
+                if self.reasons[index] is None:
+                    self._record(index, *probe_row(os.path.join(self.images_dir, str(images[index])),
+                                                   coordinates[index]))
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="manifest") as executor:
+                list(executor.map(probe, range(len(self.reasons)), chunksize=64))
+            if on_complete is not None:
+                on_complete(self)
+
+        self._thread = threading.Thread(target=run, name="manifest", daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        """Blocks until the background pass is finished."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def reason(self, index):
+        """
+        Returns whether a row is displayable, probing it now if the background pass has not reached it.
+
+        Args:
+            index (int): Position of the row.
+
+        Returns:
+            str: `DISPLAYABLE` or the reason the row is skipped.
+        """
+        if self.reasons[index] is None:
+            row = self.store.row(index)
+            self._record(index, *probe_row(os.path.join(self.images_dir, str(row['image'])),
+                                           self.store.positions(index)))
+        return self.reasons[index]
+
+    def mark(self, index, reason, detail=None):
+        """
+        Overrides the status of a row, e.g. when decoding fails although the header could be read.
+
+        Args:
+            index (int): Position of the row.
+            reason (str): Reason the row is skipped.
+            detail (str, optional): Error message kept for the report.
+        """
+        with self._lock:
+            self.reasons[index] = reason
+            if detail is not None:
+                self.details[index] = detail
+
+    def mark_failed(self, index, error=None):
+        """
+        Records why a row that passed the probe could not be rendered.
+
+        An exception is recorded as `RENDER_ERROR` with its message. A render without result is probed again, so
+        an image deleted since the probe is reported as missing, and one whose header reads but whose pixels
+        cannot be decoded as unreadable.
+
+        Args:
+            index (int): Position of the row.
+            error (Exception, optional): Exception raised by the render, `None` if it returned no frame.
+        """
+        if error is not None:
+            self.mark(index, RENDER_ERROR, repr(error))
+            return
+        row = self.store.row(index)
+        reason, _ = probe_row(os.path.join(self.images_dir, str(row['image'])), self.store.positions(index))
+        self.mark(index, UNREADABLE_IMAGE if reason == DISPLAYABLE else reason)
+
+    def find_displayable(self, index, step=1):
+        """
+        Walks the rows from `index` in the direction of `step` and returns the first displayable one.
+
+        Args:
+            index (int): Position to start from, included.
+            step (int): `1` to walk forward, `-1` to walk backward.
+
+        Returns:
+            int or None: Position of the first displayable row, or `None` if there is none.
+        """
+        while 0 <= index < len(self.reasons):
+            if self.reason(index) == DISPLAYABLE:
+                return index
+            index += step
+        return None
+
+    def skip_summary(self):
+        """
+        Counts the skipped rows by reason, among the rows probed so far.
+
+        Returns:
+            Counter: Number of skipped rows for each reason.
+        """
+        return Counter(reason for reason in self.reasons if reason not in (None, DISPLAYABLE))
+
+    def report(self):
+        """Prints the number of skipped rows for each reason."""
+        summary = self.skip_summary()
+        if not summary:
+            print("All images can be displayed.")
+            return
+        details = ", ".join(f"{count} {reason}" for reason, count in summary.most_common())
+        print(f"{sum(summary.values())} of {len(self.reasons)} rows will be skipped: {details}.")
+        for index, detail in sorted(self.details.items()):
+            print(f"  row {index + 1} ({self.store.row(index)['image']}): {detail}")
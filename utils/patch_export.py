@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+import zlib
+
+import numpy as np
+
+from utils.prelabel import PATCH_SIZE, extract_character_patches
+
+METADATA_FILE = "metadata.json"
+INDEX_FILE = "index.csv"
+INDEX_COLUMNS = ['split', 'shard', 'offset', 'image', 'row', 'position', 'label']
+SPLITS = ("train", "val")
+
+
+def split_of(image, val_fraction):
+    """
+    Chooses the split of an image from a CRC32 of its name, so the split is stable across exports and all the
+    characters of an image stay in the same split.
+
+    Args:
+        image (str): Image name.
+        val_fraction (float): Share of the images in the validation split.
+
+    Returns:
+        str: `train` or `val`.
+    """
+    return "val" if zlib.crc32(str(image).encode("utf-8")) % 10000 < val_fraction * 10000 else "train"
+
+
+def extract_rows(tasks, images_dir, patch_size=PATCH_SIZE):
+    """
+    Cuts the character patches of several rows. Runs in a worker process.
+
+    Args:
+        tasks (list): `(row, image, positions)` of each row, with its (11, 2) character positions.
+        images_dir (str): Directory containing the images.
+        patch_size (tuple): Size `(width, height)` of the patches.
+
+    Returns:
+        list: `(row, patches)` of each row, where `patches` is `None` if the row could not be cut.
+    """
+    return [(row, extract_character_patches(os.path.join(images_dir, str(image)), None, positions, patch_size))
+            for row, image, positions in tasks]
+
+
+class PatchShardWriter:
+    """
+    Accumulates the patches of one split and writes them as fixed-size `.npy` shards, so memory stays bounded by
+    one shard whatever the size of the dataset.
+
+    Each shard `<split>_<number>.npy` holds an (n, height, width) uint8 array, and `<split>_<number>_labels.npy`
+    the class id of every patch. Both can be opened with `np.load(..., mmap_mode='r')` without copying. Every
+    patch is also written as one line of the label index as soon as it is added.
+    """
+
+    def __init__(self, output_dir, split, shard_size, patch_size, classes, index):
+        """
+        Args:
+            output_dir (str): Directory receiving the shards.
+            split (str): Name of the split, used as prefix of the shard files.
+            shard_size (int): Number of patches per shard, the last shard may be smaller.
+            patch_size (tuple): Size `(width, height)` of the patches.
+            classes (str): Characters, the class id of a patch is the position of its label in this string.
+            index (csv.writer): Label index receiving one line per patch, see `INDEX_COLUMNS`.
+        """
+        self.output_dir = output_dir
+        self.split = split
+        self.shard_size = shard_size
+        self.class_ids = {character: i for i, character in enumerate(classes)}
+        self._patches = np.empty((shard_size, patch_size[1], patch_size[0]), dtype=np.uint8)
+        self._labels = np.empty(shard_size, dtype=np.uint8)
+        self._count = 0
+        self.index = index
+        self.shards = []
+
+    def add(self, row, image, patches, serial_number):
+        """
+        Appends the patches of one row.
+
+        Args:
+            row (int): Position of the row in the sheet.
+            image (str): Image name of the row.
+            patches (ndarray): (11, height, width) patches of the row.
+            serial_number (str): Serial number of the row, one character per patch.
+        """
+        for position, (patch, character) in enumerate(zip(patches, serial_number)):
+            if self._count == self.shard_size:
+                self.flush()
+            self._patches[self._count] = patch
+            self._labels[self._count] = self.class_ids[character]
+            self.index.writerow([self.split, len(self.shards), self._count, image, row, position + 1, character])
+            self._count += 1
+
+    def flush(self):
+        """Writes the patches accumulated so far as a new shard."""
+        if self._count == 0:
+            return
+        name = f"{self.split}_{len(self.shards):05d}"
+        np.save(os.path.join(self.output_dir, f"{name}.npy"), self._patches[:self._count])
+        np.save(os.path.join(self.output_dir, f"{name}_labels.npy"), self._labels[:self._count])
+        self.shards.append({'name': name, 'count': self._count})
+        self._count = 0
+
+
+def export_patches(df, coordinates, images_dir, output_dir, executor, rows=None, val_fraction=0.1,
+                   shard_size=65536, patch_size=PATCH_SIZE, chunk_size=64, max_pending=None):
+    """
+    Cuts a patch around every character of every row and writes them to `.npy` shards with a label index.
+
+    Rows are cut in chunks on a process pool. Results are consumed in order as they arrive and at most
+    `max_pending` chunks are in flight, so memory does not grow with the dataset.
+
+    Args:
+        df (pd.DataFrame): Data with `image`, `serial_number` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions, see `parse_coordinates`.
+        images_dir (str): Directory containing the images.
+        output_dir (str): Directory receiving the shards, the index and the metadata.
+        executor (concurrent.futures.Executor): Pool running `extract_rows`.
+        rows (list, optional): Positions of the rows to export, all rows by default. Their serial numbers must
+            have one character per position.
+        val_fraction (float): Share of the images in the validation split.
+        shard_size (int): Number of patches per shard.
+        patch_size (tuple): Size `(width, height)` of the patches.
+        chunk_size (int): Number of rows per task.
+        max_pending (int, optional): Maximum number of tasks in flight, twice the number of workers by default.
+
+    Returns:
+        dict: Metadata of the export, also written to `metadata.json`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    images = df['image'].astype(str).tolist()
+    serials = df['serial_number'].astype(str).tolist()
+    rows = list(range(len(df))) if rows is None else list(rows)
+    classes = "".join(sorted(set("".join(serials[row] for row in rows))))
+    max_pending = max_pending or 2 * (getattr(executor, "_max_workers", None) or os.cpu_count())
+
+    chunks = (rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size))
+    pending, exported, skipped = [], 0, []
+    with open(os.path.join(output_dir, INDEX_FILE), "w", newline="", encoding="utf-8") as index_file:
+        index = csv.writer(index_file)
+        index.writerow(INDEX_COLUMNS)
+        writers = {split: PatchShardWriter(output_dir, split, shard_size, patch_size, classes, index)
+                   for split in SPLITS}
+        while True:
+            for chunk in chunks:
+                tasks = [(row, images[row], coordinates[row]) for row in chunk]
+                pending.append(executor.submit(extract_rows, tasks, images_dir, patch_size))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            for row, patches in pending.pop(0).result():
+                if patches is None:
+                    skipped.append(images[row])
+                    continue
+                writers[split_of(images[row], val_fraction)].add(row, images[row], patches, serials[row])
+                exported += 1
+        for writer in writers.values():
+            writer.flush()
+    metadata = {'patch_size': list(patch_size), 'classes': classes, 'val_fraction': val_fraction,
+                'rows': exported, 'skipped': skipped,
+                'shards': {split: writer.shards for split, writer in writers.items()}}
+    with open(os.path.join(output_dir, METADATA_FILE), "w", encoding="utf-8") as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+    return metadata
+
+
+def open_patch_shards(output_dir, split="train"):
+    """
+    Memory-maps the shards of one split of an export, without reading them.
+
+    Args:
+        output_dir (str): Directory written by `export_patches`.
+        split (str): `train` or `val`.
+
+    Returns:
+        list: `(patches, labels)` memory-mapped arrays of every shard, in order. The class id of a label is the
+            position of its character in the `classes` of `metadata.json`.
+    """
+    with open(os.path.join(output_dir, METADATA_FILE), "r", encoding="utf-8") as metadata_file:
+        shards = json.load(metadata_file)['shards'][split]
+    return [(np.load(os.path.join(output_dir, f"{shard['name']}.npy"), mmap_mode='r'),
+             np.load(os.path.join(output_dir, f"{shard['name']}_labels.npy"), mmap_mode='r')) for shard in shards]
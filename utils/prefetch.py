@@ -0,0 +1,251 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.decoding import decode_reduced, decode_region, read_image_size
+from utils.disk_cache import render_cache_key
+from utils.filters import apply_filters
+from utils.image_processing import calculate_window, rotate_image, region_source_box, warp_region, row_positions
+from utils.telemetry import DISABLED
+from utils.ui_helpers import get_window_bounds, get_rotated_positions_and_check_all_inside, get_images, \
+    overlay_characters, resize_image_for_display
+
+# Everything needed to display a row, rendered off the Tk thread. The displays are BGR arrays at their displayed
+# size, see `DisplaySurface`. The filtered displays of the "Unsure" view are rendered from `cropped_image` only
+# when the view is opened, see `FramePrefetcher.filtered`.
+Frame = namedtuple("Frame", ["index", "serial_number", "cropped_image", "cropped_display", "character_display"])
+
+
+def render_filtered_displays(cropped_image, filters):
+    """
+    Applies the filter chains of the "Unsure" view to the cropped strip and resizes the results for display.
+
+    Args:
+        cropped_image (ndarray): Cropped strip at its original resolution.
+        filters (dict): Chains for the `cropped` and `character` labels, see `utils.filters.apply_filters`.
+
+    Returns:
+        tuple: Filtered BGR images for the cropped label and for the character label, at their displayed size.
+    """
+    height, width = cropped_image.shape[0] * 2, cropped_image.shape[1] * 2
+    return (resize_image_for_display(apply_filters(cropped_image, filters.get('cropped') or []), height, width),
+            resize_image_for_display(apply_filters(cropped_image, filters.get('character') or []), height, width))
+
+
+def render_frame(index, row, images_dir, h_pad=30, v_pad=40, positions=None, cache=None, telemetry=DISABLED):
+    """
+    Runs the full per-row pipeline (decode, window, rotation, overlay and display resize) for one row.
+
+    Args:
+        index (int): Position of the row in the DataFrame.
+        row (pd.Series): Data row containing `image`, `serial_number` and `C1` to `C11`.
+        images_dir (str): Directory containing the images.
+        h_pad (int): Horizontal padding around the characters.
+        v_pad (int): Vertical padding around the characters.
+        positions (ndarray, optional): Pre-parsed (11, 2) character positions of the row.
+        cache (RenderCache, optional): On-disk cache of rendered rows, checked before decoding the image.
+        telemetry (Telemetry): Receives the duration of each stage.
+
+    Returns:
+        Frame or None: Rendered frame, or `None` if the image is missing or the row has no `C1`/`C11`.
+    """
+    image_path = os.path.join(images_dir, str(row['image']))
+    cache_key = None
+    if cache is not None:
+        positions = row_positions(row, positions)
+        cache_key = render_cache_key(image_path, positions, row['serial_number'], h_pad, v_pad)
+        if cache_key is None:
+            return None
+        with telemetry.span("cache_read", index=index):
+            cached = cache.get(cache_key)
+        if cached is not None:
+            return Frame(index, row['serial_number'], cached['cropped_image'], cached['cropped_display'],
+                         cached['character_display'])
+
+    with telemetry.span("header", index=index):
+        image_size = read_image_size(image_path)
+    if image_size is None:
+        return None
+
+    with telemetry.span("window", index=index):
+        window_data = calculate_window(row, h_pad, v_pad, image_size, positions=positions)
+        if window_data is None:
+            return None
+
+        x_min, y_min, x_max, y_max, angle, center = get_window_bounds(window_data, image_size)
+        if x_max <= x_min or y_max <= y_min:
+            return None
+        rotated_positions, all_inside = get_rotated_positions_and_check_all_inside(
+            row, center, angle, x_min, y_min, x_max, y_max, positions=positions)
+
+        # Decode only the part of the image the rotated strip is sampled from
+        box = region_source_box(angle, center, x_min, y_min, x_max, y_max, image_size)
+    if box[2] <= box[0] or box[3] <= box[1]:
+        cropped_image = np.zeros((y_max - y_min, x_max - x_min, 3), dtype=np.uint8)
+    else:
+        with telemetry.span("decode", index=index):
+            region = decode_region(image_path, *box)
+        if region is None:
+            return None
+        with telemetry.span("warp", index=index):
+            cropped_image = warp_region(region, angle, center, x_min, y_min, x_max, y_max, box[:2])
+
+    if all_inside:
+        rotated_image, source_scale = None, 1.0
+    else:
+        # The overview is displayed at twice the strip width, so decode it at the lowest sufficient resolution
+        with telemetry.span("decode", index=index):
+            overview, source_scale = decode_reduced(image_path, image_size, cropped_image.shape[1] * 2)
+        if overview is None:
+            return None
+        with telemetry.span("warp", index=index):
+            scale_y = overview.shape[0] / image_size[0]
+            rotated_image = rotate_image(overview, angle, (center[0] * source_scale, center[1] * scale_y))
+            rotated_positions = rotated_positions * np.array([source_scale, scale_y])
+    with telemetry.span("overlay", index=index):
+        character_image, cropped_image, target_height, target_width, font_scale = get_images(
+            rotated_image, all_inside, x_min, y_min, x_max, y_max, cropped_image=cropped_image,
+            source_scale=source_scale)
+        overlay_characters(character_image, rotated_positions, row, all_inside, font_scale, x_min, y_min)
+
+    with telemetry.span("resize", index=index):
+        cropped_display = resize_image_for_display(cropped_image, cropped_image.shape[0] * 2,
+                                                   cropped_image.shape[1] * 2)
+        character_display = resize_image_for_display(character_image, target_height, target_width)
+    if cache_key is not None:
+        with telemetry.span("cache_write", index=index):
+            cache.put(cache_key, cropped_image=cropped_image, cropped_display=cropped_display,
+                      character_display=character_display)
+    return Frame(index, row['serial_number'], cropped_image, cropped_display, character_display)
+
+
+class FramePrefetcher:
+    """
+    Renders the frames around the current row on a worker thread pool and keeps them in a bounded cache.
+
+    Rows are snapshotted on the calling (Tk) thread when a render is scheduled, so workers never read the
+    store while the UI is writing to it.
+    """
+
+    def __init__(self, store, images_dir, h_pad=30, v_pad=40, ahead=5, behind=1, max_frames=16, workers=2,
+                 cache=None, filters=None, telemetry=DISABLED):
+        """
+        Args:
+            store (DataFrameStore or SQLiteStore): Storage containing the rows to render.
+            images_dir (str): Directory containing the images.
+            h_pad (int): Horizontal padding around the characters.
+            v_pad (int): Vertical padding around the characters.
+            ahead (int): Number of rows after the current one to render in advance.
+            behind (int): Number of rows before the current one to render in advance.
+            max_frames (int): Maximum number of frames kept in the cache.
+            workers (int): Number of worker threads.
+            cache (RenderCache, optional): On-disk cache shared with earlier sessions.
+            filters (dict, optional): Filter chains of the "Unsure" view, rendered on demand by `filtered`.
+            telemetry (Telemetry): Receives the duration of each rendering stage.
+        """
+        self.store = store
+        self.cache = cache
+        self.filters = filters
+        self.telemetry = telemetry
+        self.images_dir = images_dir
+        self.h_pad = h_pad
+        self.v_pad = v_pad
+        self.ahead = ahead
+        self.behind = behind
+        self.max_frames = max(max_frames, ahead + behind + 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._futures = OrderedDict()
+        # Filtered displays of the frames shown in the "Unsure" view, with the frame they were rendered from
+        self._filtered = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _submit(self, index):
+        """Schedules the render of a row unless it is already cached or in flight."""
+        with self._lock:
+            if index in self._futures:
+                self._futures.move_to_end(index)
+                return self._futures[index]
+            row = self.store.row(index).copy()
+            positions = self.store.positions(index)
+            future = self._executor.submit(render_frame, index, row, self.images_dir, self.h_pad, self.v_pad,
+                                           positions, self.cache, self.telemetry)
+            self._futures[index] = future
+            while len(self._futures) > self.max_frames:
+                _, evicted = self._futures.popitem(last=False)
+                evicted.cancel()
+            return future
+
+    def schedule(self, index):
+        """
+        Schedules the rows surrounding `index` for rendering, nearest rows first.
+
+        Args:
+            index (int): Index of the row currently displayed.
+        """
+        for offset in range(1, self.ahead + 1):
+            if index + offset < len(self.store):
+                self._submit(index + offset)
+        for offset in range(1, self.behind + 1):
+            if index - offset >= 0:
+                self._submit(index - offset)
+
+    def get(self, index):
+        """
+        Returns the rendered frame for a row, waiting for it if it is still being rendered.
+
+        Args:
+            index (int): Index of the row to display.
+
+        Returns:
+            Frame or None: Rendered frame, or `None` if the row cannot be displayed.
+        """
+        future = self._submit(index)
+        frame = future.result()
+        self.schedule(index)
+        return frame
+
+    def filtered(self, frame):
+        """
+        Returns the filtered displays of a frame, rendered the first time the "Unsure" view shows it.
+
+        Args:
+            frame (Frame): Frame returned by `get`.
+
+        Returns:
+            tuple or None: Filtered BGR images for the cropped label and for the character label, see
+                `render_filtered_displays`, or `None` if no filter chains were given.
+        """
+        if not self.filters:
+            return None
+        with self._lock:
+            rendered = self._filtered.get(frame.index)
+            if rendered is not None and rendered[0] is frame:
+                self._filtered.move_to_end(frame.index)
+                return rendered[1]
+        with self.telemetry.span("filters", index=frame.index):
+            displays = render_filtered_displays(frame.cropped_image, self.filters)
+        with self._lock:
+            self._filtered[frame.index] = (frame, displays)
+            while len(self._filtered) > self.max_frames:
+                self._filtered.popitem(last=False)
+        return displays
+
+    def invalidate(self, index):
+        """
+        Drops the cached frame of a row, e.g. after its serial number has been edited.
+
+        Args:
+            index (int): Index of the row to drop.
+        """
+        with self._lock:
+            future = self._futures.pop(index, None)
+            self._filtered.pop(index, None)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self):
+        """Stops the worker threads without waiting for pending renders."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,285 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from utils.decoding import decode_region, read_image_size
+from utils.image_processing import CHARACTER_COLUMNS, calculate_window, region_source_box, warp_region, \
+    row_positions
+from utils.ui_helpers import get_rotated_positions_and_check_all_inside
+
+# Size (width, height) every character patch is resized to before classification
+PATCH_SIZE = (16, 24)
+# Size of a patch around each position, relative to the spacing between two characters
+PATCH_WIDTH_RATIO = 1.0
+PATCH_HEIGHT_RATIO = 1.6
+
+
+def extract_character_patches(image_path, row, positions=None, patch_size=PATCH_SIZE):
+    """
+    Cuts one grayscale patch around each of the 11 characters of a row, in the rotated frame of the UI.
+
+    The image is rotated like in `get_rotated_positions_and_check_all_inside`, so the characters are upright,
+    and only the strip holding the characters is decoded and warped.
+
+    Args:
+        image_path (str): Path of the image of the row.
+        row (pd.Series): Data row containing `C1` to `C11`.
+        positions (ndarray, optional): Pre-parsed (11, 2) positions of the row, see `parse_coordinates`.
+        patch_size (tuple): Size `(width, height)` of the returned patches.
+
+    Returns:
+        ndarray or None: Uint8 array of shape (11, height, width), or `None` if the image is missing, a position
+            is missing, or a character lies outside the image.
+    """
+    positions = row_positions(row, positions)
+    if np.isnan(positions).any():
+        return None
+    image_size = read_image_size(image_path)
+    if image_size is None:
+        return None
+    window_data = calculate_window(row, 0, 0, image_size, positions=positions)
+    spacing = np.linalg.norm(positions[-1] - positions[0]) / (len(positions) - 1)
+    if window_data is None or spacing < 2:
+        return None
+
+    angle, center = window_data[4], (image_size[1] // 2, image_size[0] // 2)
+    half_width, half_height = spacing * PATCH_WIDTH_RATIO / 2, spacing * PATCH_HEIGHT_RATIO / 2
+    rotated_positions, all_inside = get_rotated_positions_and_check_all_inside(
+        row, center, angle, half_width, half_height, image_size[1] - half_width, image_size[0] - half_height,
+        positions=positions)
+    if not all_inside:
+        return None
+
+    x_min = int(np.floor(rotated_positions[:, 0].min() - half_width))
+    y_min = int(np.floor(rotated_positions[:, 1].min() - half_height))
+    x_max = int(np.ceil(rotated_positions[:, 0].max() + half_width))
+    y_max = int(np.ceil(rotated_positions[:, 1].max() + half_height))
+    box = region_source_box(angle, center, x_min, y_min, x_max, y_max, image_size)
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return None
+    region = decode_region(image_path, *box)
+    if region is None:
+        return None
+    strip = cv2.cvtColor(warp_region(region, angle, center, x_min, y_min, x_max, y_max, box[:2]),
+                         cv2.COLOR_BGR2GRAY)
+
+    patches = np.empty((len(rotated_positions), patch_size[1], patch_size[0]), dtype=np.uint8)
+    for i, (x, y) in enumerate(rotated_positions - (x_min, y_min)):
+        left, top = int(round(x - half_width)), int(round(y - half_height))
+        right, bottom = int(round(x + half_width)), int(round(y + half_height))
+        patches[i] = cv2.resize(strip[max(top, 0):bottom, max(left, 0):right], patch_size,
+                                interpolation=cv2.INTER_AREA)
+    return patches
+
+
+def normalize_patches(patches):
+    """
+    Turns patches into zero-mean, unit-norm feature vectors, so that a dot product is a normalized correlation
+    that does not depend on the brightness and contrast of the image.
+
+    Args:
+        patches (ndarray): Patches of shape (N, height, width).
+
+    Returns:
+        ndarray: Float32 features of shape (N, height * width).
+    """
+    features = np.asarray(patches, dtype=np.float32).reshape(len(patches), -1)
+    features -= features.mean(axis=1, keepdims=True)
+    features /= np.maximum(np.linalg.norm(features, axis=1, keepdims=True), 1e-6)
+    return features
+
+
+class CharacterClassifier:
+    """
+    k-nearest-neighbour classifier of character patches, using the normalized correlation with every labeled
+    patch as similarity. Everything runs on the CPU with NumPy matrix products.
+    """
+
+    def __init__(self, k=5):
+        """
+        Args:
+            k (int): Number of neighbours voting for each prediction.
+        """
+        self.k = k
+        self.features = np.empty((0, PATCH_SIZE[0] * PATCH_SIZE[1]), dtype=np.float32)
+        self.labels = np.empty(0, dtype="<U1")
+
+    def fit(self, patches, labels):
+        """
+        Stores the labeled patches.
+
+        Args:
+            patches (ndarray): Patches of shape (N, height, width).
+            labels (array-like): Character of every patch.
+
+        Returns:
+            CharacterClassifier: The classifier itself.
+        """
+        self.features = normalize_patches(patches)
+        self.labels = np.asarray(labels, dtype="<U1")
+        return self
+
+    def predict(self, patches, batch_size=2048):
+        """
+        Classifies patches.
+
+        The confidence of a prediction is the share of the similarity of the `k` nearest patches that voted for
+        the predicted character.
+
+        Args:
+            patches (ndarray): Patches of shape (N, height, width).
+            batch_size (int): Number of patches compared with the training set at once, bounding memory use.
+
+        Returns:
+            tuple: `(labels, confidences)`, arrays of shape (N,).
+        """
+        features = normalize_patches(patches)
+        labels = np.empty(len(features), dtype="<U1")
+        confidences = np.zeros(len(features), dtype=np.float32)
+        if len(self.labels) == 0:
+            return labels, confidences
+        k = min(self.k, len(self.labels))
+        classes, label_ids = np.unique(self.labels, return_inverse=True)
+        for start in range(0, len(features), batch_size):
+            similarities = features[start:start + batch_size] @ self.features.T
+            nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            weights = np.maximum(np.take_along_axis(similarities, nearest, axis=1), 0)
+            votes = np.zeros((len(nearest), len(classes)), dtype=np.float32)
+            np.add.at(votes, (np.arange(len(nearest))[:, None], label_ids[nearest]), weights)
+            best = votes.argmax(axis=1)
+            labels[start:start + batch_size] = classes[best]
+            confidences[start:start + batch_size] = votes[np.arange(len(votes)), best] / np.maximum(
+                votes.sum(axis=1), 1e-6)
+        return labels, confidences
+
+    def save(self, path):
+        """Writes the labeled patches to a `.npz` file."""
+        np.savez_compressed(path, features=self.features, labels=self.labels, k=self.k)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a classifier written by `save`."""
+        with np.load(path) as data:
+            classifier = cls(k=int(data['k']))
+            classifier.features, classifier.labels = data['features'], data['labels']
+        return classifier
+
+
+def collect_patches(df, coordinates, images_dir, rows, workers=8):
+    """
+    Extracts the character patches of several rows in parallel.
+
+    Args:
+        df (pd.DataFrame): Data containing `image` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions, see `parse_coordinates`.
+        images_dir (str): Directory containing the images.
+        rows (list): Positions of the rows to extract.
+        workers (int): Number of threads. OpenCV releases the GIL while decoding and warping.
+
+    Returns:
+        dict: Patches of every row that could be extracted, by row position.
+    """
+    def extract(index):
+        row = df.iloc[index]
+        return index, extract_character_patches(os.path.join(images_dir, str(row['image'])), row,
+                                                coordinates[index])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prelabel") as executor:
+        return {index: patches for index, patches in executor.map(extract, rows) if patches is not None}
+
+
+def training_set(df, coordinates, images_dir, workers=8):
+    """
+    Builds labeled character patches from the rows marked as sure with an 11-character serial number.
+
+    Args:
+        df (pd.DataFrame): Data containing `image`, `serial_number`, `unsure` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions.
+        images_dir (str): Directory containing the images.
+        workers (int): Number of threads.
+
+    Returns:
+        tuple: `(patches, labels, rows)`, with patches of shape (M, height, width), the character of each
+            patch, and the rows they come from.
+    """
+    serials = df['serial_number'].astype(str)
+    labeled = serials.str.len() == len(CHARACTER_COLUMNS)
+    if 'unsure' in df.columns:
+        labeled &= df['unsure'] == 0
+    patches = collect_patches(df, coordinates, images_dir, np.flatnonzero(labeled.to_numpy()).tolist(), workers)
+    if not patches:
+        return np.empty((0, PATCH_SIZE[1], PATCH_SIZE[0]), dtype=np.uint8), np.empty(0, dtype="<U1"), []
+    rows = sorted(patches)
+    return (np.concatenate([patches[index] for index in rows]),
+            np.array([character for index in rows for character in serials.iat[index]], dtype="<U1"), rows)
+
+
+def propose_serial_numbers(df, coordinates, images_dir, classifier, rows, workers=8):
+    """
+    Proposes a serial number for each row, with the confidence of every character.
+
+    Args:
+        df (pd.DataFrame): Data containing `image` and `C1` to `C11`.
+        coordinates (ndarray): Pre-parsed (N, 11, 2) positions.
+        images_dir (str): Directory containing the images.
+        classifier (CharacterClassifier): Trained classifier.
+        rows (list): Positions of the rows to label.
+        workers (int): Number of threads.
+
+    Returns:
+        pd.DataFrame: `image`, `proposed_serial_number`, `confidence` (lowest character confidence) and
+            `character_confidences` of every row whose patches could be extracted, ordered by row.
+    """
+    patches = collect_patches(df, coordinates, images_dir, rows, workers)
+    columns = ['image', 'proposed_serial_number', 'confidence', 'character_confidences']
+    if not patches:
+        return pd.DataFrame(columns=columns)
+    indices = sorted(patches)
+    labels, confidences = classifier.predict(np.concatenate([patches[index] for index in indices]))
+    labels = labels.reshape(len(indices), -1)
+    confidences = confidences.reshape(len(indices), -1)
+    return pd.DataFrame({
+        'image': df['image'].astype(str).iloc[indices].tolist(),
+        'proposed_serial_number': ["".join(characters) for characters in labels],
+        'confidence': confidences.min(axis=1).round(4),
+        'character_confidences': [";".join(f"{value:.2f}" for value in row) for row in confidences],
+    }, columns=columns)
+
+
+def load_proposals(path):
+    """
+    Reads the proposals written by `prelabel.py`.
+
+    Args:
+        path (str): CSV file of proposals.
+
+    Returns:
+        dict: `(proposed_serial_number, confidence)` by image name, empty if the file does not exist.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    proposals = pd.read_csv(path, dtype={'image': str, 'proposed_serial_number': str})
+    return {image: (serial, float(confidence)) for image, serial, confidence
+            in zip(proposals['image'], proposals['proposed_serial_number'], proposals['confidence'])}
+
+
+def review_order(images, proposals, descending=True):
+    """
+    Orders the rows by the confidence of their proposal, so that the rows the pre-labeler is sure about can be
+    confirmed together and the uncertain ones reviewed together.
+
+    Args:
+        images (list): Image names of all rows, in the order of the sheet.
+        proposals (dict): Proposals by image name, see `load_proposals`.
+        descending (bool): Most confident rows first.
+
+    Returns:
+        list: Positions of the rows in review order. Rows without a proposal come last, in sheet order.
+    """
+    confidences = np.array([proposals[image][1] if image in proposals else np.nan for image in images])
+    with_proposal = np.flatnonzero(~np.isnan(confidences))
+    ranks = np.argsort(-confidences[with_proposal] if descending else confidences[with_proposal], kind="stable")
+    return with_proposal[ranks].tolist() + np.flatnonzero(np.isnan(confidences)).tolist()
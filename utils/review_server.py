@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import cv2
+import numpy as np
+
+from utils.disk_cache import render_cache_key
+from utils.manifest import DISPLAYABLE, MISSING_IMAGE, RENDER_ERROR, UNREADABLE_IMAGE, probe_row
+from utils.prefetch import render_frame
+
+IMAGE_FORMATS = {'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+                 'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg')}
+EDITABLE_FIELDS = ('serial_number', 'unsure')
+_MAX_HEADER_LINES = 100
+_MAX_BODY_BYTES = 64 * 1024
+_ROUTES = [
+    ("GET", re.compile(r"/"), "_page"),
+    ("GET", re.compile(r"/api/summary"), "_summary"),
+    ("GET", re.compile(r"/api/rows/(\d+)"), "_get_row"),
+    ("POST", re.compile(r"/api/rows/(\d+)"), "_update_row"),
+    ("GET", re.compile(r"/api/next_unlabeled/(\d+)"), "_next_unlabeled"),
+    ("POST", re.compile(r"/api/save"), "_save"),
+    ("GET", re.compile(r"/rows/(\d+)/(crop|overlay)\.(webp|jpeg)"), "_image"),
+]
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Image Review</title>
+<style>body{font-family:sans-serif;text-align:center}img{display:block;margin:10px auto;max-width:95vw}
+#status{margin:8px}</style></head>
+<body>
+<div id="status"></div><img id="overlay" alt=""><img id="crop" alt="">
+<div><input id="index" size="6"> <span id="total"></span> <button onclick="go()">Go</button>
+<button onclick="nextUnlabeled()">Next Unlabeled</button></div>
+<div><input id="serial" size="15" oninput="check()"></div>
+<div><button id="sure" onclick="decide(0)">Sure</button> <button id="unsure" onclick="decide(1)">Unsure</button>
+<button onclick="fetch('/api/save', {method: 'POST'})">Save</button></div>
+<script>
+let index = 0, total = 0, format = "FORMAT";
+const $ = id => document.getElementById(id);
+function check() { const ok = $("serial").value.length == 11; $("sure").disabled = !ok; $("unsure").disabled = !ok; }
+async function show(i) {
+  const row = await (await fetch(`/api/rows/${i}`)).json();
+  if (row.error) { $("status").textContent = row.error; return; }
+  index = i; $("index").value = i + 1; $("serial").value = row.serial_number || "";
+  $("status").textContent = `${row.image}: ${row.unsure == null ? "not labeled yet" : row.unsure ? "unsure" : "sure"}`;
+  $("crop").src = `/rows/${i}/crop.${format}`; $("overlay").src = `/rows/${i}/overlay.${format}`;
+  check();
+  // Warm the browser cache with the next row
+  if (i + 1 < total) {
+    new Image().src = `/rows/${i + 1}/overlay.${format}`;
+    new Image().src = `/rows/${i + 1}/crop.${format}`;
+  }
+}
+async function decide(unsure) {
+  await fetch(`/api/rows/${index}`, {method: "POST", headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({serial_number: $("serial").value, unsure: unsure})});
+  if (index + 1 < total) show(index + 1);
+}
+function go() { const i = parseInt($("index").value) - 1; if (i >= 0 && i < total) show(i); }
+async function nextUnlabeled() {
+  const next = await (await fetch(`/api/next_unlabeled/${index + 1}`)).json();
+  if (next.index != null) show(next.index);
+}
+document.addEventListener("keydown", e => { if (e.key == "Enter" && !$("sure").disabled) decide(0); });
+fetch("/api/summary").then(r => r.json()).then(s => { total = s.rows; $("total").textContent = `/${total}`; show(0); });
+</script></body></html>
+"""
+
+
+class HTTPError(Exception):
+    """Error answered to the client with an HTTP status and a JSON body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_value(value):
+    """Converts a cell value to something `json.dumps` accepts, NaN becoming `null`."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class ReviewServer:
+    """
+    HTTP front-end of the review, an alternative to the Tk UI for reviewers on other machines or in a browser.
+
+    Runs on asyncio, so many reviewers can stay connected while the event loop only parses requests. The crop
+    and overlay of a row are rendered by `render_frame` (the pipeline of the Tk UI) and encoded as WebP or JPEG
+    on a thread pool. Encoded images are addressed by an ETag derived from the image file, the character
+    positions and the serial number, so browsers revalidate them with `If-None-Match` and an edited serial
+    number gives a new overlay. Edits go through a single thread, in the order they are received.
+    """
+
+    def __init__(self, store, images_dir, h_pad=30, v_pad=40, image_format='webp', quality=80, workers=4,
+                 max_images=256):
+        """
+        Args:
+            store (DataFrameStore, SQLiteStore or OrderedStore): Storage holding the rows, receiving every edit.
+            images_dir (str): Directory containing the images.
+            h_pad (int): Horizontal padding around the characters.
+            v_pad (int): Vertical padding around the characters.
+            image_format (str): Format served by the page, `webp` or `jpeg`. Both can be requested.
+            quality (int): Encoding quality, from 0 to 100.
+            workers (int): Number of threads rendering and encoding images.
+            max_images (int): Number of encoded images kept in memory.
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format {image_format!r}, expected one of {sorted(IMAGE_FORMATS)}")
+        self.store = store
+        self.images_dir = images_dir
+        self.h_pad = h_pad
+        self.v_pad = v_pad
+        self.image_format = image_format
+        self.quality = quality
+        self.max_images = max_images
+        self._images = OrderedDict()
+        self._images_lock = threading.Lock()
+        # Renders in progress, by version of the row, only touched from the event loop
+        self._renders = {}
+        self._render_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review-render")
+        self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="review-store")
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """
+        Starts listening. Use port 0 to let the system choose a free port.
+
+        Returns:
+            tuple: `(host, port)` the server listens on.
+        """
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """Serves requests until the task is cancelled."""
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Stops listening and waits for the pending edits."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._render_executor.shutdown(wait=False, cancel_futures=True)
+        self._store_executor.shutdown(wait=True)
+
+    async def _run_store(self, function, *args, **kwargs):
+        """Runs a store operation on the store thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._store_executor,
+                                                                lambda: function(*args, **kwargs))
+
+    async def _handle_connection(self, reader, writer):
+        """Serves the requests of one connection, keeping it open between requests unless asked otherwise."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, response_headers, payload = await self._dispatch(method, path, headers, body)
+                except HTTPError as error:
+                    status, response_headers, payload = self._json(error.status, {'error': str(error)})
+                except Exception as error:
+                    status, response_headers, payload = self._json(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                                                   {'error': f"{type(error).__name__}: {error}"})
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, response_headers, payload, method == "HEAD", keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """
+        Reads one request.
+
+        Returns:
+            tuple or None: `(method, path, headers, body)`, or `None` when the client closed the connection.
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        for _ in range(_MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("Too many header lines")
+        length = int(headers.get('content-length', 0))
+        if length > _MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def _write_response(writer, status, headers, payload, head_only, keep_alive):
+        """Writes the status line, the headers and the payload of a response."""
+        status = HTTPStatus(status)
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Length: {len(payload)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if not head_only:
+            writer.write(payload)
+
+    @staticmethod
+    def _json(status, content):
+        """Builds a JSON response."""
+        return status, {'Content-Type': 'application/json', 'Cache-Control': 'no-store'}, \
+            json.dumps(content).encode("utf-8")
+
+    async def _dispatch(self, method, path, headers, body):
+        """Calls the handler of the route matching the request."""
+        allowed = False
+        for route_method, pattern, handler in _ROUTES:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method == method or (route_method == "GET" and method == "HEAD"):
+                return await getattr(self, handler)(*match.groups(), headers=headers, body=body)
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on {path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+
+    def _index(self, value):
+        """Parses a row position from the URL and checks its range."""
+        index = int(value)
+        if not 0 <= index < len(self.store):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Row {index + 1} is out of range")
+        return index
+
+    def _row_content(self, index):
+        """Returns the JSON description of a row."""
+        row = self.store.row(index)
+        return {'index': index, **{str(column): _json_value(value) for column, value in row.items()}}
+
+    async def _page(self, headers, body):
+        """Serves the review page."""
+        page = _PAGE.replace("FORMAT", self.image_format).encode("utf-8")
+        return HTTPStatus.OK, {'Content-Type': 'text/html; charset=utf-8', 'Cache-Control': 'no-cache'}, page
+
+    async def _summary(self, headers, body):
+        """Serves the number of rows and the default image format."""
+        return self._json(HTTPStatus.OK, {'rows': len(self.store), 'format': self.image_format})
+
+    async def _get_row(self, index, headers, body):
+        """Serves the fields of a row."""
+        index = self._index(index)
+        return self._json(HTTPStatus.OK, await self._run_store(self._row_content, index))
+
+    async def _update_row(self, index, headers, body):
+        """Applies the `serial_number` and `unsure` fields of a JSON body to a row, and serves the updated row."""
+        index = self._index(index)
+        try:
+            fields = json.loads(body or b"{}")
+        except json.JSONDecodeError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {error}")
+        if not isinstance(fields, dict) or set(fields) - set(EDITABLE_FIELDS):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Only {', '.join(EDITABLE_FIELDS)} can be edited")
+        if 'unsure' in fields:
+            if fields['unsure'] not in (0, 1, None):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "unsure must be 0, 1 or null")
+            fields['unsure'] = float('nan') if fields['unsure'] is None else float(fields['unsure'])
+        if 'serial_number' in fields:
+            fields['serial_number'] = str(fields['serial_number'])
+
+        def update():
+            self.store.update(index, **fields)
+            return self._row_content(index)
+
+        return self._json(HTTPStatus.OK, await self._run_store(update))
+
+    async def _next_unlabeled(self, start, headers, body):
+        """Serves the position of the first row at or after `start` without a sure/unsure label."""
+        index = await self._run_store(self.store.next_unlabeled, int(start))
+        return self._json(HTTPStatus.OK, {'index': index})
+
+    async def _save(self, headers, body):
+        """Writes the store to disk, in the background for the Excel backend."""
+        await self._run_store(self.store.save)
+        return self._json(HTTPStatus.OK, {'saved': True})
+
+    def _render(self, index, row, positions, image_format, etags):
+        """
+        Renders a row and encodes its crop and overlay, which are requested together by the page. Runs on the
+        render threads.
+
+        Returns:
+            dict: Encoded images by kind.
+
+        Raises:
+            HTTPError: `404` if the image is missing, `422` with the reason of the manifest if the row cannot be
+                displayed otherwise.
+        """
+        try:
+            frame = render_frame(index, row, self.images_dir, self.h_pad, self.v_pad, positions=positions)
+        except Exception as error:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY,
+                            f"Row {index + 1} cannot be displayed: {RENDER_ERROR}: {error!r}")
+        if frame is None:
+            reason, _ = probe_row(os.path.join(self.images_dir, str(row['image'])), positions)
+            # The header and the positions are fine, so the pixels could not be decoded
+            reason = UNREADABLE_IMAGE if reason == DISPLAYABLE else reason
+            raise HTTPError(HTTPStatus.NOT_FOUND if reason == MISSING_IMAGE else HTTPStatus.UNPROCESSABLE_ENTITY,
+                            f"Row {index + 1} cannot be displayed: {reason}")
+        extension, quality_flag, _ = IMAGE_FORMATS[image_format]
+        payloads = {}
+        for kind, image in (("crop", frame.cropped_display), ("overlay", frame.character_display)):
+            ok, encoded = cv2.imencode(extension, image, [quality_flag, self.quality])
+            if not ok:
+                raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, f"Row {index + 1} could not be encoded")
+            payloads[kind] = encoded.tobytes()
+        with self._images_lock:
+            for kind, payload in payloads.items():
+                self._images[etags[kind]] = payload
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+        return payloads
+
+    async def _image(self, index, kind, image_format, headers, body):
+        """Serves the crop or the overlay of a row, or `304 Not Modified` if the client has it already."""
+        index = self._index(index)
+        row, positions = await self._run_store(lambda: (self.store.row(index), self.store.positions(index)))
+        key = render_cache_key(os.path.join(self.images_dir, str(row['image'])), positions, row['serial_number'],
+                               self.h_pad, self.v_pad)
+        if key is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Row {index + 1} cannot be displayed: {MISSING_IMAGE}")
+        version = hashlib.sha256(f"{key}|{image_format}|{self.quality}".encode()).hexdigest()[:32]
+        etags = {name: f'"{version}-{name}"' for name in ("crop", "overlay")}
+        response_headers = {'Content-Type': IMAGE_FORMATS[image_format][2], 'ETag': etags[kind],
+                            'Cache-Control': 'private, no-cache'}
+        if etags[kind] in [tag.strip() for tag in headers.get('if-none-match', '').split(",")]:
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+        with self._images_lock:
+            payload = self._images.get(etags[kind])
+            if payload is not None:
+                self._images.move_to_end(etags[kind])
+        if payload is None:
+            # The crop and the overlay of a row share one render, whichever is requested first
+            render = self._renders.get(version)
+            if render is None:
+                render = asyncio.ensure_future(asyncio.get_running_loop().run_in_executor(
+                    self._render_executor, self._render, index, row, positions, image_format, etags))
+                self._renders[version] = render
+                render.add_done_callback(lambda _: self._renders.pop(version, None))
+            payload = (await asyncio.shield(render))[kind]
+        return HTTPStatus.OK, response_headers, payload
@@ -0,0 +1,100 @@
+import getpass
+import json
+import os
+import socket
+from datetime import datetime
+
+
+class SessionLock:
+    """
+    Advisory lock on a sheet, so that two annotators never edit the same file at the same time.
+
+    The lock is a `<path>.lock` file created atomically with `O_EXCL`, which works on local disks and on shared
+    network drives without any server. It records who holds it, and a lock left behind by a process that no
+    longer runs on this machine is taken over automatically.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the file to protect. The lock file is created next to it.
+        """
+        self.path = f"{path}.lock"
+        self.acquired = False
+
+    def owner(self):
+        """
+        Returns who holds the lock.
+
+        Returns:
+            dict or None: `user`, `host`, `pid` and `since` of the holder, or `None` if the file is not locked.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as lock_file:
+                return json.load(lock_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Being written by its holder, or left corrupted
+            return {}
+
+    def held(self):
+        """Checks whether another session holds the lock, ignoring a lock left behind by a crashed process."""
+        owner = self.owner()
+        return owner is not None and not self._is_stale(owner)
+
+    def describe_owner(self):
+        """Returns a readable description of the holder of the lock."""
+        owner = self.owner() or {}
+        return (f"{owner.get('user', 'unknown user')} on {owner.get('host', 'unknown host')} "
+                f"(pid {owner.get('pid', '?')}, since {owner.get('since', '?')})")
+
+    def _is_stale(self, owner):
+        """Checks whether the lock was left by a process of this machine that is not running anymore."""
+        if os.name != "posix" or not owner or owner.get('host') != socket.gethostname():
+            return False
+        try:
+            os.kill(int(owner['pid']), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, KeyError, ValueError):
+            return False
+        return False
+
+    def acquire(self, force=False):
+        """
+        Takes the lock.
+
+        Args:
+            force (bool): Take the lock even if another process holds it, e.g. after a crash on another machine.
+
+        Returns:
+            bool: `True` if the lock is now held by this process.
+        """
+        info = {'user': getpass.getuser(), 'host': socket.gethostname(), 'pid': os.getpid(),
+                'since': datetime.now().isoformat(timespec="seconds")}
+        for _ in range(2):
+            try:
+                descriptor = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not (force or self._is_stale(self.owner())):
+                    return False
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(descriptor, "w", encoding="utf-8") as lock_file:
+                json.dump(info, lock_file)
+            self.acquired = True
+            return True
+        return False
+
+    def release(self):
+        """Releases the lock if this process holds it."""
+        if self.acquired:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.acquired = False
@@ -0,0 +1,276 @@
+import json
+import os
+import shutil
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.file_handling import save_data
+from utils.journal import EditJournal
+from utils.session_lock import SessionLock
+from utils.storage import load_table
+
+# Column of a shard holding the position of each row in the master sheet
+MASTER_ROW = "master_row"
+SHARDS_FILE = "shards.json"
+BASE_FILE = "base.xlsx"
+CONFLICTS_FILE = "conflicts.csv"
+
+
+def assign_shards(images, count, method="range"):
+    """
+    Chooses the shard of every row.
+
+    With `range`, the sheet is cut into `count` contiguous blocks of (almost) equal size. With `hash`, the shard
+    is derived from a CRC32 of the image name, so it does not depend on the order of the sheet, and rows that
+    share an image always end up in the same shard.
+
+    Args:
+        images (list): Image names of all rows, in order.
+        count (int): Number of shards.
+        method (str): `range` or `hash`.
+
+    Returns:
+        ndarray: Shard number of every row.
+    """
+    if method == "range":
+        return np.repeat(np.arange(count), [len(block) for block in np.array_split(np.arange(len(images)), count)])
+    if method == "hash":
+        return np.array([zlib.crc32(str(image).encode("utf-8")) % count for image in images], dtype=np.int64)
+    raise ValueError(f"Unknown sharding method: {method}")
+
+
+def shard_path(shard_dir, name):
+    """Returns the path of the sheet of the shard `name`."""
+    return os.path.join(shard_dir, f"{name}.xlsx")
+
+
+def load_shards(shard_dir):
+    """
+    Reads the description of a split.
+
+    Args:
+        shard_dir (str): Directory written by `split_sheet`.
+
+    Returns:
+        dict: `master`, `method`, `annotators` and `created` of the split, and `merged`, the time of the merge,
+            once the shards were merged.
+    """
+    with open(os.path.join(shard_dir, SHARDS_FILE), "r", encoding="utf-8") as shards_file:
+        return json.load(shards_file)
+
+
+def _write_shards(shard_dir, shards):
+    """Writes the description of a split, replacing the previous one in a single step."""
+    path = os.path.join(shard_dir, SHARDS_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as shards_file:
+        json.dump(shards, shards_file, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def archive_shards(shard_dir):
+    """
+    Moves the files of a merged split (shards, journals, backups, base and conflicts) into a `merged_<time>`
+    subdirectory, so that the directory can receive a new split and no old journal is replayed into a new shard.
+
+    Args:
+        shard_dir (str): Directory written by `split_sheet`, already merged.
+
+    Returns:
+        str: Directory holding the archived files.
+    """
+    merged = load_shards(shard_dir)['merged']
+    archive_dir = os.path.join(shard_dir, "merged_" + merged.replace(":", "").replace("-", ""))
+    os.makedirs(archive_dir, exist_ok=True)
+    for name in os.listdir(shard_dir):
+        if os.path.isfile(os.path.join(shard_dir, name)):
+            shutil.move(os.path.join(shard_dir, name), os.path.join(archive_dir, name))
+    return archive_dir
+
+
+def split_sheet(master_path, shard_dir, annotators, method="range"):
+    """
+    Splits the master sheet into one sheet per annotator.
+
+    The master sheet is read with the edits of its journal that were not compacted yet. Every shard keeps the
+    position of its rows in the master sheet in a `master_row` column. A copy of the master sheet is kept as the common base of all shards, so that the merge can tell which values each
+    annotator changed. The files of an earlier split of the directory are archived first, see
+    `archive_shards`, which requires that split to be merged.
+
+    Args:
+        master_path (str): Master sheet to split.
+        shard_dir (str): Directory receiving the shards, created if needed.
+        annotators (list): Names of the annotators, one shard each.
+        method (str): `range` or `hash`, see `assign_shards`.
+
+    Returns:
+        dict: Number of rows of every shard.
+
+    Raises:
+        RuntimeError: If the directory holds shards that were not merged yet.
+    """
+    if len(set(annotators)) != len(annotators):
+        raise ValueError("Annotator names must be unique")
+    if os.path.exists(os.path.join(shard_dir, SHARDS_FILE)):
+        if not load_shards(shard_dir).get('merged'):
+            raise RuntimeError(f"{shard_dir} holds shards that were not merged yet, merge them or choose another "
+                               f"directory")
+        archive_shards(shard_dir)
+    os.makedirs(shard_dir, exist_ok=True)
+    # Edits of a session on the master sheet that were not compacted into it yet are part of the split
+    df = load_journaled(master_path)
+    df.to_excel(os.path.join(shard_dir, BASE_FILE), index=False)
+    shards = assign_shards(df['image'].astype(str).tolist(), len(annotators), method)
+    sizes = {}
+    for number, name in enumerate(annotators):
+        rows = np.flatnonzero(shards == number)
+        shard = df.iloc[rows].copy()
+        shard.insert(0, MASTER_ROW, rows)
+        shard.to_excel(shard_path(shard_dir, name), index=False)
+        sizes[name] = len(rows)
+    _write_shards(shard_dir, {'master': master_path, 'method': method, 'annotators': list(annotators),
+                              'created': datetime.now().isoformat(timespec="seconds")})
+    return sizes
+
+
+def _same(a, b):
+    """Compares two cell values, treating missing values as equal and ignoring int/float/str differences."""
+    if pd.isna(a) or pd.isna(b):
+        return pd.isna(a) and pd.isna(b)
+    if a == b:
+        return True
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+
+def load_journaled(path):
+    """
+    Reads a sheet, a shard or the master sheet, with the edits of its journal that were not saved yet.
+
+    Args:
+        path (str): Sheet to read.
+
+    Returns:
+        pd.DataFrame: Current content of the sheet.
+    """
+    df = load_table(path)
+    journal_path = f"{path}.journal"
+    if os.path.exists(journal_path):
+        journal = EditJournal(journal_path, fsync=False)
+        journal.replay(df)
+        journal.close()
+    return df
+
+
+def shard_edits(shard, base):
+    """
+    Lists the values an annotator changed in a shard.
+
+    Args:
+        shard (pd.DataFrame): Current content of the shard, with its `master_row` column.
+        base (pd.DataFrame): Master sheet as it was when the shards were created.
+
+    Returns:
+        list: `(master_row, image, column, value)` of every changed cell.
+    """
+    edits = []
+    columns = [column for column in shard.columns if column != MASTER_ROW]
+    for record in shard.itertuples(index=False):
+        row = dict(zip(shard.columns, record))
+        master_row = int(row[MASTER_ROW])
+        for column in columns:
+            original = base.at[master_row, column] if column in base.columns else np.nan
+            if not _same(row[column], original):
+                edits.append((master_row, str(base.at[master_row, 'image']), column, row[column]))
+    return edits
+
+
+def merge_shards(shard_dir, output_file_path, master_path=None, force=False):
+    """
+    Merges the edits of every shard into the master sheet.
+
+    An edit is a value of a shard that differs from the base the shards were created from. Edits are applied
+    unless they conflict, i.e. unless the same column of the same image was changed to different values in
+    several shards, or was also changed in the master sheet since the split, its journal included. Conflicting
+    cells keep the value of the master sheet and are written to `conflicts.csv` in the shard directory.
+
+    A successful merge marks the split as merged, and merging it again does nothing, so the master sheet is not
+    rewritten nor backed up twice.
+
+    Args:
+        shard_dir (str): Directory written by `split_sheet`.
+        output_file_path (str): Directory path and prefix for the backup of the master sheet.
+        master_path (str, optional): Master sheet, by default the one the shards were split from.
+        force (bool): Merge even if a shard or the master sheet is locked by a running session.
+
+    Returns:
+        tuple: `(applied, conflicts)`, the number of cells written and the list of conflicting
+            `(image, column)` pairs, `(0, [])` if the split was already merged.
+    """
+    shards = load_shards(shard_dir)
+    if shards.get('merged'):
+        return 0, []
+    master_path = master_path or shards['master']
+    master_lock = SessionLock(master_path)
+    if not master_lock.acquire(force=force):
+        raise RuntimeError(f"{master_path} is locked by {master_lock.describe_owner()}")
+    try:
+        for name in shards['annotators']:
+            lock = SessionLock(shard_path(shard_dir, name))
+            if not force and lock.held():
+                raise RuntimeError(f"Shard {name} is still being edited by {lock.describe_owner()}")
+
+        base = load_table(os.path.join(shard_dir, BASE_FILE))
+        master = load_journaled(master_path)
+        if len(master) != len(base) or not (master['image'].astype(str) == base['image'].astype(str)).all():
+            raise RuntimeError(f"The rows of {master_path} changed since the split, the shards cannot be merged")
+
+        # Proposed values of every cell, by annotator
+        proposals = {}
+        for name in shards['annotators']:
+            for master_row, image, column, value in shard_edits(load_journaled(shard_path(shard_dir, name)), base):
+                proposals.setdefault((image, column), []).append((name, master_row, value))
+
+        applied, conflicts, report = 0, [], []
+        for (image, column), edits in proposals.items():
+            values = [value for _, _, value in edits]
+            rows = [master_row for _, master_row, _ in edits]
+            changed_in_master = column in master.columns and any(
+                not _same(master.at[row, column], base.at[row, column]) and not _same(master.at[row, column], value)
+                for row, value in zip(rows, values))
+            if changed_in_master or any(not _same(value, values[0]) for value in values[1:]):
+                conflicts.append((image, column))
+                for row in sorted(set(rows)):
+                    report.append({'image': image, 'column': column, 'master_row': row, 'source': 'base',
+                                   'value': base.at[row, column] if column in base.columns else np.nan})
+                    if column in master.columns and not _same(master.at[row, column], base.at[row, column]):
+                        report.append({'image': image, 'column': column, 'master_row': row, 'source': 'master',
+                                       'value': master.at[row, column]})
+                report.extend({'image': image, 'column': column, 'master_row': row, 'source': name, 'value': value}
+                              for name, row, value in edits)
+                continue
+            for row, value in zip(rows, values):
+                master.at[row, column] = value
+                applied += 1
+
+        conflicts_path = os.path.join(shard_dir, CONFLICTS_FILE)
+        if report:
+            pd.DataFrame(report, columns=['image', 'column', 'master_row', 'source', 'value']).to_csv(
+                conflicts_path, index=False)
+        elif os.path.exists(conflicts_path):
+            os.remove(conflicts_path)
+        if applied:
+            save_data(master, output_file_path, master_path)
+            # The edits of the master journal are now in the sheet, replaying them later could undo merged values
+            master_journal = f"{master_path}.journal"
+            if os.path.exists(master_journal):
+                open(master_journal, "w", encoding="utf-8").close()
+        shards['merged'] = datetime.now().isoformat(timespec="seconds")
+        _write_shards(shard_dir, shards)
+        return applied, conflicts
+    finally:
+        master_lock.release()
@@ -0,0 +1,425 @@
+import os
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from utils.image_processing import parse_coordinates, row_positions
+from utils.journal import EditJournal
+from utils.storage import DataFrameStore, SQLiteStore, load_table
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_SI, _T, _RUN_T, _ROW, _CELL, _VALUE = (f"{_NS}si", f"{_NS}t", f"{_NS}r/{_NS}t", f"{_NS}row", f"{_NS}c", f"{_NS}v")
+
+
+class _WorkbookReader:
+    """
+    Reads the cell values of the first sheet of an `.xlsx` archive, one row at a time.
+
+    openpyxl parses the whole shared string table before returning the first row, which takes seconds on large
+    sheets. Here the table is parsed incrementally, only as far as the rows read so far need, and the sheet XML
+    is streamed with `iterparse`. Values follow `pd.read_excel`: integral numbers are ints, empty strings and
+    error cells are `None`, and numbers with a date format are converted with openpyxl.
+    """
+
+    def __init__(self, archive):
+        """
+        Args:
+            archive (zipfile.ZipFile): Open workbook.
+        """
+        self.archive = archive
+        names = set(archive.namelist())
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        relationships = {relationship.get("Id"): relationship
+                         for relationship in ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))}
+
+        def part(relationship):
+            target = relationship.get("Target")
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+        sheet = workbook.find(f"{_NS}sheets/{_NS}sheet")
+        self.sheet_path = part(relationships[sheet.get(f"{_REL_NS}id")])
+        strings_paths = [part(relationship) for relationship in relationships.values()
+                         if relationship.get("Type", "").endswith("/sharedStrings")]
+        self._strings_file = archive.open(strings_paths[0]) if strings_paths and strings_paths[0] in names else None
+        self._strings_events = ET.iterparse(self._strings_file) if self._strings_file is not None else iter(())
+        self.shared_strings = []
+
+        properties = workbook.find(f"{_NS}workbookPr")
+        self.date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self.date_styles = self._read_date_styles("xl/styles.xml") if "xl/styles.xml" in names else set()
+
+    def _read_date_styles(self, path):
+        """Returns the indexes of the cell styles whose number format is a date."""
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+        styles = ET.fromstring(self.archive.read(path))
+        formats = dict(BUILTIN_FORMATS)
+        formats.update((int(number_format.get("numFmtId")), number_format.get("formatCode"))
+                       for number_format in styles.iter(f"{_NS}numFmt"))
+        cell_formats = styles.find(f"{_NS}cellXfs")
+        if cell_formats is None:
+            return set()
+        return {style for style, cell_format in enumerate(cell_formats)
+                if is_date_format(formats.get(int(cell_format.get("numFmtId", 0)), "General"))}
+
+    def shared_string(self, index):
+        """Returns a shared string, parsing the table up to it if needed."""
+        while len(self.shared_strings) <= index:
+            _, element = next(self._strings_events)
+            if element.tag != _SI:
+                continue
+            if len(element) == 1 and element[0].tag == _T:
+                self.shared_strings.append(element[0].text or "")
+            else:
+                # Rich text has one `t` per run, phonetic hints (`rPh`) are skipped
+                texts = element.findall(_T) + element.findall(_RUN_T)
+                self.shared_strings.append("".join(text.text or "" for text in texts))
+            element.clear()
+        return self.shared_strings[index]
+
+    def _value(self, cell):
+        """Converts a `c` element to its Python value."""
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            return "".join(text.text or "" for text in cell.iter(_T)) or None
+        value = cell.findtext(_VALUE)
+        if value is None or kind == "e":
+            return None
+        if kind == "s":
+            return self.shared_string(int(value)) or None
+        if kind == "str":
+            return value or None
+        if kind == "b":
+            return value == "1"
+        number = float(value)
+        if self.date_styles and int(cell.get("s", 0)) in self.date_styles:
+            from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+            return from_excel(number, CALENDAR_MAC_1904 if self.date1904 else CALENDAR_WINDOWS_1900)
+        return int(number) if number.is_integer() else number
+
+    def rows(self):
+        """
+        Yields the rows of the sheet.
+
+        Yields:
+            list: Values of the row, by column, with `None` for empty cells.
+        """
+        try:
+            with self.archive.open(self.sheet_path) as sheet_file:
+                for _, element in ET.iterparse(sheet_file):
+                    if element.tag != _ROW:
+                        continue
+                    values = []
+                    for cell in element.iter(_CELL):
+                        reference = cell.get("r")
+                        column = _column_index(reference) if reference else len(values)
+                        values.extend([None] * (column - len(values)))
+                        values.append(self._value(cell))
+                    element.clear()
+                    yield values
+        finally:
+            if self._strings_file is not None:
+                self._strings_file.close()
+
+
+def _column_index(reference):
+    """Converts a cell reference such as `AB12` to the position of its column, here 27."""
+    index = 0
+    for character in reference:
+        if character.isdigit():
+            break
+        index = index * 26 + ord(character) - ord("A") + 1
+    return index - 1
+
+
+def _cell_text(value):
+    """Converts a `serial_number` cell to text like `pd.read_excel(..., dtype=str)` does."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class SheetLoader:
+    """
+    Reads a sheet on a background thread and makes its rows available as soon as they are parsed.
+
+    Excel files are streamed by `_WorkbookReader`, so the first row can be displayed long before the workbook
+    is fully parsed. Other formats are read in one piece by `load_table`. Once
+    the whole sheet is in a DataFrame, the parsed rows are released and reads go to the DataFrame.
+    """
+
+    def __init__(self, path, on_complete=None):
+        """
+        Args:
+            path (str): Sheet to read.
+            on_complete (callable, optional): Called with the full DataFrame from the loading thread, once every
+                row is parsed and before `wait` returns.
+        """
+        self.path = path
+        self.on_complete = on_complete
+        self.columns = None
+        self.records = []
+        self.df = None
+        self.error = None
+        self._condition = threading.Condition()
+        self._done = False
+        self._thread = threading.Thread(target=self._run, name="sheet-loader", daemon=True)
+
+    def start(self):
+        """Starts reading the sheet."""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """Reads the sheet, then hands the DataFrame to `on_complete`."""
+        try:
+            if os.path.splitext(self.path)[1].lower() in (".xlsx", ".xlsm"):
+                df = self._stream_workbook()
+            else:
+                df = load_table(self.path)
+            with self._condition:
+                self.df, self.columns, self.records = df, list(df.columns), []
+            if self.on_complete is not None:
+                self.on_complete(df)
+        except Exception as error:
+            self.error = error
+            raise
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def _stream_workbook(self, chunk_size=512):
+        """Parses the first sheet of a workbook row by row and publishes the rows in chunks."""
+        with zipfile.ZipFile(self.path) as archive:
+            reader = _WorkbookReader(archive)
+            rows = reader.rows()
+            header = [str(name) for name in next(rows, ())]
+            serial_column = header.index('serial_number') if 'serial_number' in header else None
+            with self._condition:
+                self.columns = header
+                self._condition.notify_all()
+            chunk = []
+            for values in rows:
+                if not any(value is not None for value in values):
+                    continue
+                values = values[:len(header)] + [None] * (len(header) - len(values))
+                if serial_column is not None:
+                    values[serial_column] = _cell_text(values[serial_column])
+                chunk.append(tuple(values))
+                # The first row is published alone so that it can be displayed right away
+                if len(chunk) >= chunk_size or not self.records:
+                    with self._condition:
+                        self.records.extend(chunk)
+                        self._condition.notify_all()
+                    chunk = []
+            with self._condition:
+                self.records.extend(chunk)
+        return pd.DataFrame(self.records, columns=header)
+
+    @property
+    def done(self):
+        """Whether every row has been parsed."""
+        return self._done
+
+    def __len__(self):
+        """Number of rows parsed so far."""
+        return len(self.df) if self.df is not None else len(self.records)
+
+    def row(self, index):
+        """
+        Returns a row, waiting until it is parsed.
+
+        Args:
+            index (int): Position of the row.
+
+        Returns:
+            pd.Series: The row as read from the sheet.
+
+        Raises:
+            IndexError: If the sheet has fewer rows.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.df is not None or len(self.records) > index or self._done)
+            if self.df is not None:
+                return self.df.iloc[index]
+            if index >= len(self.records):
+                raise IndexError(index)
+            return pd.Series(self.records[index], index=self.columns, name=index)
+
+    def wait(self):
+        """
+        Blocks until every row is parsed.
+
+        Returns:
+            pd.DataFrame: The whole sheet.
+        """
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.df
+
+
+class LoadingStore:
+    """
+    Store available while its sheet is still being read by a `SheetLoader`.
+
+    Until the sheet is loaded, only the rows parsed so far can be read and `len` grows as they arrive. Once it
+    is loaded, every call goes to the store built from the full DataFrame. Calls that need the whole sheet
+    (edits, searches, saving) wait for the loading to finish.
+    """
+
+    def __init__(self, loader, build_store):
+        """
+        Args:
+            loader (SheetLoader): Loader reading the sheet, not started yet.
+            build_store (callable): Builds the store from the full DataFrame, e.g. a `DataFrameStore`. Called on
+                the loading thread.
+        """
+        self.store = None
+        self.loader = loader
+        self._build_store = build_store
+        self._wrappers = []
+        self._wrap_lock = threading.Lock()
+        loader.on_complete = self._complete
+        loader.start()
+
+    def _complete(self, df):
+        """Builds the store once the sheet is loaded."""
+        store = self._build_store(df)
+        with self._wrap_lock:
+            for wrapper in self._wrappers:
+                store = wrapper(store)
+            self.store = store
+
+    def wrap(self, wrapper):
+        """
+        Replaces the store built from the loaded sheet by a view of it, e.g. an `OrderedStore`, without waiting
+        for the sheet. Until it is loaded, rows are read in the order of the sheet.
+
+        Args:
+            wrapper (callable): Called with the store once the sheet is loaded, on the loading thread (or right
+                away if it is loaded already), returns the store to use instead.
+        """
+        with self._wrap_lock:
+            if self.store is None:
+                self._wrappers.append(wrapper)
+            else:
+                self.store = wrapper(self.store)
+
+    @property
+    def ready(self):
+        """Whether the loading is over, `wait` then returns immediately (or raises the loading error)."""
+        return self.loader.done
+
+    def wait(self):
+        """
+        Blocks until the whole sheet is loaded.
+
+        Returns:
+            DataFrameStore: Store holding the whole sheet.
+        """
+        self.loader.wait()
+        return self.store
+
+    def __len__(self):
+        return len(self.store) if self.store is not None else len(self.loader)
+
+    def row(self, index):
+        """Returns the row at position `index` as a Series, waiting for it to be parsed if needed."""
+        if self.store is not None:
+            return self.store.row(index)
+        row = self.loader.row(index).copy()
+        if pd.isna(row['serial_number']):
+            row['serial_number'] = ''
+        return row
+
+    def positions(self, index):
+        """Returns the (11, 2) character positions of the row at position `index`."""
+        if self.store is not None:
+            return self.store.positions(index)
+        return row_positions(self.loader.row(index)).astype(np.float32)
+
+    def images(self):
+        """Returns the image names of all rows, in order."""
+        return self.wait().images()
+
+    def all_positions(self):
+        """Returns the (N, 11, 2) character positions of all rows."""
+        return self.wait().all_positions()
+
+    def update(self, index, **fields):
+        """Sets some fields of a row, see `DataFrameStore.update`."""
+        self.wait().update(index, **fields)
+
+    def update_many(self, indices, **fields):
+        """Sets the same fields on several rows, see `DataFrameStore.update_many`."""
+        self.wait().update_many(indices, **fields)
+
+    def find(self, image):
+        """Returns the position of the row of an image, or `None`."""
+        return self.wait().find(image)
+
+    def next_unlabeled(self, start=0):
+        """Returns the position of the first row at or after `start` without an `unsure` value, or `None`."""
+        return self.wait().next_unlabeled(start)
+
+    def to_dataframe(self):
+        """Returns the current data as a DataFrame."""
+        return self.wait().to_dataframe()
+
+    def save(self, wait=False):
+        """Saves the store, see `DataFrameStore.save`."""
+        self.wait().save(wait=wait)
+
+    def close(self):
+        """Closes the store once the sheet is loaded."""
+        self.wait().close()
+
+
+def load_store(input_file_path, output_file_path, backend='excel', sqlite_path=None):
+    """
+    Opens a sheet with the given storage backend.
+
+    With the `sqlite` backend, the input file is imported into the database the first time, and later launches
+    open the database directly. With the default `excel` backend, the sheet is streamed into memory on a
+    background thread and the edit journal of an earlier session that did not save is replayed on top of it.
+
+    Args:
+        input_file_path (str): Sheet to review, the master sheet or the sheet of a shard.
+        output_file_path (str): Directory path and prefix for the backup files.
+        backend (str): `excel` or `sqlite`.
+        sqlite_path (str, optional): Database of the `sqlite` backend, by default the input file with a `.sqlite`
+            extension.
+
+    Returns:
+        LoadingStore or SQLiteStore: Storage holding the data to review.
+    """
+    if backend == 'sqlite':
+        database_path = sqlite_path or os.path.splitext(input_file_path)[0] + '.sqlite'
+        if os.path.exists(database_path):
+            return SQLiteStore(database_path)
+        print(f"Importing {input_file_path} into {database_path}.")
+        return SQLiteStore.from_dataframe(load_table(input_file_path), database_path)
+
+    journal_file_path = f"{input_file_path}.journal"
+
+    def build_store(df):
+        """Wraps the loaded sheet in a store and recovers the edits of a session that ended before saving."""
+        journal = EditJournal(journal_file_path)
+        store = DataFrameStore(df, journal, output_file_path, input_file_path, parse_coordinates(df))
+        recovered = journal.replay(df, apply=store.apply)
+        if recovered:
+            print(f"Recovered {recovered} unsaved edits from {journal_file_path}.")
+        return store
+
+    # The sheet is read once, in the background, so the first image is shown before it is fully loaded. Edits
+    # are kept in an overlay instead of a copy of the sheet.
+    return LoadingStore(SheetLoader(input_file_path), build_store)
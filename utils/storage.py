@@ -0,0 +1,442 @@
+import importlib.util
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.image_processing import CHARACTER_COLUMNS, parse_coordinates, row_positions
+
+
+def _check_parquet_engine():
+    """
+    Checks that pandas can read and write Parquet files, which needs an optional package.
+
+    Raises:
+        ImportError: If neither `pyarrow` nor `fastparquet` is installed.
+    """
+    if importlib.util.find_spec("pyarrow") is None and importlib.util.find_spec("fastparquet") is None:
+        raise ImportError("Parquet files need the optional pyarrow package, install it with `pip install pyarrow` "
+                          "or use an .xlsx or .csv file")
+
+
+def load_table(path):
+    """
+    Reads an annotation table from an Excel, Parquet or CSV file, chosen by extension.
+
+    Args:
+        path (str): Path of the file to read.
+
+    Returns:
+        pd.DataFrame: Loaded data, with `serial_number` as strings.
+
+    Raises:
+        ImportError: For a Parquet file, if `pyarrow` is not installed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        _check_parquet_engine()
+        df = pd.read_parquet(path)
+    elif extension == ".csv":
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_excel(path)
+    df['serial_number'] = df['serial_number'].astype(str).replace('nan', '')
+    return df
+
+
+def write_table(df, path):
+    """
+    Writes an annotation table to an Excel, Parquet or CSV file, chosen by extension.
+
+    Args:
+        df (pd.DataFrame): Data to write.
+        path (str): Destination path.
+
+    Raises:
+        ImportError: For a Parquet file, if `pyarrow` is not installed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        _check_parquet_engine()
+        df.to_parquet(path, index=False)
+    elif extension == ".csv":
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+class DataFrameStore:
+    """
+    Storage backed by the sheet held in memory as loaded, with the edits kept in a sparse overlay and recorded
+    in an `EditJournal`.
+
+    The loaded DataFrame is never modified: reads resolve through the overlay, which holds only the rows edited
+    so far, so memory stays close to one copy of the sheet and the edits of the session are listed in
+    O(edits). The overlay is only merged into a full DataFrame when saving or exporting. Saving compacts the
+    journal into the input Excel file.
+    """
+
+    def __init__(self, df, journal, output_file_path, input_file_path, coordinates=None):
+        """
+        Args:
+            df (pd.DataFrame): Data as loaded from the input file, ideally with `serial_number` read as text.
+            journal (EditJournal): Journal receiving every edit.
+            output_file_path (str): Directory path and prefix for the backup file.
+            input_file_path (str): Excel file overwritten on save.
+            coordinates (ndarray, optional): Pre-parsed (N, 11, 2) character positions.
+        """
+        self.df = df
+        self.edits = {}
+        self.journal = journal
+        self.output_file_path = output_file_path
+        self.input_file_path = input_file_path
+        self.coordinates = coordinates if coordinates is not None else parse_coordinates(df)
+
+    def __len__(self):
+        return len(self.df)
+
+    def row(self, index):
+        """Returns the row at position `index` as a Series, with its edits applied."""
+        row = self.df.iloc[index].copy()
+        for column, value in self.edits.get(index, {}).items():
+            row[column] = value
+        if pd.isna(row['serial_number']):
+            row['serial_number'] = ''
+        elif not isinstance(row['serial_number'], str):
+            row['serial_number'] = str(row['serial_number'])
+        return row
+
+    def positions(self, index):
+        """Returns the (11, 2) character positions of the row at position `index`."""
+        return self.coordinates[index]
+
+    def images(self):
+        """Returns the image names of all rows, in order."""
+        return self.df['image'].astype(str).tolist()
+
+    def all_positions(self):
+        """Returns the (N, 11, 2) character positions of all rows."""
+        return self.coordinates
+
+    def apply(self, index, fields):
+        """
+        Sets some fields of a row in the overlay, without recording them, e.g. when replaying the journal.
+
+        Args:
+            index (int): Position of the row.
+            fields (dict): Column values to set.
+        """
+        self.edits.setdefault(int(index), {}).update(fields)
+
+    def update(self, index, **fields):
+        """
+        Sets some fields of a row and records the edit in the journal.
+
+        Args:
+            index (int): Position of the row.
+            **fields: Column values to set, e.g. `serial_number` and `unsure`.
+        """
+        self.apply(index, fields)
+        self.journal.append(index, self.df['image'].iat[index], **fields)
+
+    def update_many(self, indices, **fields):
+        """
+        Sets the same fields on several rows, recorded in the journal with a single write.
+
+        Args:
+            indices (list): Positions of the rows.
+            **fields: Column values to set on every row.
+        """
+        images = self.df['image'].to_numpy()
+        for index in indices:
+            self.apply(index, fields)
+        self.journal.append_many([(index, images[index]) for index in indices], **fields)
+
+    def changes(self):
+        """
+        Returns the edits made since the sheet was loaded, including those replayed from the journal.
+
+        Returns:
+            dict: Edited column values by row position.
+        """
+        return {index: dict(fields) for index, fields in self.edits.items()}
+
+    def find(self, image):
+        """Returns the position of the row of an image, or `None`."""
+        matches = np.flatnonzero(self.df['image'].astype(str).to_numpy() == str(image))
+        return int(matches[0]) if len(matches) else None
+
+    def next_unlabeled(self, start=0):
+        """Returns the position of the first row at or after `start` without an `unsure` value, or `None`."""
+        edited = {index: fields['unsure'] for index, fields in list(self.edits.items()) if 'unsure' in fields}
+        if 'unsure' not in self.df.columns and not edited:
+            return start if start < len(self.df) else None
+        if 'unsure' in self.df.columns:
+            unlabeled = self.df['unsure'].isna().to_numpy()[start:].copy()
+        else:
+            unlabeled = np.ones(max(len(self.df) - start, 0), dtype=bool)
+        for index, value in edited.items():
+            if index >= start:
+                unlabeled[index - start] = pd.isna(value)
+        matches = np.flatnonzero(unlabeled)
+        return start + int(matches[0]) if len(matches) else None
+
+    def to_dataframe(self):
+        """Returns a new DataFrame holding the current data, with the overlay merged into it."""
+        df = self.df.copy()
+        columns = {}
+        for index, fields in list(self.edits.items()):
+            for column, value in fields.items():
+                columns.setdefault(column, {})[index] = value
+        for column, values in columns.items():
+            # Edited columns may need a wider dtype, e.g. NaN in an integer column
+            merged = (df[column] if column in df.columns else pd.Series(np.nan, index=df.index)).astype(object)
+            merged.iloc[list(values)] = list(values.values())
+            df[column] = merged.infer_objects()
+        df['serial_number'] = df['serial_number'].fillna('')
+        return df
+
+    def save(self, wait=False):
+        """
+        Writes the current data to the input file on a background thread.
+
+        Args:
+            wait (bool): Block until the file is written.
+        """
+        self.journal.compact(self.to_dataframe, self.output_file_path, self.input_file_path, wait=wait)
+
+    def close(self):
+        """Waits for the workbook being written, if any, and closes the journal."""
+        self.journal.close()
+
+
+class SQLiteStore:
+    """
+    Storage backed by an SQLite database, so that row lookups and updates are indexed point operations.
+
+    The database runs in WAL mode and every update is committed immediately, so no journal or rewrite of the
+    sheet is needed. Rows are addressed by their position in the original sheet (`idx`), and `image` and
+    `unsure` are indexed for lookups and "next unlabeled" queries.
+    """
+
+    TABLE = "annotations"
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._columns = [column[1] for column in self._connection.execute(f"PRAGMA table_info({self.TABLE})")
+                         if column[1] != "idx"]
+        self._length = None
+
+    @classmethod
+    def from_dataframe(cls, df, path):
+        """
+        Creates (or replaces) a database from a DataFrame.
+
+        Args:
+            df (pd.DataFrame): Data to import, e.g. from `load_table`.
+            path (str): Path of the database file.
+
+        Returns:
+            SQLiteStore: Store opened on the new database.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        connection = sqlite3.connect(path)
+        columns = list(df.columns)
+        definitions = ", ".join(
+            f'"{column}" {"REAL" if pd.api.types.is_numeric_dtype(df[column]) else "TEXT"}' for column in columns)
+        connection.execute(f"CREATE TABLE {cls.TABLE} (idx INTEGER PRIMARY KEY, {definitions})")
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        records = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        connection.executemany(f"INSERT INTO {cls.TABLE} VALUES ({placeholders})",
+                               ((index,) + record for index, record in enumerate(records)))
+        connection.execute(f"CREATE INDEX {cls.TABLE}_image ON {cls.TABLE} (image)")
+        if 'unsure' in columns:
+            connection.execute(f"CREATE INDEX {cls.TABLE}_unsure ON {cls.TABLE} (unsure, idx)")
+        connection.commit()
+        connection.close()
+        return cls(path)
+
+    def _query(self, sql, parameters=()):
+        """Runs a read query under the connection lock and returns all rows."""
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def __len__(self):
+        if self._length is None:
+            self._length = self._query(f"SELECT COUNT(*) FROM {self.TABLE}")[0][0]
+        return self._length
+
+    def row(self, index):
+        """Returns the row at position `index` as a Series."""
+        quoted = ", ".join(f'"{column}"' for column in self._columns)
+        values = self._query(f"SELECT {quoted} FROM {self.TABLE} WHERE idx = ?", (int(index),))
+        if not values:
+            raise IndexError(index)
+        row = pd.Series(values[0], index=self._columns, name=index)
+        row['serial_number'] = '' if row['serial_number'] is None else str(row['serial_number'])
+        if 'unsure' in row.index and row['unsure'] is None:
+            row['unsure'] = np.nan
+        return row
+
+    def positions(self, index):
+        """Returns the (11, 2) character positions of the row at position `index`."""
+        return row_positions(self.row(index)).astype(np.float32)
+
+    def images(self):
+        """Returns the image names of all rows, in order."""
+        return [str(value[0]) for value in self._query(f"SELECT image FROM {self.TABLE} ORDER BY idx")]
+
+    def all_positions(self):
+        """Returns the (N, 11, 2) character positions of all rows."""
+        columns = [column for column in CHARACTER_COLUMNS if column in self._columns]
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        return parse_coordinates(pd.DataFrame(self._query(f"SELECT {quoted} FROM {self.TABLE} ORDER BY idx"),
+                                              columns=columns))
+
+    def update(self, index, **fields):
+        """
+        Sets some fields of a row and commits immediately.
+
+        Args:
+            index (int): Position of the row.
+            **fields: Column values to set, e.g. `serial_number` and `unsure`.
+        """
+        self.update_many([index], **fields)
+
+    def update_many(self, indices, **fields):
+        """
+        Sets the same fields on several rows in a single transaction.
+
+        Args:
+            indices (list): Positions of the rows.
+            **fields: Column values to set on every row.
+        """
+        for column in fields:
+            if column not in self._columns:
+                with self._lock:
+                    self._connection.execute(f'ALTER TABLE {self.TABLE} ADD COLUMN "{column}"')
+                self._columns.append(column)
+        assignments = ", ".join(f'"{column}" = ?' for column in fields)
+        values = [value.item() if hasattr(value, "item") else value for value in fields.values()]
+        with self._lock:
+            self._connection.executemany(f"UPDATE {self.TABLE} SET {assignments} WHERE idx = ?",
+                                         [values + [int(index)] for index in indices])
+            self._connection.commit()
+
+    def find(self, image):
+        """Returns the position of the row of an image, or `None`."""
+        values = self._query(f"SELECT idx FROM {self.TABLE} WHERE image = ? ORDER BY idx LIMIT 1", (str(image),))
+        return values[0][0] if values else None
+
+    def next_unlabeled(self, start=0):
+        """Returns the position of the first row at or after `start` without an `unsure` value, or `None`."""
+        if 'unsure' not in self._columns:
+            return start if start < len(self) else None
+        values = self._query(f"SELECT idx FROM {self.TABLE} WHERE unsure IS NULL AND idx >= ? ORDER BY idx LIMIT 1",
+                             (int(start),))
+        return values[0][0] if values else None
+
+    def to_dataframe(self):
+        """Returns the whole table as a DataFrame, in the order of the original sheet."""
+        with self._lock:
+            df = pd.read_sql_query(f"SELECT * FROM {self.TABLE} ORDER BY idx", self._connection)
+        df = df.drop(columns="idx")
+        df['serial_number'] = df['serial_number'].astype(str).replace('None', '')
+        return df
+
+    def save(self, wait=False):
+        """
+        Checkpoints the write-ahead log into the database file. Updates are already committed.
+
+        Args:
+            wait (bool): Unused, saving is synchronous and cheap.
+        """
+        with self._lock:
+            self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        """Checkpoints and closes the database."""
+        self.save()
+        self._connection.close()
+
+
+class OrderedStore:
+    """
+    View of another store presenting its rows in a different order, e.g. by confidence of the pre-labeler.
+
+    Positions passed to and returned by the view are positions in the review order; edits and saves go to the
+    underlying store, which keeps the order of the sheet.
+    """
+
+    def __init__(self, store, order):
+        """
+        Args:
+            store (DataFrameStore or SQLiteStore): Underlying store.
+            order (list): Position in `store` of each row of the view, in review order.
+        """
+        self.store = store
+        self.order = np.asarray(order, dtype=np.int64)
+        self._positions = {int(index): position for position, index in enumerate(self.order)}
+
+    def __len__(self):
+        return len(self.order)
+
+    def row(self, index):
+        """Returns the row at position `index` of the review order as a Series."""
+        return self.store.row(int(self.order[index]))
+
+    def positions(self, index):
+        """Returns the (11, 2) character positions of the row at position `index`."""
+        return self.store.positions(int(self.order[index]))
+
+    def images(self):
+        """Returns the image names of all rows, in review order."""
+        images = self.store.images()
+        return [images[index] for index in self.order]
+
+    def all_positions(self):
+        """Returns the (N, 11, 2) character positions of all rows, in review order."""
+        return self.store.all_positions()[self.order]
+
+    def update(self, index, **fields):
+        """Sets some fields of the row at position `index`, see the `update` of the underlying store."""
+        self.store.update(int(self.order[index]), **fields)
+
+    def update_many(self, indices, **fields):
+        """Sets the same fields on the rows at several positions, see `update_many` of the underlying store."""
+        self.store.update_many([int(self.order[index]) for index in indices], **fields)
+
+    def find(self, image):
+        """Returns the position in review order of the row of an image, or `None`."""
+        index = self.store.find(image)
+        return None if index is None else self._positions.get(int(index))
+
+    def next_unlabeled(self, start=0):
+        """Returns the first position at or after `start` whose row has no `unsure` value, or `None`."""
+        for position in range(start, len(self.order)):
+            if pd.isna(self.row(position).get('unsure', np.nan)):
+                return position
+        return None
+
+    def to_dataframe(self):
+        """Returns the current data as a DataFrame, in the order of the sheet."""
+        return self.store.to_dataframe()
+
+    def save(self, wait=False):
+        """Saves the underlying store."""
+        self.store.save(wait=wait)
+
+    def close(self):
+        """Closes the underlying store."""
+        self.store.close()
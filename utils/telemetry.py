@@ -0,0 +1,199 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+_HISTOGRAM_WIDTH = 30
+
+
+class Telemetry:
+    """
+    Records how long each stage of the review loop takes and how fast the reviewer labels images.
+
+    Spans and events are appended to a JSONL log as they happen, one JSON object per line, so a session that
+    crashes still leaves its measurements behind. A disabled instance records nothing and costs one branch
+    per span.
+    """
+
+    def __init__(self, log_path=None, enabled=True):
+        """
+        Args:
+            log_path (str, optional): JSONL file receiving the spans and events, appended to.
+            enabled (bool): Record anything at all.
+        """
+        self.enabled = enabled
+        self.durations = {}
+        self.decisions = Counter()
+        self.dwell_times = []
+        self._shown_at = None
+        self._started_at = time.time()
+        self.first_image_s = None
+        self._lock = threading.Lock()
+        self._log = None
+        if enabled and log_path:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._log = open(log_path, "a", buffering=1)
+            self._write({'type': 'session', 'event': 'start', 'time': self._started_at})
+
+    def _write(self, record):
+        """Appends one record to the log."""
+        if self._log is not None:
+            with self._lock:
+                self._log.write(json.dumps(record) + "\n")
+
+    @contextlib.contextmanager
+    def _measure(self, stage, fields):
+        """Times the block of a `span` and records it."""
+        start, counter = time.time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - counter
+            with self._lock:
+                self.durations.setdefault(stage, []).append(duration)
+            self._write({'type': 'span', 'stage': stage, 'start': start, 'duration_ms': duration * 1000,
+                         'thread': threading.current_thread().name, **fields})
+
+    def span(self, stage, **fields):
+        """
+        Measures the block run inside the returned context manager.
+
+        Args:
+            stage (str): Name of the stage, e.g. `decode` or `photoimage`.
+            **fields: Extra values logged with the span, e.g. `index`.
+
+        Returns:
+            context manager: Records the duration of the block when it exits.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._measure(stage, fields)
+
+    def image_shown(self, index):
+        """
+        Marks the moment an image is displayed, from which the reviewer's time on it is counted.
+
+        Args:
+            index (int): Position of the displayed row.
+        """
+        if not self.enabled:
+            return
+        self._shown_at = (index, time.perf_counter())
+        if self.first_image_s is None:
+            # Time to first image, what the reviewer waits for at startup
+            self.first_image_s = time.time() - self._started_at
+            self._write({'type': 'first_image', 'index': int(index), 'time': time.time(),
+                         'seconds': self.first_image_s})
+
+    def decision(self, index, label):
+        """
+        Records a reviewer decision and the time spent on the image since it was displayed.
+
+        Args:
+            index (int): Position of the labeled row.
+            label (str): `sure` or `unsure`.
+        """
+        if not self.enabled:
+            return
+        dwell = None
+        if self._shown_at is not None and self._shown_at[0] == index:
+            dwell = time.perf_counter() - self._shown_at[1]
+            self.dwell_times.append(dwell)
+        self.decisions[label] += 1
+        self._write({'type': 'decision', 'index': int(index), 'label': label, 'time': time.time(),
+                     'dwell_s': dwell})
+
+    def summary(self, skips=None):
+        """
+        Summarizes the session.
+
+        Args:
+            skips (Counter, optional): Number of skipped rows by reason, see `Manifest.skip_summary`.
+
+        Returns:
+            dict: Latency percentiles and histogram counts per stage, and the reviewer throughput.
+        """
+        stages = {}
+        for stage, durations in self.durations.items():
+            values = np.asarray(durations) * 1000
+            stages[stage] = {
+                'count': len(values),
+                'mean_ms': float(values.mean()),
+                'p50_ms': float(np.percentile(values, 50)),
+                'p90_ms': float(np.percentile(values, 90)),
+                'p99_ms': float(np.percentile(values, 99)),
+                'max_ms': float(values.max()),
+                'histogram': np.bincount(np.searchsorted(HISTOGRAM_BOUNDS_MS, values),
+                                         minlength=len(HISTOGRAM_BOUNDS_MS) + 1).tolist(),
+            }
+        labeled = sum(self.decisions.values())
+        elapsed = time.time() - self._started_at
+        throughput = {
+            'session_s': elapsed,
+            'first_image_s': self.first_image_s,
+            'labeled': labeled,
+            'sure': self.decisions['sure'],
+            'unsure': self.decisions['unsure'],
+            'unsure_ratio': self.decisions['unsure'] / labeled if labeled else None,
+            'seconds_per_image': elapsed / labeled if labeled else None,
+            'median_dwell_s': float(np.median(self.dwell_times)) if self.dwell_times else None,
+            'skipped': dict(skips or {}),
+        }
+        return {'stages': stages, 'throughput': throughput}
+
+    def report(self, skips=None):
+        """
+        Prints the latency histograms of every stage and the reviewer throughput, and logs the summary.
+
+        Args:
+            skips (Counter, optional): Number of skipped rows by reason, see `Manifest.skip_summary`.
+        """
+        if not self.enabled:
+            return
+        summary = self.summary(skips)
+        self._write({'type': 'summary', 'time': time.time(), **summary})
+
+        labels = [f"<{bound}ms" for bound in HISTOGRAM_BOUNDS_MS] + [f">={HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        # Stages that cost the most time in total come first
+        ranked = sorted(summary['stages'].items(), key=lambda item: -item[1]['mean_ms'] * item[1]['count'])
+        for stage, stats in ranked:
+            print(f"{stage}: {stats['count']} calls, p50 {stats['p50_ms']:.1f} ms, p90 {stats['p90_ms']:.1f} ms, "
+                  f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+            peak = max(stats['histogram'])
+            for label, count in zip(labels, stats['histogram']):
+                if count:
+                    print(f"  {label:>9} {'#' * max(1, round(_HISTOGRAM_WIDTH * count / peak))} {count}")
+
+        throughput = summary['throughput']
+        if throughput['first_image_s'] is not None:
+            print(f"First image shown after {throughput['first_image_s']:.2f} s.")
+        if throughput['labeled']:
+            print(f"Labeled {throughput['labeled']} images in {throughput['session_s']:.0f} s "
+                  f"({throughput['seconds_per_image']:.1f} s per image, "
+                  f"median {throughput['median_dwell_s'] or 0:.1f} s on screen), "
+                  f"{throughput['sure']} sure and {throughput['unsure']} unsure "
+                  f"({throughput['unsure_ratio']:.0%} unsure).")
+        else:
+            print(f"No image labeled in {throughput['session_s']:.0f} s.")
+        if throughput['skipped']:
+            print("Skipped: " + ", ".join(f"{count} {reason}" for reason, count in throughput['skipped'].items()))
+
+    def close(self):
+        """Closes the log file."""
+        if self._log is not None:
+            self._write({'type': 'session', 'event': 'end', 'time': time.time()})
+            with self._lock:
+                self._log.close()
+                self._log = None
+
+
+# Shared instance used when no telemetry is configured
+DISABLED = Telemetry(enabled=False)
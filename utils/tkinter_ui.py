@@ -1,27 +1,124 @@
-import os
-import cv2
-from tkinter import Tk, Label, Button, Entry, StringVar, Frame
-from PIL import Image, ImageTk
+from tkinter import Tk, Label, Button, Entry, StringVar, BooleanVar, Checkbutton, Frame
 
-from utils.image_processing import rotate_image, calculate_window
-from utils.file_handling import save_data
+from utils.disk_cache import RenderCache
+from utils.filters import DEFAULT_FILTERS
+from utils.manifest import Manifest, DISPLAYABLE
+from utils.prefetch import FramePrefetcher, render_frame
+from utils.telemetry import Telemetry
 import numpy as np
+import pandas as pd
 
-from utils.ui_helpers import get_rotate_parameters, get_rotated_positions_and_check_all_inside, get_images, \
-    overlay_characters, convert_image_to_tkinter, update_labels, draw_filtered_images
+from utils.ui_helpers import update_labels, DisplaySurface
 
 
-def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_path):
+def initialize_ui(store, images_dir, config=None, proposals=None, duplicates=None):
     """
     Initializes the graphical user interface for image review and editing.
 
     Args:
-        corrected_df (pd.DataFrame): DataFrame containing corrected data entries.
-        df (pd.DataFrame): Original DataFrame.
+        store (LoadingStore, DataFrameStore, SQLiteStore or OrderedStore): Storage holding the data entries,
+            receiving every edit. A `LoadingStore` still reading its sheet shows its first row right away, and the
+            navigation and the edits are enabled once the sheet is loaded.
         images_dir (str): Directory containing the images.
-        output_file_path (str): Path for saving the output file.
-        input_file_path (str): Path to the input file.
+        config (dict): Parsed `config.yaml`, used for the window, cropping, prefetch, render cache, manifest,
+            filter, telemetry and pre-labeling settings.
+        proposals (dict, optional): Serial numbers proposed by `prelabel.py`, with their confidence, by image.
+        duplicates (dict, optional): Images of the cluster of near-duplicates found by `duplicates.py`, by image.
     """
+    config = config or {}
+    proposals = proposals or {}
+    duplicates = duplicates or {}
+    confirm_threshold = (config.get('prelabel') or {}).get('confirm_threshold', 0.95)
+    telemetry_config = config.get('telemetry') or {}
+    telemetry = Telemetry(telemetry_config.get('log_file'), enabled=telemetry_config.get('enabled', False))
+    manifest_config = config.get('manifest') or {}
+    cropping_config = config.get('cropping') or {}
+    h_pad = cropping_config.get('horizontal_padding', 30)
+    v_pad = cropping_config.get('vertical_padding', 40)
+    prefetch_config = config.get('prefetch') or {}
+    gui_config = config.get('gui') or {}
+    # Rapid mode: fixed image sizes, so the window is laid out once, and keyboard shortcuts for every action
+    rapid_mode = gui_config.get('rapid_mode', False)
+    viewport_width = gui_config.get('viewport_width', 1200)
+    cache_config = config.get('render_cache') or {}
+    filters = config.get('filters') or DEFAULT_FILTERS
+    render_cache = None
+    if cache_config.get('enabled', False):
+        render_cache = RenderCache(cache_config.get('directory', './data/.render_cache/'),
+                                   cache_config.get('max_bytes', 512 * 1024 ** 2))
+    # Both need the whole sheet, they are created by `start_review` once the store is loaded
+    manifest = None
+    prefetcher = None
+    # Position of every image, built the first time a decision is applied to near-duplicates
+    positions_by_image = None
+
+    def start_review():
+        """Starts probing every row and rendering the rows ahead, once the whole sheet is loaded."""
+        nonlocal manifest, prefetcher
+        manifest = Manifest(store, images_dir, workers=manifest_config.get('workers', 8))
+        manifest.start(on_complete=Manifest.report)
+        prefetcher = FramePrefetcher(store, images_dir, h_pad=h_pad, v_pad=v_pad,
+                                     ahead=prefetch_config.get('ahead', 5),
+                                     behind=prefetch_config.get('behind', 1),
+                                     max_frames=prefetch_config.get('max_frames', 16),
+                                     workers=prefetch_config.get('workers', 2),
+                                     cache=render_cache,
+                                     filters=filters,
+                                     telemetry=telemetry)
+        total_label.config(text=f"/{len(store)}")
+        for button in review_buttons:
+            button.config(state="normal")
+
+    def show_first_parsed():
+        """
+        Displays the first readable row while the sheet is still being read, rendering it on the Tk thread
+        since the prefetcher does not exist yet.
+
+        Returns:
+            bool: `False` if the sheet finished loading before a readable row was found.
+        """
+        nonlocal current_index
+        index = 0
+        while not store.ready:
+            try:
+                row = store.row(index)
+            except IndexError:
+                return False
+            try:
+                with telemetry.span("first_image", index=index):
+                    frame = render_frame(index, row, images_dir, h_pad, v_pad, positions=store.positions(index),
+                                         cache=render_cache, telemetry=telemetry)
+            except Exception as error:
+                # The manifest does not exist yet, the row is recorded as failed when `show_image` reaches it
+                print(f"Could not render row {index + 1}: {error!r}")
+                frame = None
+            if frame is not None:
+                current_index = index
+                update_image_display(index, frame)
+                return True
+            index += 1
+        return False
+
+    def wait_for_sheet():
+        """Polls the loading of the sheet, then enables the navigation and the edits."""
+        if not store.ready:
+            root.after(50, wait_for_sheet)
+            return
+        try:
+            store.wait()
+        except Exception as error:
+            print(f"Could not load the sheet: {error}")
+            root.quit()
+            root.destroy()
+            return
+        start_review()
+        # Show the row again through the prefetcher, with the edits recovered from the journal
+        if not show_image(current_index):
+            print("No displayable image in the dataset")
+            manifest.report()
+            prefetcher.shutdown()
+            root.quit()
+            root.destroy()
 
     def go_to_index():
         """
@@ -30,71 +127,97 @@ def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_pat
         """
         try:
             new_index = int(index_entry.get()) - 1
-            if 0 <= new_index < len(corrected_df):
-                nonlocal current_index
-                current_index = new_index
-                update_image_display(current_index)
+            if 0 <= new_index < len(store):
+                if not show_image(new_index):
+                    print("No displayable image from this index")
             else:
                 print("Index out of range")
         except ValueError:
             print("Invalid index entered")
 
-    def update_image_display(index):
+    def show_image(index, step=1):
+        """
+        Displays the first displayable image starting at `index`, skipping the rows listed as not displayable
+        in the manifest.
+
+        Args:
+            index (int): Index of the first image to try.
+            step (int): `1` to look for the next displayable image, `-1` for the previous one.
+
+        Returns:
+            bool: `False` if there is no displayable image in that direction.
+        """
+        nonlocal current_index
+        while True:
+            index = manifest.find_displayable(index, step)
+            if index is None:
+                return False
+            # Decoding, rotation, overlay and resizing happen on the prefetch workers
+            try:
+                with telemetry.span("frame_wait", index=index):
+                    frame = prefetcher.get(index)
+            except Exception as error:
+                print(f"Could not render row {index + 1}: {error!r}")
+                manifest.mark_failed(index, error)
+            else:
+                if frame is not None:
+                    break
+                manifest.mark_failed(index)
+            index += step
+        current_index = index
+        update_image_display(index, frame)
+        return True
+
+    def update_image_display(index, frame):
         """
         Updates the image display and associated information based on the specified index.
 
         Args:
             index (int): Index of the image to display.
+            frame (Frame): Rendered images of the row.
         """
-        row = corrected_df.iloc[index]
+        row = store.row(index)
         index_entry.delete(0, "end")
         index_entry.insert(0, str(index + 1))
 
-        image_path = os.path.join(images_dir, str(row['image']))
-        image = cv2.imread(image_path)
-        if image is None:
-            next_image()
-            return
-
-        window_data = calculate_window(row, 30, 40, image.shape)
-        if window_data is None:
-            next_image()
-            return
-
-        x_min, y_min, x_max, y_max, angle, center, rotated_image = get_rotate_parameters(window_data, image)
-
-        rotated_positions, all_inside = get_rotated_positions_and_check_all_inside(row, center, angle, x_min, y_min,
-                                                                                   x_max, y_max)
-
-        character_image, cropped_image, target_height, target_width, font_scale = get_images(rotated_image, all_inside,
-                                                                                             x_min, y_min, x_max, y_max)
-
-        # Overlay the characters on the character image
-        overlay_characters(character_image, rotated_positions, row, all_inside, font_scale, x_min, y_min)
-
-        tk_cropped_image = convert_image_to_tkinter(cropped_image, cropped_image.shape[0] * 2,
-                                                    cropped_image.shape[1] * 2)
-        tk_character_image = convert_image_to_tkinter(character_image, target_height, target_width)
-
-        update_labels(row, unsure_text_var, character_image_label, tk_character_image, cropped_image_label,
-                      tk_cropped_image, serial_var, file_name_var, progress_var, unsure_var, current_index,
-                      corrected_df)
+        with telemetry.span("photoimage", index=index):
+            cropped_surface.show(frame.cropped_display)
+            character_surface.show(frame.character_display)
+        displayed_images.clear()
+        displayed_images.update(frame=frame)
+
+        with telemetry.span("labels", index=index):
+            update_labels(row, unsure_text_var, character_image_label, character_surface.photo, cropped_image_label,
+                          cropped_surface.photo, serial_var, file_name_var, progress_var, unsure_var, index, store)
+            cluster = duplicates.get(str(row['image']), ())
+            duplicates_var.set(f"Apply to the {len(cluster) - 1} near-duplicates" if cluster else "No near-duplicates")
+            duplicates_check.config(state="normal" if cluster else "disabled")
+            proposal = proposals.get(str(row['image']))
+            if proposal is None:
+                proposal_var.set("")
+            else:
+                proposal_var.set(f"Proposed: {proposal[0]} ({proposal[1]:.0%})")
+                if not serial_var.get() or serial_var.get() == 'nan':
+                    serial_var.set(proposal[0])
 
-        resize_window(tk_cropped_image, tk_character_image, root)
+        if not rapid_mode:
+            with telemetry.span("layout", index=index):
+                resize_window(frame.cropped_display, frame.character_display, root)
+        telemetry.image_shown(index)
 
         return
 
-    def resize_window(image_pil, character_image_pil, root):
+    def resize_window(cropped_display, character_display, root):
         """
         Resizes the application window based on the current image dimensions.
 
         Args:
-            image_pil (ImageTk.PhotoImage): PIL image of the cropped image.
-            character_image_pil (ImageTk.PhotoImage): PIL image of the character overlay.
+            cropped_display (ndarray): Displayed cropped image.
+            character_display (ndarray): Displayed character overlay.
             root (Tk): Root Tkinter window.
         """
-        total_height = image_pil.height() + character_image_pil.height() + 125
-        total_width = int(character_image_pil.width() * 1.35)
+        total_height = cropped_display.shape[0] + character_display.shape[0] + 125
+        total_width = int(character_display.shape[1] * 1.35)
         root.geometry(f"{total_width}x{total_height}")  # Add some extra height for buttons
         center_window()  # Center the window after updating the display
 
@@ -110,44 +233,185 @@ def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_pat
         root.geometry(f"{window_width}x{window_height}+{x_cordinate}+{y_cordinate}")
 
     def on_serial_change(*args):
-        """Enables or disables the sure/unsure buttons based on serial number length."""
-        sure_button.config(state="normal" if len(serial_var.get()) == 11 else "disabled")
-        unsure_button.config(state="normal" if len(serial_var.get()) == 11 else "disabled")
+        """
+        Enables or disables the sure/unsure buttons based on serial number length. They stay disabled until the
+        whole sheet is loaded.
+        """
+        state = "normal" if len(serial_var.get()) == 11 and prefetcher is not None else "disabled"
+        sure_button.config(state=state)
+        unsure_button.config(state=state)
 
-    def next_image():
+    def next_image(**fields):
         """
         Advances to the next image, saving any edits made to the serial number field.
         Ends the program if the last image is reached.
+
+        Args:
+            **fields: Other column values to store for the current image, e.g. `unsure`.
         """
-        nonlocal current_index
-        corrected_df.at[current_index, 'serial_number'] = serial_var.get()
-        current_index += 1
-        if current_index < len(corrected_df):
-            update_image_display(current_index)
-        else:
-            save_data(corrected_df, df, output_file_path, input_file_path)
+        if store.row(current_index)['serial_number'] != serial_var.get():
+            # The overlay of this row shows the old serial number
+            prefetcher.invalidate(current_index)
+        store.update(current_index, serial_number=serial_var.get(), **fields)
+        propagated = set()
+        if 'unsure' in fields:
+            telemetry.decision(current_index, "unsure" if fields['unsure'] else "sure")
+            if propagate_var.get():
+                propagated = apply_to_duplicates(serial_number=serial_var.get(), **fields)
+        next_index = current_index + 1
+        while next_index in propagated:
+            next_index += 1
+        if not show_image(next_index):
+            manifest.report()
+            prefetcher.shutdown()
+            # The process waits for the write at exit anyway, so only wait here when it is being measured
+            with telemetry.span("save"):
+                store.save(wait=telemetry.enabled)
             root.quit()
             root.destroy()
 
+    def apply_to_duplicates(**fields):
+        """
+        Applies the decision on the current image to the other images of its cluster of near-duplicates.
+
+        Args:
+            **fields: Column values to store, `serial_number` and `unsure`.
+
+        Returns:
+            set: Positions of the updated rows.
+        """
+        nonlocal positions_by_image
+        if positions_by_image is None:
+            positions_by_image = {str(image): index for index, image in enumerate(store.images())}
+        updated = set()
+        for image in duplicates.get(str(store.row(current_index)['image']), ()):
+            index = positions_by_image.get(image)
+            if index is None or index == current_index:
+                continue
+            if store.row(index)['serial_number'] != fields['serial_number']:
+                prefetcher.invalidate(index)
+            store.update(index, **fields)
+            updated.add(index)
+        return updated
+
     def on_sure():
         """Marks the current image as 'Sure' and moves to the next image."""
-        corrected_df.at[current_index, 'unsure'] = float(0)
-        next_image()
+        next_image(unsure=float(0))
+
+    def show_filtered(filtered):
+        """
+        Switches the current image between its filtered and unfiltered variants.
+
+        Args:
+            filtered (bool): Show the filtered variant.
+        """
+        frame = displayed_images['frame']
+        if filtered:
+            # Rendered the first time the view is opened for this frame, then kept by the prefetcher
+            displays = prefetcher.filtered(frame) if prefetcher is not None else None
+            if displays is None:
+                return
+        else:
+            displays = frame.cropped_display, frame.character_display
+        cropped_surface.show(displays[0])
+        character_surface.show(displays[1])
+        displayed_images['showing_filtered'] = filtered
+
+    def toggle_filters(event=None):
+        """Switches between the filtered and unfiltered variants of the current image."""
+        show_filtered(not displayed_images.get('showing_filtered', False))
 
     def on_unsure():
         """Toggles the unsure status for the current image and updates UI accordingly."""
         if unsure_var.get() == "Unsure":
             unsure_var.set("Still Unsure")
-            draw_filtered_images(cropped_image_label, character_image_label)
+            show_filtered(True)
         else:
-            corrected_df.at[current_index, 'unsure'] = float(1)
-            next_image()
+            next_image(unsure=float(1))
+
+    def on_save():
+        """Writes the current data in the background, without leaving the application."""
+        with telemetry.span("save"):
+            store.save()
 
     def on_quit():
         """Saves the current data and exits the application."""
-        save_data(df, corrected_df, output_file_path, input_file_path)
+        if prefetcher is not None:
+            prefetcher.shutdown()
+        with telemetry.span("save"):
+            store.save(wait=telemetry.enabled)
         root.destroy()
 
+    def go_to_next_unlabeled():
+        """Navigates to the first image after the current one that has not been labeled yet."""
+        new_index = store.next_unlabeled(current_index + 1)
+        while new_index is not None and manifest.reason(new_index) != DISPLAYABLE:
+            new_index = store.next_unlabeled(new_index + 1)
+        if new_index is None or not show_image(new_index):
+            print("No unlabeled image after the current one")
+
+    def confirm_confident():
+        """
+        Marks as sure every unlabeled row whose proposal reaches the confirmation threshold and agrees with its
+        serial number (or fills an empty serial number), then moves to the next unlabeled image.
+        """
+        confirmed = 0
+        for index, image in enumerate(store.images()):
+            proposal = proposals.get(image)
+            if proposal is None or proposal[1] < confirm_threshold:
+                continue
+            row = store.row(index)
+            if not pd.isna(row.get('unsure', np.nan)) or row['serial_number'] not in (proposal[0], '', 'nan'):
+                continue
+            if row['serial_number'] != proposal[0]:
+                prefetcher.invalidate(index)
+            store.update(index, serial_number=proposal[0], unsure=float(0))
+            telemetry.decision(index, "sure")
+            confirmed += 1
+        print(f"Confirmed {confirmed} rows with a proposal of at least {confirm_threshold:.0%} confidence.")
+        if pd.isna(store.row(current_index).get('unsure', np.nan)):
+            show_image(current_index)
+        else:
+            go_to_next_unlabeled()
+
+    def typing():
+        """Whether the keyboard focus is in one of the entries, whose keys are then left to the entry."""
+        return root.focus_get() in (serial_entry, index_entry)
+
+    def on_key_sure(event=None):
+        """Marks the current image as 'Sure' from the keyboard, also when leaving the serial number entry."""
+        if root.focus_get() is index_entry:
+            root.focus_set()
+            go_to_index()
+        elif str(sure_button.cget("state")) == "normal":
+            # The focus moves first, since deciding on the last image destroys the window
+            root.focus_set()
+            on_sure()
+        return "break"
+
+    def on_key_unsure(event=None):
+        """Same as the 'Unsure' button, from the keyboard."""
+        if not typing() and str(unsure_button.cget("state")) == "normal":
+            on_unsure()
+
+    def on_key_step(step):
+        """Shows the next (`1`) or previous (`-1`) displayable image without labeling the current one."""
+        if not typing() and prefetcher is not None and 0 <= current_index + step < len(store):
+            show_image(current_index + step, step=step)
+
+    def on_key_duplicates(event=None):
+        """Switches whether the decisions also apply to the near-duplicates, from the keyboard."""
+        if not typing() and str(duplicates_check.cget("state")) == "normal":
+            duplicates_check.toggle()
+
+    def on_key_edit(event=None):
+        """Moves the keyboard focus to the serial number, selected so that typing replaces it."""
+        if not typing():
+            serial_entry.focus_set()
+            serial_entry.select_range(0, "end")
+            serial_entry.icursor("end")
+            return "break"
+
     def update_colour(*args):
         """Changes the color of the unsure label based on its text content."""
         text = unsure_text_var.get()
@@ -178,8 +442,15 @@ def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_pat
     character_image_label = Label(image_frame)
     character_image_label.grid(row=10, column=10, padx=10, pady=10)  # Character label in first column, second row
 
+    # Each label keeps one Tk image, updated in place for every frame, and of a fixed size in rapid mode
+    cropped_surface = DisplaySurface(
+        cropped_image_label, (viewport_width, gui_config.get('crop_height', 200)) if rapid_mode else None)
+    character_surface = DisplaySurface(
+        character_image_label, (viewport_width, gui_config.get('overlay_height', 400)) if rapid_mode else None)
+
     # Define global variables
     current_index = 0
+    displayed_images = {}
 
     serial_var = StringVar()  # StringVar to track the serial number in Entry
     file_name_var = StringVar()
@@ -189,7 +460,8 @@ def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_pat
     unsure_text_var = StringVar()
     unsure_text_var.trace_add("write", update_colour)
 
-    unsure_label = Label(title_frame, textvariable=unsure_text_var)
+    # A fixed width keeps the label from resizing the window when its text changes
+    unsure_label = Label(title_frame, textvariable=unsure_text_var, width=60 if rapid_mode else 0)
     unsure_label.grid(row=5, column=10, padx=10, pady=10)
 
     buttons_frame = Frame(image_and_buttons_frame)
@@ -205,13 +477,17 @@ def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_pat
     index_entry.pack(side="left")
 
     # Label showing the total number of files
-    total_label = Label(navigation_frame, text=f"/{len(corrected_df)}")
+    total_label = Label(navigation_frame, text=f"/{len(store)}" if getattr(store, 'ready', True) else "/...")
     total_label.pack(side="left")
 
     # Button to navigate to the specified index
     go_button = Button(navigation_frame, text="Go", command=go_to_index)
     go_button.pack(side="left")
 
+    # Button to jump to the next image without a sure/unsure label
+    next_unlabeled_button = Button(navigation_frame, text="Next Unlabeled", command=go_to_next_unlabeled)
+    next_unlabeled_button.pack(side="left")
+
     # Entry for serial number editing
     serial_entry = Entry(buttons_frame, textvariable=serial_var)
     serial_entry.grid(row=20, column=10, padx=10, pady=10)  # Place in the right column
@@ -226,14 +502,78 @@ def initialize_ui(corrected_df, df, images_dir, output_file_path, input_file_pat
     unsure_button = Button(sure_unsure_frame, textvariable=unsure_var, command=on_unsure,
                            state="disabled")  # Initially disabled
     unsure_button.grid(row=30, column=11, padx=10, pady=10)  # Edit button in the right column
+    save_button = Button(buttons_frame, text="Save", command=on_save)
+    save_button.grid(row=35, column=10, padx=10, pady=10)  # Save button in the right column
     quit_button = Button(buttons_frame, text="Save and Exit", command=on_quit)
     quit_button.grid(row=40, column=10, padx=10, pady=10)  # Quit button in the right column
 
+    # Serial number proposed by the pre-labeler, and bulk confirmation of the confident proposals
+    proposal_var = StringVar()
+    if proposals:
+        proposal_label = Label(buttons_frame, textvariable=proposal_var)
+        proposal_label.grid(row=25, column=10, padx=10, pady=10)
+        confirm_button = Button(buttons_frame, text=f"Confirm Proposals >= {confirm_threshold:.0%}",
+                                command=confirm_confident)
+        confirm_button.grid(row=32, column=10, padx=10, pady=10)
+
+    # Applies the sure/unsure decisions to every near-duplicate of the image as well
+    propagate_var = BooleanVar(value=False)
+    duplicates_var = StringVar()
+    duplicates_check = Checkbutton(buttons_frame, textvariable=duplicates_var, variable=propagate_var,
+                                   state="disabled")
+    if duplicates:
+        duplicates_check.grid(row=33, column=10, padx=10, pady=10)
+
+    # Ctrl+F switches between the filtered and unfiltered views
+    root.bind("<Control-f>", toggle_filters)
+
+    if rapid_mode:
+        # The window binding runs after the entry ones, the handlers ignore the keys typed in an entry
+        root.bind("<Return>", on_key_sure)
+        root.bind("<KP_Enter>", on_key_sure)
+        for key in ("u", "U"):
+            root.bind(key, on_key_unsure)
+        for key in ("<Right>", "n", "N"):
+            root.bind(key, lambda event: on_key_step(1))
+        for key in ("<Left>", "p", "P"):
+            root.bind(key, lambda event: on_key_step(-1))
+        for key in ("e", "E", "<F2>"):
+            root.bind(key, on_key_edit)
+        for key in ("a", "A"):
+            root.bind(key, on_key_duplicates)
+        root.bind("<Escape>", lambda event: root.focus_set())
+        shortcuts_label = Label(buttons_frame, justify="left",
+                                text="Enter: Sure    U: Unsure\n\u2190/P: Previous    \u2192/N: Next\n"
+                                     "E: Edit serial    Esc: Leave the field"
+                                     + ("\nA: Apply to near-duplicates" if duplicates else ""))
+        shortcuts_label.grid(row=45, column=10, padx=10, pady=10)
+
     # Set up trace for real-time validation of serial number length
     serial_var.trace_add("write", on_serial_change)
 
-    # Initialize display with the first image and serial number
-    update_image_display(current_index)
+    # Navigation and saving need the whole sheet
+    review_buttons = [go_button, next_unlabeled_button, save_button] + ([confirm_button] if proposals else [])
+
+    if getattr(store, 'ready', True):
+        start_review()
+        # Initialize display with the first image and serial number
+        if not show_image(current_index):
+            print("No displayable image in the dataset")
+            manifest.report()
+            prefetcher.shutdown()
+            root.destroy()
+            telemetry.close()
+            return
+    else:
+        # The sheet is still being read: show its first row now, the rest of the review starts once it is loaded
+        for button in review_buttons:
+            button.config(state="disabled")
+        show_first_parsed()
+        root.after(50, wait_for_sheet)
     center_window()  # Center the window after initializing
+    if rapid_mode:
+        root.focus_force()
 
     root.mainloop()
+    telemetry.report(manifest.skip_summary() if manifest is not None else None)
+    telemetry.close()
@@ -1,9 +1,26 @@
 import cv2
 import numpy as np
-from PIL import ImageTk, Image, ImageEnhance, ImageFilter
-from matplotlib import pyplot as plt
+from PIL import ImageTk, Image
 
-from utils.image_processing import rotate_image
+from utils.image_processing import rotate_image, row_positions, transform_points
+
+
+def get_window_bounds(window_data, image_shape):
+    """
+    Clips the cropping window to the image and returns the rotation center, without rotating anything.
+
+    Args:
+        window_data (tuple): Contains `x_min`, `x_max`, `y_min`, `y_max`, and `angle` for defining cropping area.
+        image_shape (tuple): Shape of the original image.
+
+    Returns:
+        tuple: Contains `x_min`, `y_min`, `x_max`, `y_max`, `angle` and `center`, as in `get_rotate_parameters`.
+    """
+    x_min, x_max, y_min, y_max, angle = window_data
+    center = (image_shape[1] // 2, image_shape[0] // 2)
+    x_min, x_max = max(0, x_min), min(image_shape[1], x_max)
+    y_min, y_max = max(0, y_min), min(image_shape[0], y_max)
+    return x_min, y_min, x_max, y_max, angle, center
 
 
 def get_rotate_parameters(window_data, image):
@@ -24,15 +41,12 @@ def get_rotate_parameters(window_data, image):
             - center (tuple): Center coordinates of the image (x, y).
             - rotated_image (ndarray): Rotated version of the original image.
     """
-    x_min, x_max, y_min, y_max, angle = window_data
-    center = (image.shape[1] // 2, image.shape[0] // 2)
+    x_min, y_min, x_max, y_max, angle, center = get_window_bounds(window_data, image.shape)
     rotated_image = rotate_image(image, angle, center)
-    x_min, x_max = max(0, x_min), min(rotated_image.shape[1], x_max)
-    y_min, y_max = max(0, y_min), min(rotated_image.shape[0], y_max)
     return x_min, y_min, x_max, y_max, angle, center, rotated_image
 
 
-def get_rotated_positions_and_check_all_inside(row, center, angle, x_min, y_min, x_max, y_max):
+def get_rotated_positions_and_check_all_inside(row, center, angle, x_min, y_min, x_max, y_max, positions=None):
     """
     Rotates and checks if character coordinates (C1 to C11) fall within the specified image boundaries.
 
@@ -41,20 +55,17 @@ def get_rotated_positions_and_check_all_inside(row, center, angle, x_min, y_min,
         center (tuple): Center point of rotation (x, y).
         angle (float): Rotation angle in degrees.
         x_min, y_min, x_max, y_max (int): Minimum and maximum x and y boundaries for cropping.
+        positions (ndarray, optional): Pre-parsed (11, 2) positions of the row, see `parse_coordinates`.
 
     Returns:
         tuple: Contains:
-            - rotated_positions (list): List of rotated (x, y) positions for each character.
+            - rotated_positions (ndarray): Array of shape (11, 2) with the rotated (x, y) position of each character.
             - all_inside (bool): `True` if all characters are within boundaries, `False` otherwise.
     """
-    c_positions = [eval(row[f'C{i}'].replace(";", ",")) for i in range(1, 12)]
-    rotated_positions = []
-    for (x, y) in c_positions:
-        rot_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
-        rotated_point = np.dot(rot_matrix, np.array([x, y, 1]))
-        rotated_positions.append((rotated_point[0], rotated_point[1]))
-
-    all_inside = all(y_min <= y <= y_max and x_min <= x <= x_max for x, y in rotated_positions)
+    rot_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    rotated_positions = transform_points(row_positions(row, positions), rot_matrix)
+    xs, ys = rotated_positions[:, 0], rotated_positions[:, 1]
+    all_inside = bool(np.all((y_min <= ys) & (ys <= y_max) & (x_min <= xs) & (xs <= x_max)))
     return rotated_positions, all_inside
 
 
@@ -72,14 +83,18 @@ def calculate_ratio(character_image, cropped_image):
     return 2 * cropped_image.shape[1] / character_image.shape[1]
 
 
-def get_images(rotated_image, all_inside, x_min, y_min, x_max, y_max):
+def get_images(rotated_image, all_inside, x_min, y_min, x_max, y_max, cropped_image=None, source_scale=1.0):
     """
     Generates character and cropped images with scaling and font parameters.
 
     Args:
-        rotated_image (ndarray): Rotated version of the original image.
+        rotated_image (ndarray): Rotated version of the original image. May be `None` when `cropped_image` is
+            given and `all_inside` is `True`.
         all_inside (bool): Indicator if all characters fit within cropped region.
         x_min, y_min, x_max, y_max (int): Boundaries for cropping.
+        cropped_image (ndarray, optional): Already-cropped window, e.g. from `rotate_image_region`.
+        source_scale (float): Scale of `rotated_image` relative to the full-resolution image, when the overview
+            was decoded at a reduced resolution.
 
     Returns:
         tuple: Contains:
@@ -89,7 +104,8 @@ def get_images(rotated_image, all_inside, x_min, y_min, x_max, y_max):
             - target_width (int): Desired width for character image.
             - font_scale (float): Font scale for character labels.
     """
-    cropped_image = rotated_image[y_min:y_max, x_min:x_max]
+    if cropped_image is None:
+        cropped_image = rotated_image[y_min:y_max, x_min:x_max]
     if all_inside:
         character_image = cropped_image.copy()
         ratio_of_images = calculate_ratio(character_image, cropped_image)
@@ -102,7 +118,9 @@ def get_images(rotated_image, all_inside, x_min, y_min, x_max, y_max):
         target_width = cropped_image.shape[1] * 2
         ratio_of_images = target_width / character_image.shape[1]
         target_height = int(character_image.shape[0] * ratio_of_images)
-        font_scale = int(0.4 * (character_image.shape[0] / 100)) * ratio_of_images
+        # Keep the text the same size on screen as when drawn on the full-resolution image
+        full_height, full_width = character_image.shape[0] / source_scale, character_image.shape[1] / source_scale
+        font_scale = int(0.4 * (full_height / 100)) * (target_width / full_width) * source_scale
     return character_image, cropped_image, target_height, target_width, font_scale
 
 
@@ -110,6 +128,9 @@ def overlay_characters(character_image, rotated_positions, row, all_inside, font
     """
     Overlays serial number characters on the image at rotated positions.
 
+    Only the characters the serial number has are drawn, so a row that is not labeled yet, or only partly, is
+    displayed with the characters it has.
+
     Args:
         character_image (ndarray): Image for character overlay.
         rotated_positions (list): List of rotated (x, y) coordinates for characters.
@@ -118,8 +139,8 @@ def overlay_characters(character_image, rotated_positions, row, all_inside, font
         font_scale (float): Scale for font size in overlay.
         x_min, y_min (int): Minimum x and y boundaries for cropping adjustments.
     """
-    for i, (x, y) in enumerate(rotated_positions):
-        char = row['serial_number'][i]
+    serial_number = row['serial_number'] if isinstance(row['serial_number'], str) else ''
+    for char, (x, y) in zip(serial_number, rotated_positions):
         if all_inside:
             text_size = cv2.getTextSize(char, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 3)[0]
             adjusted_x = int(x) - x_min - text_size[0]
@@ -134,27 +155,136 @@ def overlay_characters(character_image, rotated_positions, row, all_inside, font
                         (0, 0, 255), 3)
 
 
-def convert_image_to_tkinter(image, target_height, target_width):
+def display_interpolation(scale):
     """
-    Converts an OpenCV image to a Tkinter-compatible format with resizing.
+    Chooses the OpenCV interpolation for a display resize.
 
     Args:
-        image (ndarray): OpenCV image to be converted.
+        scale (float): Ratio of the displayed size to the source size.
+
+    Returns:
+        int: `cv2.INTER_AREA` when shrinking, which averages the source pixels without aliasing, and
+            `cv2.INTER_CUBIC` when enlarging, which keeps the character edges sharp at a fraction of the cost of
+            Lanczos.
+    """
+    return cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+
+
+def resize_image_for_display(image, target_height, target_width):
+    """
+    Resizes an OpenCV image to its displayed size. Safe to call outside the Tk thread.
+
+    The image stays BGR: the conversion to the layout of Tk happens in `DisplaySurface.show`, in the same pass
+    as the copy into its buffer.
+
+    Args:
+        image (ndarray): OpenCV image to be resized.
         target_height (int): Desired image height in pixels.
         target_width (int): Desired image width in pixels.
 
     Returns:
-        PhotoImage: Tkinter-compatible image for display.
+        ndarray: Resized BGR image, `image` itself if it already has the target size.
+    """
+    if image.shape[0] == target_height and image.shape[1] == target_width:
+        return image
+    scale = min(target_height / image.shape[0], target_width / image.shape[1])
+    return cv2.resize(image, (target_width, target_height), interpolation=display_interpolation(scale))
+
+
+class DisplaySurface:
+    """
+    Single Tk image of a label, updated in place for every frame.
+
+    Frames are converted from BGR to RGBA into a buffer that is reused across frames and only grows with the
+    largest frame shown, then pasted into the same PhotoImage, whose size is adjusted to the frame. Showing a
+    frame therefore creates neither a Tk image nor a full-size array.
+
+    With a `viewport`, the Tk image keeps that size whatever the frame: frames are scaled to fit it and centered,
+    the margins being transparent, so the label never asks Tk for a new layout.
+    """
+
+    def __init__(self, label, viewport=None):
+        """
+        Args:
+            label (Label): Tkinter label displaying the image.
+            viewport (tuple, optional): Fixed `(width, height)` of the displayed image, `None` to display every
+                frame at its own size.
+        """
+        self.label = label
+        self.photo = None
+        self.size = None
+        self.viewport = viewport
+        self._buffer = np.empty(0, dtype=np.uint8)
+        self._placement = None
+        if viewport is not None:
+            width, height = viewport
+            self._buffer = np.zeros(height * width * 4, dtype=np.uint8)
+            self.photo = ImageTk.PhotoImage("RGBA", (width, height))
+            self.size = (width, height)
+            label.config(image=self.photo)
+            label.image = self.photo
+
+    def show(self, image):
+        """
+        Displays an image in the label.
+
+        Args:
+            image (ndarray): BGR image at its displayed size, see `resize_image_for_display`.
+        """
+        if self.viewport is not None:
+            self._show_letterboxed(image)
+            return
+        height, width = image.shape[:2]
+        if self._buffer.size < height * width * 4:
+            self._buffer = np.empty(height * width * 4, dtype=np.uint8)
+        rgba = self._buffer[:height * width * 4].reshape(height, width, 4)
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGBA, dst=rgba)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage("RGBA", (width, height))
+            self.label.config(image=self.photo)
+            self.label.image = self.photo
+        elif self.size != (width, height):
+            # Resizes the Tk image itself, the label keeps displaying it
+            self.photo.tk.call(str(self.photo), "configure", "-width", width, "-height", height)
+        self.size = (width, height)
+        self.photo.paste(Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1))
+
+    def _show_letterboxed(self, image):
+        """Displays an image scaled to fit the viewport, centered between transparent margins."""
+        width, height = self.viewport
+        x, y, fitted_width, fitted_height = letterbox_placement(image.shape, width, height)
+        rgba = self._buffer.reshape(height, width, 4)
+        if self._placement != (x, y, fitted_width, fitted_height):
+            # Only the margins of a differently placed frame need clearing, the frame covers the rest
+            rgba[:] = 0
+            self._placement = (x, y, fitted_width, fitted_height)
+        if (fitted_height, fitted_width) != image.shape[:2]:
+            image = cv2.resize(image, (fitted_width, fitted_height),
+                               interpolation=display_interpolation(fitted_width / image.shape[1]))
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGBA, dst=rgba[y:y + fitted_height, x:x + fitted_width])
+        self.photo.paste(Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1))
+
+
+def letterbox_placement(image_shape, width, height):
+    """
+    Places an image in a fixed viewport, scaled to fit it while keeping its aspect ratio and centered.
+
+    Args:
+        image_shape (tuple): Shape of the image.
+        width (int): Width of the viewport.
+        height (int): Height of the viewport.
+
+    Returns:
+        tuple: `x`, `y`, `width` and `height` of the image in the viewport.
     """
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image_pil = Image.fromarray(image_rgb)
-    image_pil = image_pil.resize((target_width, target_height), Image.LANCZOS)
-    image_tk = ImageTk.PhotoImage(image_pil)
-    return image_tk
+    scale = min(width / image_shape[1], height / image_shape[0])
+    fitted_width = max(1, min(width, round(image_shape[1] * scale)))
+    fitted_height = max(1, min(height, round(image_shape[0] * scale)))
+    return (width - fitted_width) // 2, (height - fitted_height) // 2, fitted_width, fitted_height
 
 
 def update_labels(row, unsure_text_var, character_image_label, tk_character_image, cropped_image_label,
-                  tk_cropped_image, serial_var, file_name_var, progress_var, unsure_var, current_index, corrected_df):
+                  tk_cropped_image, serial_var, file_name_var, progress_var, unsure_var, current_index, store):
     """
     Updates the Tkinter interface with labels and image references for the current image.
 
@@ -170,7 +300,7 @@ def update_labels(row, unsure_text_var, character_image_label, tk_character_imag
         progress_var (StringVar): Tkinter variable for progress status.
         unsure_var (StringVar): Tkinter variable for unsure button status.
         current_index (int): Current index of the image being displayed.
-        corrected_df (pd.DataFrame): DataFrame containing corrected image data.
+        store (DataFrameStore or SQLiteStore): Storage containing the image data.
     """
     try:
         if str(int(row['unsure'])) == '1':
@@ -193,60 +323,5 @@ def update_labels(row, unsure_text_var, character_image_label, tk_character_imag
 
     serial_var.set(row['serial_number'])
     file_name_var.set(row['image'])
-    progress_var.set(f"{current_index + 1}/{len(corrected_df)}")
+    progress_var.set(f"{current_index + 1}/{len(store)}")
     unsure_var.set("Unsure")
-
-
-def enhance_contrast(photo_image, factor=2.0):
-    """
-    Enhances contrast of a Tkinter PhotoImage for display.
-
-    Args:
-        photo_image (PhotoImage): Tkinter-compatible image to enhance.
-        factor (float): Contrast enhancement factor.
-
-    Returns:
-        PhotoImage: Contrast-enhanced image for Tkinter display.
-    """
-    pil_image = ImageTk.getimage(photo_image)
-    enhancer = ImageEnhance.Contrast(pil_image)
-    enhanced_image = enhancer.enhance(factor)
-    return ImageTk.PhotoImage(enhanced_image)
-
-
-def detect_edges(photo_image):
-    """
-    Applies edge detection filter to a Tkinter PhotoImage.
-
-    Args:
-        photo_image (PhotoImage): Tkinter-compatible image for edge detection.
-
-    Returns:
-        PhotoImage: Image with edges detected for Tkinter display.
-    """
-    pil_image = ImageTk.getimage(photo_image)
-    if pil_image.mode != 'RGB':
-        pil_image = pil_image.convert('RGB')
-    grayscale_image = pil_image.convert("L")
-    edge_image = grayscale_image.filter(ImageFilter.FIND_EDGES)
-    return ImageTk.PhotoImage(edge_image)
-
-
-def draw_filtered_images(cropped_label, character_label):
-    """
-    Applies contrast enhancement and edge detection to cropped and character images.
-
-    Args:
-        cropped_label (Label): Tkinter label for displaying the cropped image.
-        character_label (Label): Tkinter label for displaying the character overlay image.
-
-    Returns:
-        None
-    """
-    new_cropped_image = enhance_contrast(detect_edges(cropped_label.image), 5)
-    new_character_image = enhance_contrast(cropped_label.image)
-    character_label.config(image=new_character_image)
-    character_label.image = new_character_image
-    cropped_label.config(image=new_cropped_image)
-    cropped_label.image = new_cropped_image
-    return